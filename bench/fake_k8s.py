@@ -0,0 +1,591 @@
+"""In-process fake of the kubernetes api server subset K8sClient uses.
+
+Serves configmaps, services, pods, deployments, daemonsets, nodes, traefik
+ingressroutetcps and GameServer resources with create / get / list (label + field
+selectors, limit / continue) / watch / patch / delete / deletecollection.
+Deployments get a ready status and pods of their own, daemonsets a pod on every
+node, deleting an object deletes the objects whose ownerReferences point at it.
+Latency and 429s can be injected to see how the client copes with a slow or
+throttling api server.
+
+Usage Example
+```
+fake = FakeKubernetes(latency=0.005)
+await fake.start()          # points KUBECONFIG at the fake
+fake.seed_gameservers(1000)
+await k8_cl.load_service_account("async")
+...
+await fake.stop()
+```
+"""
+import os
+import re
+import time
+import random
+import asyncio
+import tempfile
+import functools
+import itertools
+from collections import defaultdict, deque
+import orjson
+from aiohttp import web
+from ..k8.client import CONFIG_HASH_ANNOTATION, config_hash
+
+# only one kind per plural here, so the plural is enough to tell collections apart
+CORE_PREFIX = "/api/v1/namespaces/{namespace}/{plural}"
+# nodes
+CLUSTER_PREFIX = "/api/v1/{plural}"
+GROUP_PREFIX = "/apis/{group}/{version}/namespaces/{namespace}/{plural}"
+
+KUBECONFIG = """apiVersion: v1
+kind: Config
+clusters:
+- cluster: {{server: "http://{host}:{port}"}}
+  name: fake
+contexts:
+- context: {{cluster: fake, user: fake, namespace: gs}}
+  name: fake
+current-context: fake
+users:
+- name: fake
+  user: {{token: fake}}
+"""
+
+# split on commas that aren't inside an "in (...)" set
+SELECTOR_SPLIT_RE = re.compile(r",(?![^()]*\))")
+SET_TERM_RE = re.compile(r"^\s*([^\s!]+)\s+(in|notin)\s+\((.*)\)\s*$")
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_label_selector(selector: str):
+    """Selector -> [(key, operator, values)], operator one of in, notin, exists, !exists."""
+    requirements = []
+    for term in SELECTOR_SPLIT_RE.split(selector):
+        term = term.strip()
+        set_term = SET_TERM_RE.match(term)
+        if set_term:
+            key, operator, values = set_term.groups()
+            requirements.append((key, operator, frozenset(value.strip() for value in values.split(","))))
+        elif "!=" in term:
+            key, value = term.split("!=", 1)
+            requirements.append((key.strip(), "notin", frozenset((value.strip(),))))
+        elif "=" in term:
+            key, value = term.replace("==", "=").split("=", 1)
+            requirements.append((key.strip(), "in", frozenset((value.strip(),))))
+        elif term.startswith("!"):
+            requirements.append((term[1:], "!exists", None))
+        elif term:
+            requirements.append((term, "exists", None))
+    return requirements
+
+
+def match_labels(labels: dict | None, selector: str | None) -> bool:
+    if not selector:
+        return True
+    labels = labels or {}
+    for key, operator, values in parse_label_selector(selector):
+        if operator == "in" and labels.get(key) not in values:
+            return False
+        if operator == "notin" and labels.get(key) in values:
+            return False
+        if operator == "exists" and key not in labels:
+            return False
+        if operator == "!exists" and key in labels:
+            return False
+    return True
+
+
+def _field(obj: dict, path: str):
+    for key in path.split("."):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def match_fields(obj: dict, selector: str | None) -> bool:
+    if not selector:
+        return True
+    for term in selector.split(","):
+        negate = "!=" in term
+        key, value = term.split("!=" if negate else "=", 1)
+        actual = _field(obj, key.strip().lstrip("="))
+        actual = "" if actual is None else str(actual)
+        if (actual == value.strip()) == negate:
+            return False
+    return True
+
+
+def _status(code: int, reason: str, message: str = ""):
+    return {"kind": "Status", "apiVersion": "v1", "status": "Failure", "reason": reason, "message": message, "code": code}
+
+
+def _merge(target: dict, patch: dict):
+    for key, value in patch.items():
+        if value is None:
+            target.pop(key, None)
+        elif isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+class FakeKubernetes:
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, throttle_rate: float = 0.0,
+                 pods_per_deployment: int = 1, history: int = 10000, seed: int | None = None):
+        # seconds added to every request, plus up to `jitter` more
+        self.latency = latency
+        self.jitter = jitter
+        # share of requests answered with 429 Too Many Requests
+        self.throttle_rate = throttle_rate
+        self.pods_per_deployment = pods_per_deployment
+        self.random = random.Random(seed)
+
+        # plural -> name -> object
+        self.objects = defaultdict(dict)
+        self.resource_version = 0
+        # recent events, for watches resuming from a resourceVersion
+        self.events = deque(maxlen=history)
+        self.watchers = []
+
+        self.requests = defaultdict(int)
+        self.throttled = 0
+
+        self.uids = itertools.count(1)
+        # owner uid -> (plural, name) of the objects it owns
+        self.dependents = defaultdict(set)
+        self.runner = None
+        self.kubeconfig = None
+
+    # ========== LIFECYCLE ==========
+
+    def app(self):
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        for prefix in (CORE_PREFIX, GROUP_PREFIX):
+            app.router.add_route("*", prefix, self.handle)
+            app.router.add_route("*", prefix + "/{name}", self.handle)
+            # status / scale subresources are served from the object itself
+            app.router.add_route("*", prefix + "/{name}/{subresource}", self.handle)
+        # after the namespaced routes, /api/v1/{plural}/{name} would shadow them
+        app.router.add_route("*", CLUSTER_PREFIX, self.handle)
+        app.router.add_route("*", CLUSTER_PREFIX + "/{name}", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0, use: bool = True):
+        """Serve on host:port (0 picks a free port) and, with use, point the kubernetes clients at it."""
+        self.runner = web.AppRunner(self.app(), access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        handle, self.kubeconfig = tempfile.mkstemp(prefix="fake-kubeconfig-", suffix=".yaml")
+        with os.fdopen(handle, "w") as f:
+            f.write(KUBECONFIG.format(host=host, port=port))
+        if use:
+            self.use()
+        return f"http://{host}:{port}"
+
+    def use(self):
+        from kubernetes.config import kube_config
+        from kubernetes_asyncio.config import kube_config as async_kube_config
+
+        os.environ.pop("KUBERNETES_SERVICE_HOST", None)
+        os.environ["KUBECONFIG"] = self.kubeconfig
+        # both libraries read KUBECONFIG once, at import
+        kube_config.KUBE_CONFIG_DEFAULT_LOCATION = self.kubeconfig
+        async_kube_config.KUBE_CONFIG_DEFAULT_LOCATION = self.kubeconfig
+
+    async def stop(self):
+        for watcher in self.watchers:
+            watcher["queue"].put_nowait(None)
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+        if self.kubeconfig is not None:
+            os.remove(self.kubeconfig)
+            self.kubeconfig = None
+
+    # ========== STORE ==========
+
+    def _bump(self) -> str:
+        self.resource_version += 1
+        return str(self.resource_version)
+
+    def _emit(self, plural: str, event_type: str, obj: dict):
+        event = (self.resource_version, plural, {"type": event_type, "object": obj})
+        self.events.append(event)
+        for watcher in self.watchers:
+            if watcher["plural"] == plural:
+                watcher["queue"].put_nowait(event)
+
+    def add(self, plural: str, obj: dict, notify: bool = True) -> dict:
+        """Store an object as if it had been created through the api."""
+        metadata = obj.setdefault("metadata", {})
+        metadata.setdefault("namespace", "gs")
+        metadata["uid"] = f"{next(self.uids):08x}-0000-4000-8000-000000000000"
+        metadata["creationTimestamp"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        metadata["resourceVersion"] = self._bump()
+        metadata["generation"] = 1
+
+        if plural == "deployments":
+            self._set_deployment_status(obj)
+        self.objects[plural][metadata["name"]] = obj
+        self._index_owners(plural, obj)
+        if notify:
+            self._emit(plural, "ADDED", obj)
+
+        if plural == "deployments":
+            for index in range(self.pods_per_deployment):
+                self.add("pods", self._pod_for(obj, index), notify=notify)
+        elif plural == "daemonsets":
+            for node in self.objects["nodes"].values():
+                self.add("pods", self._daemon_pod_for(obj, node["metadata"]["name"]), notify=notify)
+        elif plural == "nodes":
+            for daemonset in self.objects["daemonsets"].values():
+                self.add("pods", self._daemon_pod_for(daemonset, metadata["name"]), notify=notify)
+        return obj
+
+    def remove(self, plural: str, name: str) -> dict | None:
+        obj = self.objects[plural].pop(name, None)
+        if obj is None:
+            return None
+        obj["metadata"]["resourceVersion"] = self._bump()
+        self._emit(plural, "DELETED", obj)
+
+        # the garbage collector, in the foreground
+        for dependent_plural, dependent_name in self.dependents.pop(obj["metadata"]["uid"], ()):
+            self.remove(dependent_plural, dependent_name)
+        if plural == "deployments":
+            for pod_name, pod in list(self.objects["pods"].items()):
+                owners = pod["metadata"].get("ownerReferences") or []
+                if any(owner["name"] == name for owner in owners):
+                    self.remove("pods", pod_name)
+        return obj
+
+    def clear(self):
+        """Drop every object without telling watchers, for starting a benchmark round from scratch."""
+        self.objects.clear()
+        self.events.clear()
+        self.dependents.clear()
+
+    def _index_owners(self, plural: str, obj: dict):
+        for owner in obj["metadata"].get("ownerReferences") or []:
+            if owner.get("uid"):
+                self.dependents[owner["uid"]].add((plural, obj["metadata"]["name"]))
+
+    def _set_deployment_status(self, deployment: dict):
+        spec = deployment.setdefault("spec", {})
+        # defaulted by the api server when left out
+        replicas = spec.setdefault("replicas", 1)
+        deployment["status"] = {
+            "observedGeneration": 1,
+            "replicas": replicas,
+            "updatedReplicas": replicas,
+            "readyReplicas": replicas,
+            "availableReplicas": replicas,
+        }
+
+    def _pod_for(self, deployment: dict, index: int) -> dict:
+        name = deployment["metadata"]["name"]
+        template = (deployment.get("spec") or {}).get("template") or {}
+        containers = (template.get("spec") or {}).get("containers") or [{"name": "gameserver"}]
+        return {
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {
+                "name": f"{name}-7d9c8b6f5-{index:05d}",
+                "labels": dict((template.get("metadata") or {}).get("labels") or {}),
+                "ownerReferences": [{"apiVersion": "apps/v1", "kind": "ReplicaSet", "name": name, "controller": True}],
+            },
+            "spec": {**(template.get("spec") or {}), "nodeName": f"node-{self.random.randrange(12)}"},
+            "status": {
+                "phase": "Running",
+                "conditions": [{"type": "Ready", "status": "True"}],
+                "containerStatuses": [
+                    {"name": container["name"], "ready": True, "restartCount": 0, "started": True,
+                     "image": container.get("image"), "state": {"running": {}}}
+                    for container in containers
+                ],
+            },
+        }
+
+    def _daemon_pod_for(self, daemonset: dict, node: str) -> dict:
+        template = daemonset["spec"]["template"]
+        spec = template.get("spec") or {}
+        return {
+            "apiVersion": "v1",
+            "kind": "Pod",
+            "metadata": {
+                "name": f"{daemonset['metadata']['name']}-{node}",
+                "labels": dict((template.get("metadata") or {}).get("labels") or {}),
+                "ownerReferences": [{"apiVersion": "apps/v1", "kind": "DaemonSet", "name": daemonset["metadata"]["name"],
+                                     "uid": daemonset["metadata"]["uid"], "controller": True}],
+            },
+            "spec": {**spec, "nodeName": node},
+            "status": {
+                "phase": "Running",
+                "conditions": [{"type": "Ready", "status": "True"}],
+                "initContainerStatuses": [
+                    {"name": container["name"], "ready": True, "restartCount": 0, "image": container.get("image"),
+                     "state": {"terminated": {"exitCode": 0, "reason": "Completed"}}}
+                    for container in spec.get("initContainers") or []
+                ],
+                "containerStatuses": [
+                    {"name": container["name"], "ready": True, "restartCount": 0, "started": True,
+                     "image": container.get("image"), "state": {"running": {}}}
+                    for container in spec.get("containers") or []
+                ],
+            },
+        }
+
+    def _roll_daemonset(self, daemonset: dict):
+        """Replace the pods of a daemonset with ones of its current template, all at once."""
+        for plural, name in list(self.dependents.get(daemonset["metadata"]["uid"], ())):
+            self.remove(plural, name)
+        self.dependents.pop(daemonset["metadata"]["uid"], None)
+        for node in self.objects["nodes"].values():
+            self.add("pods", self._daemon_pod_for(daemonset, node["metadata"]["name"]))
+
+    def seed_nodes(self, count: int = 12, unschedulable: int = 0) -> list[str]:
+        """Add ready nodes named like the ones pods land on, the last `unschedulable` of them cordoned."""
+        names = []
+        for index in range(count):
+            self.add("nodes", {
+                "apiVersion": "v1",
+                "kind": "Node",
+                "metadata": {"name": f"node-{index}", "namespace": None},
+                "spec": {"unschedulable": True} if index >= count - unschedulable else {},
+                "status": {"conditions": [{"type": "Ready", "status": "True"}]},
+            }, notify=False)
+            names.append(f"node-{index}")
+        return names
+
+    def seed_gameservers(self, count: int, owners: int = 97, game: str = "minecraft", crd: bool = False) -> list[str]:
+        """Add `count` complete gameservers straight to the store, returns their server ids.
+
+        With crd every gameserver also gets a reconciled GameServer resource that owns its objects.
+        """
+        server_ids = []
+        for index in range(count):
+            server_id = f"{self.random.getrandbits(128):032x}"
+            owner = f"user{index % owners}"
+            labels = {"app": "gameserver", "owner": owner, "server-id": server_id}
+            deployment_labels = {**labels, "game": game}
+
+            metadata = {}
+            if crd:
+                gameserver = self.add("gameservers", {
+                    "apiVersion": "kondukter.dev/v1alpha1",
+                    "kind": "GameServer",
+                    "metadata": {"name": f"gameserver-{server_id}", "labels": deployment_labels},
+                    "spec": {
+                        "game": game,
+                        "owner": owner,
+                        "image": "itzg/minecraft-server:latest",
+                        "resources": {"requests": {"cpu": "1", "memory": "1Gi"}, "limits": {"cpu": "2", "memory": "2Gi"}},
+                        "port": 25565,
+                        "config": {"EULA": "true"},
+                    },
+                    "status": {"phase": "Running", "replicas": 1, "readyReplicas": 1, "observedGeneration": 1},
+                }, notify=False)
+                metadata["ownerReferences"] = [{
+                    "apiVersion": "kondukter.dev/v1alpha1", "kind": "GameServer", "name": f"gameserver-{server_id}",
+                    "uid": gameserver["metadata"]["uid"], "controller": True, "blockOwnerDeletion": True,
+                }]
+
+            self.add("configmaps", {"metadata": {"name": f"config-{server_id}", "labels": labels, **metadata}, "data": {"EULA": "true"}}, notify=False)
+            self.add("deployments", {
+                "apiVersion": "apps/v1",
+                "kind": "Deployment",
+                "metadata": {"name": f"gameserver-{server_id}", "labels": deployment_labels, **metadata},
+                "spec": {
+                    "replicas": 1,
+                    "selector": {"matchLabels": {"app": "gameserver", "server-id": server_id}},
+                    "template": {
+                        "metadata": {
+                            "labels": {"app": "gameserver", "game": game, "server-id": server_id},
+                            "annotations": {CONFIG_HASH_ANNOTATION: config_hash({"EULA": "true"})},
+                        },
+                        "spec": {"containers": [{
+                            "name": "gameserver",
+                            "image": "itzg/minecraft-server:latest",
+                            "ports": [{"name": "game-port", "containerPort": 25565}],
+                            "envFrom": [{"configMapRef": {"name": f"config-{server_id}"}}],
+                            "resources": {"requests": {"cpu": "1", "memory": "1Gi"}, "limits": {"cpu": "2", "memory": "2Gi"}},
+                        }]},
+                    },
+                },
+            }, notify=False)
+            self.add("services", {
+                "metadata": {"name": f"gameserver-{server_id}", "labels": labels, **metadata},
+                "spec": {"selector": {"app": "gameserver", "server-id": server_id},
+                         "ports": [{"name": "game-port", "appProtocol": "TCP", "port": 25565, "targetPort": "game-port", "protocol": "TCP"}]},
+            }, notify=False)
+            self.add("ingressroutetcps", {
+                "apiVersion": "traefik.io/v1alpha1",
+                "kind": "IngressRouteTCP",
+                "metadata": {"name": f"gameserver-{server_id}-route", "labels": labels, **metadata},
+                "spec": {"entryPoints": ["web"], "routes": [{"match": "HostSNI(`*`)", "services": [{"name": f"gameserver-{server_id}", "port": "game-port"}]}]},
+            }, notify=False)
+            server_ids.append(server_id)
+        return server_ids
+
+    # ========== HTTP ==========
+
+    def _json(self, body, status: int = 200, headers: dict | None = None):
+        return web.Response(body=orjson.dumps(body), status=status, content_type="application/json", headers=headers)
+
+    async def handle(self, request: web.Request):
+        plural = request.match_info["plural"]
+        name = request.match_info.get("name")
+        # the api server parses it like strconv.ParseBool, kubernetes_asyncio sends "True"
+        watching = request.query.get("watch", "").lower() in ("true", "1")
+        self.requests[(request.method, plural)] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+        if self.throttle_rate and not watching and self.random.random() < self.throttle_rate:
+            self.throttled += 1
+            return self._json(_status(429, "TooManyRequests", "fake throttling"), 429, {"Retry-After": "1"})
+
+        if request.method == "GET" and watching:
+            return await self.watch(request, plural)
+        if request.method == "GET" and name:
+            return self.get(plural, name)
+        if request.method == "GET":
+            return self.list(request, plural)
+        if request.method == "POST":
+            return self.create(plural, await request.json())
+        if request.method == "PATCH":
+            return self.patch(plural, name, await request.json(), request.match_info.get("subresource"))
+        if request.method == "DELETE" and name:
+            body = await request.read()
+            return self.delete(plural, name, orjson.loads(body) if body else None)
+        if request.method == "DELETE":
+            return self.delete_collection(request, plural)
+        return self._json(_status(405, "MethodNotAllowed"), 405)
+
+    def get(self, plural: str, name: str):
+        obj = self.objects[plural].get(name)
+        if obj is None:
+            return self._json(_status(404, "NotFound", f"{plural} \"{name}\" not found"), 404)
+        return self._json(obj)
+
+    def _select(self, request: web.Request, plural: str):
+        label_selector = request.query.get("labelSelector")
+        field_selector = request.query.get("fieldSelector")
+        return [
+            obj for obj in self.objects[plural].values()
+            if match_labels(obj["metadata"].get("labels"), label_selector) and match_fields(obj, field_selector)
+        ]
+
+    def list(self, request: web.Request, plural: str):
+        items = sorted(self._select(request, plural), key=lambda obj: obj["metadata"]["name"])
+        metadata = {"resourceVersion": str(self.resource_version)}
+
+        limit = int(request.query.get("limit") or 0)
+        if limit:
+            # the token is just the offset, real ones are opaque
+            try:
+                start = int(request.query.get("continue") or 0)
+            except ValueError:
+                return self._json(_status(400, "BadRequest", "continue key is not valid"), 400)
+            if start + limit < len(items):
+                metadata["continue"] = str(start + limit)
+            items = items[start:start + limit]
+
+        return self._json({"kind": "List", "apiVersion": "v1", "metadata": metadata, "items": items})
+
+    def create(self, plural: str, body: dict):
+        name = body.get("metadata", {}).get("name")
+        if name in self.objects[plural]:
+            return self._json(_status(409, "AlreadyExists", f"{plural} \"{name}\" already exists"), 409)
+        body.setdefault("status", {})
+        return self._json(self.add(plural, body), 201)
+
+    def patch(self, plural: str, name: str, body: dict, subresource: str | None = None):
+        obj = self.objects[plural].get(name)
+        if obj is None:
+            return self._json(_status(404, "NotFound", f"{plural} \"{name}\" not found"), 404)
+        # a resourceVersion in the patch is a precondition, like an update's
+        expected = (body.get("metadata") or {}).get("resourceVersion")
+        if expected is not None and expected != obj["metadata"]["resourceVersion"]:
+            return self._conflict(plural, name)
+        if subresource == "status":
+            body = {"status": body.get("status")}
+
+        before = orjson.dumps(obj)
+        _merge(obj, body)
+        if plural == "deployments" and "replicas" in (body.get("spec") or {}):
+            # scaled, its pods are ready right away
+            self._set_deployment_status(obj)
+        if orjson.dumps(obj) == before:
+            # like the api server, a patch that changes nothing is no event
+            return self._json(obj)
+        if "spec" in body:
+            obj["metadata"]["generation"] = obj["metadata"].get("generation", 1) + 1
+            if plural == "daemonsets":
+                self._roll_daemonset(obj)
+        self._index_owners(plural, obj)
+        obj["metadata"]["resourceVersion"] = self._bump()
+        self._emit(plural, "MODIFIED", obj)
+        return self._json(obj)
+
+    def delete(self, plural: str, name: str, options: dict | None = None):
+        obj = self.objects[plural].get(name)
+        if obj is None:
+            return self._json(_status(404, "NotFound", f"{plural} \"{name}\" not found"), 404)
+        expected = ((options or {}).get("preconditions") or {}).get("resourceVersion")
+        if expected is not None and expected != obj["metadata"]["resourceVersion"]:
+            return self._conflict(plural, name)
+        return self._json(self.remove(plural, name))
+
+    def _conflict(self, plural: str, name: str):
+        message = f"Operation cannot be fulfilled on {plural} \"{name}\": the object has been modified"
+        return self._json(_status(409, "Conflict", message), 409)
+
+    def delete_collection(self, request: web.Request, plural: str):
+        deleted = [self.remove(plural, obj["metadata"]["name"]) for obj in self._select(request, plural)]
+        return self._json({"kind": "List", "apiVersion": "v1", "metadata": {}, "items": deleted})
+
+    async def watch(self, request: web.Request, plural: str):
+        label_selector = request.query.get("labelSelector")
+        since = int(request.query.get("resourceVersion") or self.resource_version)
+        timeout = float(request.query.get("timeoutSeconds") or 1800)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/json"})
+        await response.prepare(request)
+
+        watcher = {"plural": plural, "queue": asyncio.Queue()}
+        self.watchers.append(watcher)
+        try:
+            if self.events and since < self.events[0][0] - 1:
+                # history no longer reaches back that far
+                gone = {"type": "ERROR", "object": _status(410, "Expired", "too old resource version")}
+                await response.write(orjson.dumps(gone) + b"\n")
+                return response
+
+            for resource_version, event_plural, event in list(self.events):
+                if event_plural == plural and resource_version > since:
+                    watcher["queue"].put_nowait((resource_version, event_plural, event))
+
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                if request.transport is None or request.transport.is_closing():
+                    break
+                try:
+                    item = await asyncio.wait_for(watcher["queue"].get(), min(0.5, deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    continue
+                if item is None:
+                    break
+                _, _, event = item
+                if match_labels(event["object"]["metadata"].get("labels"), label_selector):
+                    await response.write(orjson.dumps(event) + b"\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self.watchers.remove(watcher)
+        return response
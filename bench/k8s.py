@@ -0,0 +1,325 @@
+"""K8sClient benchmark suite against the in-process fake api server.
+
+Covers manifest construction (models vs templates), create_gameserver, list_gameservers at 10 / 1k / 10k
+servers, status fetches, warm pool claims, the same creates and lists through GameServer resources
+plus how fast the reconciler converges, and pod list serialization. Results are written as json
+with the commit they were measured on, --compare prints the change against an
+earlier run.
+
+Run from the directory containing this repo, e.g.:
+    python -m gameserver_api.bench.k8s --output before.json
+    python -m gameserver_api.bench.k8s --compare before.json
+"""
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from kubernetes import client
+from ..k8.client import K8sClient, gameserver_manifests
+from ..k8.templates import GameserverTemplate
+from ..k8.informer import GameserverInformer
+from ..k8.reconciler import GameServerReconciler
+from ..core.catalog import CatalogGame, game_catalog
+from ..core.warm_pool import WarmPool
+from . import serialization
+from .fake_k8s import FakeKubernetes
+
+GAME = {
+    "game_name": "minecraft",
+    "image": "itzg/minecraft-server:latest",
+    "requests_memory": "3Gi",
+    "requests_cpu": "4",
+    "limits_memory": "4Gi",
+    "limits_cpu": "5500m",
+    "game_port": 25565,
+}
+CONFIG_DATA = {"EULA": "TRUE", "MEMORY": "3G", "MOTD": "benchmark", "DIFFICULTY": "normal"}
+
+
+def percentile(values: list[float], q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summary(latencies: list[float], elapsed: float | None = None):
+    """Latencies in seconds -> milliseconds stats."""
+    result = {
+        "count": len(latencies),
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "max_ms": max(latencies) * 1000,
+    }
+    if elapsed:
+        result["per_sec"] = len(latencies) / elapsed
+    return result
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, cwd=Path(__file__).parent).stdout.strip()
+        return commit, bool(dirty)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+# ========== BENCHMARKS ==========
+
+def bench_manifests(rounds: int):
+    """CPU per create spent building and serializing the four manifests.
+
+    models is what the client libraries do with V1 objects (sanitize + json.dumps),
+    templates renders the precompiled json that gets sent as is.
+    """
+    api_client = client.ApiClient()
+    template = GameserverTemplate(**GAME)
+
+    def models():
+        manifests = gameserver_manifests(uuid.uuid4().hex, user_id="user1", config_data=CONFIG_DATA, **GAME)
+        for manifest in manifests.values():
+            json.dumps(api_client.sanitize_for_serialization(manifest))
+
+    def templates():
+        template.render(uuid.uuid4().hex, "user1", CONFIG_DATA)
+
+    results = {
+        "rounds": rounds,
+        "cpu_us_per_create": {
+            "models": serialization.cpu_per_call(models, rounds) * 1000,
+            "templates": serialization.cpu_per_call(templates, rounds) * 1000,
+        }
+    }
+    api_client.close()
+    return results
+
+
+async def bench_create(k8: K8sClient, fake: FakeKubernetes, count: int, concurrency: int):
+    fake.clear()
+    template = GameserverTemplate(**GAME, crd=k8.gameserver_crd)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def create(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            server_id = uuid.uuid4().hex
+            await k8.create_gameserver_from_manifests(server_id, template.render(server_id, f"user{i % 97}", CONFIG_DATA))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(create(i) for i in range(count)))
+    return {"concurrency": concurrency, **summary(latencies, time.perf_counter() - start)}
+
+
+async def bench_list(k8: K8sClient, fake: FakeKubernetes, servers: int, rounds: int):
+    fake.clear()
+    fake.seed_gameservers(servers, crd=k8.gameserver_crd)
+
+    latencies = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        gameservers = await k8.list_gameservers()
+        latencies.append(time.perf_counter() - start)
+        assert len(gameservers) == servers, len(gameservers)
+    return summary(latencies)
+
+
+async def bench_status(k8: K8sClient, fake: FakeKubernetes, servers: int, rounds: int):
+    fake.clear()
+    server_ids = fake.seed_gameservers(servers)
+
+    single = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        await k8.get_gameserver_status(server_ids[i % servers])
+        single.append(time.perf_counter() - start)
+
+    batched = []
+    for _ in range(max(1, rounds // 10)):
+        start = time.perf_counter()
+        statuses = await k8.get_gameserver_statuses(server_ids)
+        batched.append(time.perf_counter() - start)
+        assert len(statuses) == servers, len(statuses)
+
+    return {"get_gameserver_status": summary(single), f"get_gameserver_statuses_{servers}": summary(batched)}
+
+
+async def bench_reconcile(k8: K8sClient, fake: FakeKubernetes, count: int, concurrency: int, workers: int = 4):
+    """Time from creating `count` GameServer resources until the reconciler has them all running."""
+    fake.clear()
+    informer = GameserverInformer(k8)
+    reconciler = GameServerReconciler(k8, informer)
+    informer.start(crd=True)
+    reconciler.start(workers)
+    while not informer.synced:
+        await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await bench_create(k8, fake, count, concurrency)
+    while sum((gameserver.get("status") or {}).get("phase") == "Running"
+              for gameserver in fake.objects["gameservers"].values()) < count:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    await reconciler.stop()
+    await informer.stop()
+    return {"count": count, "workers": workers, "seconds": elapsed, "per_sec": count / elapsed,
+            "reconciles": reconciler.reconciles, "errors": reconciler.errors}
+
+
+async def bench_claim(k8: K8sClient, fake: FakeKubernetes, count: int, concurrency: int):
+    """Creates served from a full warm pool, compare with create_gameserver."""
+    fake.clear()
+    game = CatalogGame(id=1, name="Minecraft", short_name=GAME["game_name"], docker_image=GAME["image"],
+                       cpu_requests=GAME["requests_cpu"], cpu_limits=GAME["limits_cpu"],
+                       memory_requests=GAME["requests_memory"], memory_limits=GAME["limits_memory"],
+                       port=GAME["game_port"])
+    game_catalog.games[game.id] = game
+
+    informer = GameserverInformer(k8)
+    pool = WarmPool(k8, informer)
+    pool.configure({game.id: count}, min_size=count, concurrency=concurrency, interval=0.05)
+    reconciler = GameServerReconciler(k8, informer)
+    informer.start(crd=k8.gameserver_crd)
+    if k8.gameserver_crd:
+        reconciler.start()
+    pool.start()
+    while pool.stats()["games"][game.id]["ready"] < count:
+        await asyncio.sleep(0.01)
+    # nothing refilled while measuring
+    await pool.stop()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def claim(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await pool.claim(game, f"user{i % 97}", CONFIG_DATA)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(claim(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+
+    await reconciler.stop()
+    await informer.stop()
+    del game_catalog.games[game.id]
+    return {"concurrency": concurrency, "hits": pool.hits[game.id], **summary(latencies, elapsed)}
+
+
+async def run(modes: list[str], sizes: list[int], creates: int, concurrency: int, rounds: int, latency: float):
+    fake = FakeKubernetes(latency=latency, seed=1)
+    await fake.start()
+
+    results = {"manifests": bench_manifests(rounds * 50)}
+    for mode in modes:
+        k8 = K8sClient()
+        await k8.load_service_account(mode, pool_maxsize=max(concurrency * 4, 10))
+
+        mode_results = results[mode] = {}
+        mode_results["create_gameserver"] = {
+            "sequential": await bench_create(k8, fake, max(10, creates // 10), 1),
+            "concurrent": await bench_create(k8, fake, creates, concurrency),
+        }
+        mode_results["list_gameservers"] = {}
+        for size in sizes:
+            # fewer rounds for the big lists, one 10k list already takes a while
+            size_rounds = max(2, rounds * 10 // max(size // 100, 10))
+            mode_results["list_gameservers"][str(size)] = await bench_list(k8, fake, size, size_rounds)
+        mode_results["status"] = await bench_status(k8, fake, 100, rounds * 5)
+        mode_results["warm_pool_claim"] = await bench_claim(k8, fake, creates, concurrency)
+
+        # the same through GameServer resources, creates are one call and lists skip the deployments
+        k8.gameserver_crd = True
+        crd_results = mode_results["crd"] = {}
+        crd_results["create_gameserver"] = {
+            "sequential": await bench_create(k8, fake, max(10, creates // 10), 1),
+            "concurrent": await bench_create(k8, fake, creates, concurrency),
+        }
+        crd_results["list_gameservers"] = {}
+        for size in sizes:
+            size_rounds = max(2, rounds * 10 // max(size // 100, 10))
+            crd_results["list_gameservers"][str(size)] = await bench_list(k8, fake, size, size_rounds)
+        crd_results["reconcile"] = await bench_reconcile(k8, fake, creates, concurrency)
+        crd_results["warm_pool_claim"] = await bench_claim(k8, fake, creates, concurrency)
+
+        await k8.close()
+
+    results["serialization"] = await serialization.run(1000, rounds, "metadata.name,spec.nodeName,status.phase")
+
+    await fake.stop()
+    return results
+
+
+# ========== REPORTING ==========
+
+def flatten(results: dict, prefix: str = ""):
+    """Nested results -> {"a.b.c": number}, for comparing runs."""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(previous: dict, current: dict):
+    old = flatten(previous["results"])
+    new = flatten(current["results"])
+    print(f"\n{previous.get('commit') or '?':.12} -> {current.get('commit') or '?':.12}")
+    for key in sorted(old.keys() & new.keys()):
+        if key.endswith(("count", "rounds", "concurrency", "pods", "body_bytes", "workers", "reconciles", "errors", "hits")):
+            continue
+        change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+        print(f"  {key:<70} {old[key]:12.3f} {new[key]:12.3f} {change:+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modes", default="async,threadpool", help="K8sClient modes to run")
+    parser.add_argument("--sizes", default="10,1000,10000", help="gameserver counts for list_gameservers")
+    parser.add_argument("--creates", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="fake api server latency in ms")
+    parser.add_argument("--output", help="write results to this json file")
+    parser.add_argument("--compare", help="json file of an earlier run to compare against")
+    args = parser.parse_args()
+
+    commit, dirty = git_commit()
+    results = asyncio.run(run(
+        args.modes.split(","), [int(size) for size in args.sizes.split(",")],
+        args.creates, args.concurrency, args.rounds, args.latency / 1000
+    ))
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "params": vars(args),
+        "results": results,
+    }
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+"""Open-loop load generator for the gameserver api.
+
+Requests are sent on a fixed (or poisson) schedule regardless of how fast the
+api answers, and latency is measured from when a request was due, not when it
+went out, so a stalled server can't hide its latency by slowing the load down
+(coordinated omission).
+
+    serve   the real app on uvicorn, backed by the in-process fake kubernetes api
+            and the postgres in DB_URI (a game is seeded if there is none)
+    run     one load run at --rate requests/sec
+    sweep   runs at increasing rates until latency, errors or throughput give out
+
+Run from the directory containing this repo, e.g.:
+    DB_URI=postgresql+asyncpg://... python -m gameserver_api.bench.load serve --servers 1000
+    python -m gameserver_api.bench.load run --rate 200 --duration 30 --mix create=1,list=2,get=4,status=4,delete=1
+    python -m gameserver_api.bench.load sweep --spawn --start 50 --factor 2 --steps 7
+"""
+import sys
+import json
+import random
+import signal
+import asyncio
+import argparse
+import contextlib
+import subprocess
+from collections import Counter
+from pathlib import Path
+import aiohttp
+from .k8s import percentile
+
+DEFAULT_MIX = "create=1,list=2,get=4,status=4,delete=1"
+CONFIG_DATA = {"EULA": "TRUE"}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for term in mix.split(","):
+        name, _, weight = term.partition("=")
+        if name not in OPERATIONS:
+            raise SystemExit(f"unknown operation {name}, pick from {sorted(OPERATIONS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class EndpointStats:
+    def __init__(self):
+        self.sent = 0
+        self.latencies = []
+        self.errors = Counter()
+        # get / status / delete racing a delete of the same server, or an informer
+        # that hasn't seen a create yet, reported apart from the errors
+        self.not_found = 0
+        # no server id to work on yet, or too many requests in flight
+        self.skipped = 0
+        self.dropped = 0
+
+    def report(self, duration: float):
+        failed = sum(self.errors.values())
+        # dropped requests were never sent, so they have no latency
+        ok = len(self.latencies) - (failed - self.dropped) - self.not_found
+        return {
+            "sent": self.sent,
+            "ok": ok,
+            "errors": dict(self.errors),
+            "not_found": self.not_found,
+            "error_rate": failed / self.sent if self.sent else 0.0,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "per_sec": ok / duration,
+            "p50_ms": _ms(percentile(self.latencies, 0.50)),
+            "p95_ms": _ms(percentile(self.latencies, 0.95)),
+            "p99_ms": _ms(percentile(self.latencies, 0.99)),
+            "max_ms": _ms(max(self.latencies, default=None)),
+        }
+
+
+def _ms(seconds: float | None):
+    return None if seconds is None else seconds * 1000
+
+
+class ServerIds:
+    """Server ids the load can get / status / delete, grows with creates."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.ids = []
+
+    def pick(self) -> str | None:
+        return self.rng.choice(self.ids) if self.ids else None
+
+    def take(self) -> str | None:
+        if not self.ids:
+            return None
+        index = self.rng.randrange(len(self.ids))
+        self.ids[index], self.ids[-1] = self.ids[-1], self.ids[index]
+        return self.ids.pop()
+
+
+# ========== OPERATIONS ==========
+
+# each returns the request to send (method, path, json body) or None to skip,
+# plus a callback for the response body
+
+def op_create(load: "Load"):
+    body = {"user_id": f"user{load.rng.randrange(load.owners)}", "game_id": load.game_id, "config_data": CONFIG_DATA}
+
+    def done(response: dict):
+        load.servers.ids.append(response["server_id"])
+    return ("POST", "/gameservers/", body), done
+
+
+def op_list(load: "Load"):
+    return ("GET", f"/gameservers/?owner=user{load.rng.randrange(load.owners)}", None), None
+
+
+def op_get(load: "Load"):
+    server_id = load.servers.pick()
+    return server_id and (("GET", f"/gameservers/{server_id}", None), None)
+
+
+def op_status(load: "Load"):
+    server_id = load.servers.pick()
+    return server_id and (("GET", f"/gameservers/{server_id}/status", None), None)
+
+
+def op_delete(load: "Load"):
+    server_id = load.servers.take()
+    return server_id and (("DELETE", f"/gameservers/{server_id}", None), None)
+
+
+OPERATIONS = {
+    "create": op_create,
+    "list": op_list,
+    "get": op_get,
+    "status": op_status,
+    "delete": op_delete,
+}
+
+
+class Load:
+
+    def __init__(self, url: str, mix: dict[str, float], game_id: int = 1, owners: int = 100,
+                 poisson: bool = False, timeout: float = 10.0, max_in_flight: int = 5000,
+                 connections: int = 500, seed: int | None = None):
+        self.url = url.rstrip("/")
+        self.mix = mix
+        self.game_id = game_id
+        self.owners = owners
+        self.poisson = poisson
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.connections = connections
+
+        self.rng = random.Random(seed)
+        self.servers = ServerIds(self.rng)
+        self.session = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.connections),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        await self.discover()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def discover(self):
+        """Start with the gameservers that already exist."""
+        async with self.session.get(f"{self.url}/gameservers/?fields=server_id") as response:
+            response.raise_for_status()
+            self.servers.ids = [row["server_id"] for row in (await response.json())["gameservers"]]
+
+    async def call(self, stats: EndpointStats, due: float, request, done, measured: bool):
+        method, path, body = request
+        loop = asyncio.get_running_loop()
+        error = None
+        try:
+            async with self.session.request(method, self.url + path, json=body) as response:
+                payload = await response.read()
+                if response.status == 404 and method != "POST":
+                    error = "not_found"
+                elif response.status >= 400:
+                    error = str(response.status)
+                elif done is not None:
+                    done(json.loads(payload))
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except aiohttp.ClientError as e:
+            error = type(e).__name__
+
+        if measured:
+            # from when the request was due, time spent waiting for a connection counts too
+            stats.latencies.append(loop.time() - due)
+            if error == "not_found":
+                stats.not_found += 1
+            elif error:
+                stats.errors[error] += 1
+
+    async def run(self, rate: float, duration: float, warmup: float = 0.0):
+        """Send rate requests/sec for warmup + duration seconds, stats only cover duration."""
+        stats = {name: EndpointStats() for name in self.mix}
+        names, weights = list(self.mix), list(self.mix.values())
+        loop = asyncio.get_running_loop()
+        in_flight = set()
+
+        start = loop.time()
+        measure_from = start + warmup
+        end = measure_from + duration
+        due = start
+        while due < end:
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            name = self.rng.choices(names, weights)[0]
+            measured = due >= measure_from
+            request = OPERATIONS[name](self)
+            if measured:
+                stats[name].sent += 1
+                if not request:
+                    stats[name].skipped += 1
+                elif len(in_flight) >= self.max_in_flight:
+                    stats[name].dropped += 1
+                    stats[name].errors["dropped"] += 1
+
+            if request and len(in_flight) < self.max_in_flight:
+                task = asyncio.create_task(self.call(stats[name], due, *request, measured))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+
+            due += self.rng.expovariate(rate) if self.poisson else 1 / rate
+
+        # late answers still count, the timeout bounds the wait
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+        endpoints = {name: endpoint.report(duration) for name, endpoint in stats.items()}
+        total = EndpointStats()
+        for endpoint in stats.values():
+            total.sent += endpoint.sent
+            total.latencies.extend(endpoint.latencies)
+            total.errors.update(endpoint.errors)
+            total.not_found += endpoint.not_found
+            total.skipped += endpoint.skipped
+            total.dropped += endpoint.dropped
+        return {"rate": rate, "duration": duration, "total": total.report(duration), "endpoints": endpoints}
+
+
+# ========== SERVE ==========
+
+async def seed_game(db_uri: str) -> int:
+    """Make sure there is a game to create servers of, returns its id."""
+    from sqlmodel import select
+    from ..core.db import db_cl
+    from ..models import Game, Port, ConfigVar
+
+    db_cl.connect(db_uri)
+    await db_cl.init_db()
+    async with db_cl.session_factory() as session:
+        game = (await session.execute(select(Game).where(Game.short_name == "minecraft"))).scalars().first()
+        if game is None:
+            game = Game(name="Minecraft", short_name="minecraft", docker_image="itzg/minecraft-server:latest",
+                        cpu_requests="1", cpu_limits="2", memory_requests="1Gi", memory_limits="2Gi")
+            session.add(game)
+            await session.commit()
+            await session.refresh(game)
+            session.add(Port(name="game-port", number=25565, game_id=game.id))
+            session.add(ConfigVar(name="EULA", game_id=game.id))
+            await session.commit()
+        game_id = game.id
+    await db_cl.disconnect()
+    return game_id
+
+
+async def serve(host: str, port: int, k8s_latency: float, servers: int):
+    import uvicorn
+    from ..core.config import config
+    from .fake_k8s import FakeKubernetes
+
+    fake = FakeKubernetes(latency=k8s_latency, seed=1)
+    await fake.start()
+    fake.seed_gameservers(servers, owners=100, crd=config.K8S_GAMESERVER_CRD)
+
+    game_id = await seed_game(str(config.DB_URI))
+    print(f"serving on http://{host}:{port}, game_id {game_id}, {servers} gameservers, "
+          f"fake api server latency {k8s_latency * 1000:.1f} ms", flush=True)
+
+    from ..main import app
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", access_log=False))
+    # stop on SIGINT / SIGTERM without uvicorn raising the signal again afterwards,
+    # which would cancel the fake api server shutdown
+    server.capture_signals = contextlib.nullcontext
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, setattr, server, "should_exit", True)
+    try:
+        await server.serve()
+    finally:
+        await fake.stop()
+
+
+class spawned_server:
+    """Run `serve` in a subprocess so the app doesn't share an event loop with the load."""
+
+    def __init__(self, port: int, k8s_latency: float, servers: int):
+        self.port = port
+        self.args = [sys.executable, "-m", __spec__.name, "serve", "--port", str(port),
+                     "--k8s-latency", str(k8s_latency * 1000), "--servers", str(servers)]
+        self.process = None
+
+    async def __aenter__(self):
+        self.process = subprocess.Popen(self.args, cwd=Path(__file__).parents[2])
+        url = f"http://127.0.0.1:{self.port}"
+        async with aiohttp.ClientSession() as session:
+            for _ in range(120):
+                if self.process.poll() is not None:
+                    raise SystemExit(f"server exited with {self.process.returncode}")
+                try:
+                    async with session.get(f"{url}/healthcheck/ping") as response:
+                        if response.status == 200:
+                            return url
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(0.5)
+        raise SystemExit("server did not come up")
+
+    async def __aexit__(self, *exc):
+        self.process.send_signal(signal.SIGINT)
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+# ========== REPORTING ==========
+
+def print_run(result: dict):
+    print(f"\n{result['rate']:.0f} req/s offered for {result['duration']:.0f}s")
+    print(f"  {'endpoint':<10}{'sent':>8}{'ok/s':>9}{'err%':>7}{'404':>6}{'skip':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    rows = {**result["endpoints"], "total": result["total"]}
+    for name, row in rows.items():
+        latencies = "".join(f"{row[key]:9.1f}" if row[key] is not None else f"{'-':>9}"
+                            for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+        print(f"  {name:<10}{row['sent']:8d}{row['per_sec']:9.1f}{row['error_rate'] * 100:7.2f}{row['not_found']:6d}{row['skipped']:6d}{latencies}")
+    errors = result["total"]["errors"]
+    if errors:
+        print(f"  errors: {errors}")
+
+
+def knee(steps: list[dict], slo_p99: float, max_error_rate: float):
+    """Last rate the service kept up with: throughput near the offered rate, p99 and errors within bounds."""
+    best = None
+    for step in steps:
+        total = step["total"]
+        offered = total["sent"] - total["skipped"]
+        achieved = total["ok"] + total["not_found"]
+        saturated = (
+            achieved < 0.9 * offered
+            or total["error_rate"] > max_error_rate
+            or (total["p99_ms"] or 0) > slo_p99
+        )
+        if saturated:
+            return best, step["rate"]
+        best = step["rate"]
+    return best, None
+
+
+async def sweep(load: Load, rates: list[float], duration: float, warmup: float, cooldown: float,
+                slo_p99: float, max_error_rate: float):
+    steps = []
+    for rate in rates:
+        result = await load.run(rate, duration, warmup)
+        print_run(result)
+        steps.append(result)
+        if knee(steps, slo_p99, max_error_rate)[1] is not None:
+            break
+        await asyncio.sleep(cooldown)
+
+    best, saturated_at = knee(steps, slo_p99, max_error_rate)
+    if saturated_at is None:
+        print(f"\nno knee found up to {rates[-1]:.0f} req/s")
+    else:
+        print(f"\nknee: keeps up with {best or 0:.0f} req/s, saturated at {saturated_at:.0f} req/s")
+    return {"knee": best, "saturated_at": saturated_at, "steps": steps}
+
+
+async def main_async(args):
+    if args.command == "serve":
+        return await serve(args.host, args.port, args.k8s_latency / 1000, args.servers)
+
+    url = args.url
+    server = spawned_server(args.port, args.k8s_latency / 1000, args.servers) if args.spawn else None
+    if server is not None:
+        url = await server.__aenter__()
+    try:
+        async with Load(url, parse_mix(args.mix), args.game_id, args.owners, args.poisson,
+                        args.timeout, args.max_in_flight, args.connections, args.seed) as load:
+            if args.command == "run":
+                result = await load.run(args.rate, args.duration, args.warmup)
+                print_run(result)
+            else:
+                rates = [float(rate) for rate in args.rates.split(",")] if args.rates else \
+                    [args.start * args.factor ** step for step in range(args.steps)]
+                result = await sweep(load, rates, args.duration, args.warmup, args.cooldown,
+                                     args.slo_p99, args.max_error_rate)
+    finally:
+        if server is not None:
+            await server.__aexit__()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"params": vars(args), "result": result}, indent=2) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the app against the fake kubernetes api")
+    run_parser = commands.add_parser("run", help="one run at a fixed rate")
+    sweep_parser = commands.add_parser("sweep", help="increase the rate until the service saturates")
+
+    for sub in (serve_parser, run_parser, sweep_parser):
+        sub.add_argument("--port", type=int, default=5000)
+        sub.add_argument("--k8s-latency", type=float, default=2.0, help="fake api server latency in ms")
+        sub.add_argument("--servers", type=int, default=1000, help="gameservers in the fake api to start with")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+
+    for sub in (run_parser, sweep_parser):
+        sub.add_argument("--url", default="http://127.0.0.1:5000")
+        sub.add_argument("--spawn", action="store_true", help="start `serve` in a subprocess for the run")
+        sub.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight pairs")
+        sub.add_argument("--duration", type=float, default=30, help="seconds measured per run")
+        sub.add_argument("--warmup", type=float, default=5, help="seconds sent before measuring")
+        sub.add_argument("--poisson", action="store_true", help="poisson arrivals instead of evenly spaced")
+        sub.add_argument("--game-id", type=int, default=1)
+        sub.add_argument("--owners", type=int, default=100)
+        sub.add_argument("--timeout", type=float, default=10)
+        sub.add_argument("--connections", type=int, default=500)
+        sub.add_argument("--max-in-flight", type=int, default=5000)
+        sub.add_argument("--seed", type=int)
+        sub.add_argument("--output", help="write the results to this json file")
+    run_parser.add_argument("--rate", type=float, default=100, help="requests/sec")
+
+    sweep_parser.add_argument("--rates", help="comma separated rates, instead of --start/--factor/--steps")
+    sweep_parser.add_argument("--start", type=float, default=50)
+    sweep_parser.add_argument("--factor", type=float, default=2)
+    sweep_parser.add_argument("--steps", type=int, default=8)
+    sweep_parser.add_argument("--cooldown", type=float, default=3, help="seconds between runs")
+    sweep_parser.add_argument("--slo-p99", type=float, default=500, help="p99 ms above which a rate counts as saturated")
+    sweep_parser.add_argument("--max-error-rate", type=float, default=0.01)
+
+    args = parser.parse_args()
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
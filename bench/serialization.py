@@ -0,0 +1,180 @@
+"""CPU cost of serving a pod list: kubernetes models + to_dict() vs raw json passthrough.
+
+Run from the directory containing this repo, e.g.:
+    python -m gameserver_api.bench.serialization --pods 1000 --rounds 20
+"""
+import json
+import time
+import asyncio
+import argparse
+import orjson
+from fastapi.encoders import jsonable_encoder
+from kubernetes import client
+from kubernetes_asyncio import client as async_client
+from ..k8.client import parse_field_paths, project
+from ..routes.responses import RawJSONResponse
+
+
+def make_pod(i: int):
+    """A pod shaped like the ones the gameserver deployments create."""
+    server_id = f"{i:032x}"
+    return {
+        "metadata": {
+            "name": f"gameserver-{server_id}-7d9c8b6f5-x2k4q",
+            "generateName": f"gameserver-{server_id}-7d9c8b6f5-",
+            "namespace": "gs",
+            "uid": f"{i:08x}-0000-4000-8000-000000000000",
+            "resourceVersion": str(100000 + i),
+            "creationTimestamp": "2025-06-01T12:00:00Z",
+            "labels": {
+                "app": "gameserver",
+                "game": "minecraft",
+                "owner": f"user{i % 97}",
+                "server-id": server_id,
+                "pod-template-hash": "7d9c8b6f5"
+            },
+            "ownerReferences": [{
+                "apiVersion": "apps/v1",
+                "kind": "ReplicaSet",
+                "name": f"gameserver-{server_id}-7d9c8b6f5",
+                "uid": f"{i:08x}-1111-4000-8000-000000000000",
+                "controller": True,
+                "blockOwnerDeletion": True
+            }],
+            "managedFields": [{
+                "manager": "kube-controller-manager",
+                "operation": "Update",
+                "apiVersion": "v1",
+                "time": "2025-06-01T12:00:00Z",
+                "fieldsType": "FieldsV1",
+                "fieldsV1": {"f:metadata": {"f:labels": {".": {}, "f:app": {}, "f:server-id": {}}}}
+            }]
+        },
+        "spec": {
+            "containers": [{
+                "name": "gameserver",
+                "image": "itzg/minecraft-server:latest",
+                "ports": [{"name": "game-port", "containerPort": 25565, "protocol": "TCP"}],
+                "envFrom": [{"configMapRef": {"name": f"config-{server_id}"}}],
+                "resources": {
+                    "limits": {"cpu": "5500m", "memory": "4Gi"},
+                    "requests": {"cpu": "4", "memory": "3Gi"}
+                },
+                "terminationMessagePath": "/dev/termination-log",
+                "terminationMessagePolicy": "File",
+                "imagePullPolicy": "Always"
+            }],
+            "restartPolicy": "Always",
+            "terminationGracePeriodSeconds": 30,
+            "dnsPolicy": "ClusterFirst",
+            "serviceAccountName": "default",
+            "nodeName": f"node-{i % 12}",
+            "schedulerName": "default-scheduler",
+            "tolerations": [
+                {"key": "node.kubernetes.io/not-ready", "operator": "Exists", "effect": "NoExecute", "tolerationSeconds": 300},
+                {"key": "node.kubernetes.io/unreachable", "operator": "Exists", "effect": "NoExecute", "tolerationSeconds": 300}
+            ]
+        },
+        "status": {
+            "phase": "Running",
+            "conditions": [
+                {"type": "Initialized", "status": "True", "lastTransitionTime": "2025-06-01T12:00:00Z"},
+                {"type": "Ready", "status": "True", "lastTransitionTime": "2025-06-01T12:00:30Z"},
+                {"type": "ContainersReady", "status": "True", "lastTransitionTime": "2025-06-01T12:00:30Z"},
+                {"type": "PodScheduled", "status": "True", "lastTransitionTime": "2025-06-01T12:00:00Z"}
+            ],
+            "hostIP": f"10.0.0.{i % 12}",
+            "podIP": f"10.42.{i // 250}.{i % 250}",
+            "startTime": "2025-06-01T12:00:00Z",
+            "containerStatuses": [{
+                "name": "gameserver",
+                "ready": True,
+                "restartCount": i % 3,
+                "image": "docker.io/itzg/minecraft-server:latest",
+                "imageID": "docker.io/itzg/minecraft-server@sha256:" + "ab" * 32,
+                "containerID": "containerd://" + "cd" * 32,
+                "started": True,
+                "state": {"running": {"startedAt": "2025-06-01T12:00:20Z"}}
+            }],
+            "qosClass": "Burstable"
+        }
+    }
+
+
+def make_pod_list(count: int) -> bytes:
+    return json.dumps({
+        "kind": "PodList",
+        "apiVersion": "v1",
+        "metadata": {"resourceVersion": "123456"},
+        "items": [make_pod(i) for i in range(count)]
+    }).encode()
+
+
+class _Response:
+    """Minimal stand-in for the rest response kubernetes_asyncio deserializes from."""
+
+    def __init__(self, data: bytes):
+        self.data = data.decode()
+
+
+def cpu_per_call(fn, rounds: int):
+    fn()  # warm up
+    start = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.process_time() - start) / rounds * 1000
+
+
+async def run(pods: int, rounds: int, fields: str):
+    body = make_pod_list(pods)
+    paths = parse_field_paths(fields)
+    async_api = async_client.ApiClient()
+    sync_api = client.ApiClient()
+
+    def models_async():
+        # async mode before: deserialize into V1PodList, to_dict(), then FastAPI's encoder + json
+        pod_list = async_api.deserialize(_Response(body), "V1PodList")
+        return json.dumps(jsonable_encoder(pod_list.to_dict())).encode()
+
+    def models_threadpool():
+        pod_list = sync_api.deserialize(body.decode(), "V1PodList", "application/json")
+        return json.dumps(jsonable_encoder(pod_list.to_dict())).encode()
+
+    def raw_passthrough():
+        return RawJSONResponse(body).body
+
+    def raw_projected():
+        items = orjson.loads(body)["items"]
+        return RawJSONResponse({"items": [project(pod, paths) for pod in items]}).body
+
+    results = {
+        "pods": pods,
+        "body_bytes": len(body),
+        "cpu_ms_per_request": {
+            "models_async": cpu_per_call(models_async, rounds),
+            "models_threadpool": cpu_per_call(models_threadpool, rounds),
+            "raw_passthrough": cpu_per_call(raw_passthrough, rounds),
+            "raw_projected": cpu_per_call(raw_projected, rounds),
+        }
+    }
+
+    await async_api.close()
+    sync_api.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pods", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--fields", default="metadata.name,spec.nodeName,status.phase")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.pods, args.rounds, args.fields))
+    print(f"{results['pods']} pods, {results['body_bytes'] / 1024:.0f} KiB body")
+    for name, ms in results["cpu_ms_per_request"].items():
+        print(f"  {name:<20} {ms:9.2f} ms cpu/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import asyncio
+from typing import Dict, FrozenSet, Optional, Tuple
+from pydantic import BaseModel as PydanticBaseModel
+from sqlmodel import select
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio.session import AsyncSession
+from ..models import Game
+
+NOTIFY_CHANNEL = "game_catalog"
+
+# notifies the id of every game whose row (or child row) changed, "*" on truncate
+NOTIFY_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION notify_game_catalog() RETURNS trigger AS $$
+BEGIN
+    IF TG_LEVEL = 'STATEMENT' THEN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', '*');
+        RETURN NULL;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', to_jsonb(OLD) ->> TG_ARGV[0]);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM pg_notify('{NOTIFY_CHANNEL}', to_jsonb(NEW) ->> TG_ARGV[0]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# serializes install_triggers between replicas starting at the same time
+TRIGGERS_LOCK = "game_catalog.install_triggers"
+
+# table -> column holding the game id
+WATCHED_TABLES = {
+    "games": "id",
+    "versions": "game_id",
+    "config_vars": "game_id",
+    "ports": "game_id",
+}
+
+
+class CatalogGame(PydanticBaseModel):
+    """Snapshot of a fully loaded game, detached from any db session."""
+    id: int
+    name: str
+    short_name: str
+    docker_image: str
+    cpu_requests: str
+    cpu_limits: str
+    memory_requests: str
+    memory_limits: str
+    port: Optional[int] = None
+    config_var_names: FrozenSet[str] = frozenset()
+    version_tags: Tuple[str, ...] = ()
+
+    @classmethod
+    def from_game(cls, game: Game):
+        return cls(
+            id=game.id,
+            name=game.name,
+            short_name=game.short_name,
+            docker_image=game.docker_image,
+            cpu_requests=game.cpu_requests,
+            cpu_limits=game.cpu_limits,
+            memory_requests=game.memory_requests,
+            memory_limits=game.memory_limits,
+            port=game.port.number if game.port else None,
+            config_var_names=frozenset(var.name for var in game.config_vars),
+            version_tags=tuple(version.tag for version in game.versions),
+        )
+
+
+class GameCatalog:
+    """Games keyed by id, invalidated through postgres LISTEN/NOTIFY."""
+
+    def __init__(self):
+        self.engine: AsyncEngine | None = None
+        self.games: Dict[int, CatalogGame] = {}
+        # bumped on every invalidation, lets loads that raced an invalidation be discarded
+        self.revision = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        self.listener_task: asyncio.Task | None = None
+        # set once the listener warmed the cache for the first time
+        self.warmed = asyncio.Event()
+
+    async def install_triggers(self, engine: AsyncEngine):
+        async with engine.begin() as conn:
+            # held until commit, the next replica replaces the triggers after this one is done
+            await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": TRIGGERS_LOCK})
+            await conn.execute(text(NOTIFY_FUNCTION))
+            for table, column in WATCHED_TABLES.items():
+                await conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_notify_game_catalog ON {table}"))
+                await conn.execute(text(
+                    f"CREATE TRIGGER {table}_notify_game_catalog "
+                    f"AFTER INSERT OR UPDATE OR DELETE ON {table} "
+                    f"FOR EACH ROW EXECUTE FUNCTION notify_game_catalog('{column}')"
+                ))
+                await conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_truncate_game_catalog ON {table}"))
+                await conn.execute(text(
+                    f"CREATE TRIGGER {table}_truncate_game_catalog "
+                    f"AFTER TRUNCATE ON {table} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION notify_game_catalog('{column}')"
+                ))
+
+    async def warm(self, engine: AsyncEngine):
+        """Load every game, replacing whatever is cached."""
+        self.engine = engine
+        revision = self.revision
+
+        async with AsyncSession(engine) as session:
+            result = await session.execute(select(Game))
+            games = {game.id: CatalogGame.from_game(game) for game in result.scalars().all()}
+
+        if revision == self.revision:
+            self.games = games
+
+    async def get(self, game_id: int) -> CatalogGame | None:
+        game = self.games.get(game_id)
+        if game is not None:
+            self.hits += 1
+            return game
+
+        self.misses += 1
+        revision = self.revision
+        async with AsyncSession(self.engine) as session:
+            result = await session.execute(select(Game).where(Game.id == game_id))
+            row = result.scalar_one_or_none()
+            if row is None:
+                return None
+            game = CatalogGame.from_game(row)
+
+        if revision == self.revision:
+            self.games[game_id] = game
+        return game
+
+    def invalidate(self, game_id: int | None = None):
+        self.revision += 1
+        self.invalidations += 1
+        if game_id is None:
+            self.games = {}
+        else:
+            self.games.pop(game_id, None)
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        if payload == "*" or not payload.isdigit():
+            self.invalidate()
+        else:
+            self.invalidate(int(payload))
+
+    def start_listener(self, engine: AsyncEngine):
+        """LISTEN for catalog changes and warm the cache once listening, see wait_warm()."""
+        self.engine = engine
+        self.listener_task = asyncio.create_task(self.listen(), name="game-catalog-listener")
+
+    async def wait_warm(self, timeout: float = 30):
+        """Wait for the listener's first warm, a cold cache still works by loading games on misses."""
+        try:
+            await asyncio.wait_for(self.warmed.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"game catalog not warm after {timeout}s, loading games on demand")
+
+    async def stop(self):
+        if self.listener_task is not None:
+            self.listener_task.cancel()
+            await asyncio.gather(self.listener_task, return_exceptions=True)
+            self.listener_task = None
+
+    async def listen(self):
+        """Hold a connection LISTENing on the catalog channel, reconnecting when it drops."""
+        while True:
+            try:
+                async with self.engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    driver_conn = raw.driver_connection
+
+                    closed = asyncio.Event()
+                    driver_conn.add_termination_listener(lambda _: closed.set())
+                    await driver_conn.add_listener(NOTIFY_CHANNEL, self._on_notify)
+
+                    # warmed only now that we listen, a change sent before that would be lost.
+                    # One sent during the warm bumps the revision, and the warm is discarded
+                    await self.warm(self.engine)
+                    self.warmed.set()
+
+                    await closed.wait()
+                    # the connection is dead, don't hand it back to the pool
+                    await conn.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"game catalog listener failed: {e!r}")
+
+            # without a listener the cache can't be trusted
+            self.invalidate()
+            await asyncio.sleep(5)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "games": len(self.games),
+            "revision": self.revision,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "invalidations": self.invalidations,
+        }
+
+
+game_catalog = GameCatalog()
@@ -1,5 +1,5 @@
 import secrets
-from typing import Literal
+from typing import Dict, List, Literal, Optional
 from pydantic import Field, PostgresDsn, AmqpDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -19,10 +19,234 @@ class Config(BaseSettings):
         default="postgres://root:postgres@db/root"
     )
 
+    DB_POOL_SIZE: int = Field(
+        default=50
+    )
+    DB_MAX_OVERFLOW: int = Field(
+        default=75
+    )
+    # seconds to wait for a pooled connection
+    DB_POOL_TIMEOUT: float = Field(
+        default=30
+    )
+    # seconds after which connections are replaced
+    DB_POOL_RECYCLE: int = Field(
+        default=1800
+    )
+
     # rabbit
     RABBIT_URI: AmqpDsn = Field(
         default="amqp://guest:guest@mq/"
     )
+    RABBIT_ENABLED: bool = Field(
+        default=False
+    )
+    # seconds to wait for an rpc reply
+    RABBIT_RPC_TIMEOUT: float = Field(
+        default=5
+    )
+    # published messages allowed to wait for a broker confirm at once
+    RABBIT_PUBLISH_WINDOW: int = Field(
+        default=256
+    )
+    # times a nacked message is published again
+    RABBIT_PUBLISH_RETRIES: int = Field(
+        default=3
+    )
+    # confirm mode channels the publishes are spread over
+    RABBIT_CHANNEL_POOL_SIZE: int = Field(
+        default=8
+    )
+    # processes for handlers registered with process_pool=True, defaults to the cpu count
+    RABBIT_PROCESS_WORKERS: Optional[int] = Field(
+        default=None
+    )
+
+    # users.get_by_id replies cached in memory, invalidated through the users.updated exchange
+    USER_CACHE_SIZE: int = Field(
+        default=10000
+    )
+    USER_CACHE_TTL: float = Field(
+        default=60
+    )
+    # seconds an unknown user is remembered
+    USER_CACHE_NEGATIVE_TTL: float = Field(
+        default=10
+    )
+
+    # provisioning workers, creates queued with POST /gameservers/?async=true
+    PROVISION_CONCURRENCY: int = Field(
+        default=8
+    )
+    PROVISION_PREFETCH: int = Field(
+        default=16
+    )
+    # deliveries of a provisioning job before its operation is failed, and seconds between them
+    PROVISION_MAX_ATTEMPTS: int = Field(
+        default=5
+    )
+    PROVISION_RETRY_DELAY: float = Field(
+        default=10
+    )
+
+    # adds the api time of every created object to create responses, internals clients shouldn't depend on
+    CREATE_TIMINGS_ENABLED: bool = Field(
+        default=False
+    )
+
+    # POST /gameservers/batch, servers per request and servers being created at once
+    BATCH_CREATE_MAX_ITEMS: int = Field(
+        default=500
+    )
+    BATCH_CREATE_CONCURRENCY: int = Field(
+        default=10
+    )
+
+    # POST /gameservers/status, ids per request and `server-id in (...)` list calls running at once
+    # for the ids the informer cache can't answer, 100 ids per call
+    STATUS_BATCH_MAX_IDS: int = Field(
+        default=1000
+    )
+    STATUS_BATCH_CONCURRENCY: int = Field(
+        default=2
+    )
+
+    # warm pool, game id -> most running but unassigned servers kept for it, e.g. {"1": 5}
+    # creates claim one of those instead of starting a server, empty turns the pool off
+    WARM_POOL_SIZES: Dict[int, int] = Field(
+        default={}
+    )
+    # smallest pool of a configured game, whatever the demand
+    WARM_POOL_MIN_SIZE: int = Field(
+        default=1
+    )
+    # seconds of past creates the pool size follows, and seconds a new pool server takes to get ready,
+    # a pool holds the creates expected while a claimed server is being replaced
+    WARM_POOL_DEMAND_WINDOW: float = Field(
+        default=600
+    )
+    WARM_POOL_LEAD_SECONDS: float = Field(
+        default=120
+    )
+    # pool servers created or deleted at once
+    WARM_POOL_CONCURRENCY: int = Field(
+        default=4
+    )
+    WARM_POOL_INTERVAL: float = Field(
+        default=5
+    )
+    # run the refiller in this process, claims work in every replica but there is no leader election,
+    # turn it on in exactly one of them
+    WARM_POOL_REFILL_ENABLED: bool = Field(
+        default=False
+    )
+
+    # idle gameservers are scaled to zero, game id -> seconds without connections, e.g. {"1": 900}
+    IDLE_TIMEOUTS: Dict[int, float] = Field(
+        default={}
+    )
+    # for the games not in IDLE_TIMEOUTS, unset keeps them running
+    IDLE_TIMEOUT_DEFAULT: Optional[float] = Field(
+        default=None
+    )
+    IDLE_CHECK_INTERVAL: float = Field(
+        default=30
+    )
+    # the activity signal, traefik's prometheus endpoint and its per-service open connections gauge
+    IDLE_TRAEFIK_METRICS_URL: str = Field(
+        default="http://traefik.traefik:9100/metrics"
+    )
+    IDLE_TRAEFIK_METRIC: str = Field(
+        default="traefik_service_open_connections"
+    )
+    # servers put to sleep at once
+    IDLE_CONCURRENCY: int = Field(
+        default=10
+    )
+    # run the idle detector in this process, resumes work in every replica but there is no leader election,
+    # turn it on in exactly one of them
+    IDLE_DETECTOR_ENABLED: bool = Field(
+        default=False
+    )
+
+    # game images, creates pin the digest their tag points at, resolved from the registry in the background
+    IMAGE_PIN_DIGESTS: bool = Field(
+        default=True
+    )
+    # registries reached over plain http, like docker's insecure-registries
+    IMAGE_INSECURE_REGISTRIES: List[str] = Field(
+        default=[]
+    )
+    # seconds between reading the images of the games table, resolving their digests and syncing the pre-pull daemonsets
+    IMAGE_REFRESH_INTERVAL: float = Field(
+        default=300
+    )
+    # registry lookups and daemonset changes at once
+    IMAGE_CONCURRENCY: int = Field(
+        default=8
+    )
+    # keep every game image and version cached on every node with a daemonset per image,
+    # needs rbac for daemonsets and nodes, should run in one replica
+    IMAGE_PREPULL_ENABLED: bool = Field(
+        default=False
+    )
+    # copies a static busybox into the pre-pull pods, and keeps them running
+    IMAGE_PREPULL_HELPER_IMAGE: str = Field(
+        default="busybox:1.36"
+    )
+    IMAGE_PREPULL_PAUSE_IMAGE: str = Field(
+        default="registry.k8s.io/pause:3.9"
+    )
+
+    # kubernetes
+    # "async" talks to the api server over aiohttp, "threadpool" runs the sync client in a threadpool
+    K8S_CLIENT_MODE: Literal["async", "threadpool"] = Field(
+        default="async"
+    )
+    K8S_POOL_MAXSIZE: int = Field(
+        default=50
+    )
+    # serve gameserver list/get from a watch-backed in-memory cache
+    K8S_INFORMER_ENABLED: bool = Field(
+        default=True
+    )
+    K8S_INFORMER_RESYNC_SECONDS: int = Field(
+        default=3600
+    )
+    # create gameservers as one GameServer custom resource (manifests/gameserver-crd.yml)
+    # and derive its configmap, deployment, service and route in a reconciler.
+    # Servers created before turning it on keep their four objects and no GameServer, reads,
+    # listings and deletes still find them. Empty the warm pools first, their servers are not
+    # carried over and have to be deleted by hand.
+    K8S_GAMESERVER_CRD: bool = Field(
+        default=False
+    )
+    # run the reconciler in this process, there is no leader election, so turn it on in exactly one
+    # replica or run it on its own instead (python -m <package>.k8.reconciler)
+    K8S_RECONCILER_ENABLED: bool = Field(
+        default=False
+    )
+    K8S_RECONCILER_WORKERS: int = Field(
+        default=4
+    )
+
+    # tracing, spans go to TRACING_FILE or an OTLP collector, nothing is loaded while disabled
+    TRACING_ENABLED: bool = Field(
+        default=False
+    )
+    TRACING_EXPORTER: Literal["file", "otlp"] = Field(
+        default="file"
+    )
+    TRACING_FILE: str = Field(
+        default="traces.jsonl"
+    )
+    TRACING_OTLP_ENDPOINT: str = Field(
+        default="http://localhost:4318/v1/traces"
+    )
+    # share of traces started here that are recorded
+    TRACING_SAMPLE_RATIO: float = Field(
+        default=0.1
+    )
 
     CI: bool = Field(
         default=False
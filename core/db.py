@@ -1,28 +1,163 @@
+import time
 from ..models import *
 from sqlmodel import SQLModel
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio.session import AsyncSession
 from sqlalchemy.schema import CreateSchema
+from .metrics import registry
+from .tracing import tracing
+
+
+class PoolStats:
+    """Counters describing how the connection pool behaves under load."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pre_ping_failures = 0
+        self.checkout_timeouts = 0
+
+        # time spent waiting for a connection, includes the pre-ping
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_max = 0
+
+    def record_checkout(self, wait: float, overflow: int):
+        self.checkouts += 1
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+        self.overflow_max = max(self.overflow_max, overflow)
+
+    def snapshot(self, pool: AsyncAdaptedQueuePool | None):
+        return {
+            "size": pool.size() if pool else 0,
+            "checked_out": pool.checkedout() if pool else 0,
+            "checked_in": pool.checkedin() if pool else 0,
+            # negative while the pool hasn't opened pool_size connections yet
+            "overflow": pool.overflow() if pool else 0,
+            "overflow_max": self.overflow_max,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "pre_ping_failures": self.pre_ping_failures,
+            "checkout_timeouts": self.checkout_timeouts,
+            "wait_seconds_avg": self.wait_seconds_total / self.checkouts if self.checkouts else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+
+# module level so the counters survive the pool being recreated
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waits for a connection."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            pool_stats.checkout_timeouts += 1
+            raise
+        pool_stats.record_checkout(time.perf_counter() - start, self.overflow())
+        return connection
+
 
 class DBClient():
     def __init__(self):
         self.engine = None
+        self.session_factory = None
         
-    def connect(self, uri: str, connect_args: dict = {}):
+    def connect(self, uri: str, connect_args: dict = {},
+                pool_size: int = 50, max_overflow: int = 75,
+                pool_timeout: float = 30, pool_recycle: int = 1800):
         self.engine = create_async_engine(
             url=uri,
             connect_args=connect_args,
+            poolclass=InstrumentedQueuePool,
             # check for conn liveliness before checkout
             pool_pre_ping=True,
-            # recycle idle connections younger than 30 mins
-            pool_recycle=1800,
+            # recycle idle connections older than pool_recycle seconds
+            pool_recycle=pool_recycle,
             # connection pool size
-            pool_size=50,
+            pool_size=pool_size,
             # pool overflow size
-            max_overflow=75,
+            max_overflow=max_overflow,
+            # seconds to wait for a connection before giving up
+            pool_timeout=pool_timeout,
 
             # echo=True,
             future=True
         )
+        self._instrument(self.engine.sync_engine)
+
+        # built once, sessions are cheap to create from it
+        self.session_factory = async_sessionmaker(
+            self.engine,
+            class_=AsyncSession,
+            expire_on_commit=True
+        )
+
+    def _instrument(self, engine):
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            pool_stats.connects += 1
+
+        @event.listens_for(engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            pool_stats.checkins += 1
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            pool_stats.invalidations += 1
+
+        @event.listens_for(engine, "handle_error")
+        def on_error(context):
+            if context.is_pre_ping:
+                pool_stats.pre_ping_failures += 1
+            span = getattr(context.execution_context, "trace_span", None)
+            if span is not None:
+                span.record_exception(context.original_exception)
+                span.set_attribute("error", True)
+                span.end()
+                context.execution_context.trace_span = None
+
+        # a span per statement, started and ended in separate callbacks so it never becomes current
+        @event.listens_for(engine, "before_cursor_execute")
+        def on_execute(conn, cursor, statement, parameters, context, executemany):
+            if not tracing.enabled or context is None:
+                return
+            context.trace_span = tracing.start_span("db.query", {
+                "db.system": "postgresql",
+                "db.operation": statement.split(None, 1)[0].upper() if statement else "",
+                "db.statement": statement,
+            })
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def on_executed(conn, cursor, statement, parameters, context, executemany):
+            span = getattr(context, "trace_span", None)
+            if span is not None:
+                span.end()
+                context.trace_span = None
+
+    def get_pool_stats(self):
+        return pool_stats.snapshot(self.engine.pool if self.engine else None)
+
+    def collect_metrics(self):
+        """Pool gauges and counters for the /metrics scrape."""
+        stats = self.get_pool_stats()
+        for key in ("size", "checked_out", "checked_in", "overflow"):
+            yield f"db_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}.", [({}, stats[key])]
+        for key in ("checkouts", "connects", "invalidations", "pre_ping_failures", "checkout_timeouts"):
+            yield f"db_pool_{key}_total", "counter", f"Connection pool {key.replace('_', ' ')}.", [({}, stats[key])]
+        yield "db_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection.", [({}, pool_stats.wait_seconds_total)]
 
     async def create_schema(self, schema_name: str):
         async with self.engine.begin() as conn:
@@ -37,6 +172,8 @@ class DBClient():
     async def disconnect(self):
         await self.engine.dispose()
         self.engine = None
+        self.session_factory = None
 
 
-db_cl = DBClient()
\ No newline at end of file
+db_cl = DBClient()
+registry.add_collector(db_cl.collect_metrics)
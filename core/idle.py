@@ -0,0 +1,236 @@
+"""Scales idle gameservers to zero and wakes them up again.
+
+The detector reads the open connections of every gameserver from traefik's prometheus
+metrics, and puts servers without any for their game's idle timeout to sleep: replicas 0
+and a sleeping-since annotation on the deployment, listings show them as "sleeping".
+GET /gameservers/{id} and POST /gameservers/{id}/resume scale them back up, timed until
+their pod is ready again. A connection through traefik can't wake a server, there is no
+pod behind the route to take it.
+
+Resumes work in every replica, the detector should run in one only (IDLE_DETECTOR_ENABLED, off
+by default).
+"""
+import re
+import time
+import asyncio
+import aiohttp
+from collections import defaultdict
+from .catalog import game_catalog
+from .metrics import registry, IDLE_SLEEPS, RESUME_SECONDS
+from ..k8.client import K8sClient, k8_cl, LAST_ACTIVE_ANNOTATION, CLAIMED_AT_ANNOTATION, \
+    gameserver_state, parse_timestamp
+from ..k8.informer import GameserverInformer, gs_informer
+
+# traefik names the service of an IngressRouteTCP after the route, which has the server-id in it
+SERVER_ID_RE = re.compile(r"gameserver-([0-9a-f]{32})")
+# seconds a resume is waited for before it's no longer timed
+RESUME_TIMEOUT = 600
+
+
+class IdleManager:
+    """Idle detection and resumes, see the module docstring."""
+
+    def __init__(self, k8: K8sClient, informer: GameserverInformer):
+        self.k8 = k8
+        self.informer = informer
+        self.informer.subscribe(self.on_event)
+
+        # game id -> seconds without connections until a server sleeps
+        self.timeouts: dict[int, float] = {}
+        self.default_timeout: float | None = None
+        self.interval = 30.0
+        self.concurrency = 10
+        self.metrics_url = ""
+        self.metric = "traefik_service_open_connections"
+
+        # server-id -> unix time it last had a connection
+        self.last_active: dict[str, float] = {}
+        # server-id -> (game, perf counter) of a resume waiting for its pod
+        self.resuming: dict[str, tuple[str, float]] = {}
+        # until a server was seen connected, it counts as active since the detector started
+        self.started = time.time()
+        self.session: aiohttp.ClientSession | None = None
+        self.task: asyncio.Task | None = None
+
+        self.checks = 0
+        self.sleeps = 0
+        self.resumes = 0
+        self.scrape_errors = 0
+
+    def configure(self, timeouts: dict[int, float], default_timeout: float | None = None, interval: float = 30,
+                  concurrency: int = 10, metrics_url: str = "", metric: str = "traefik_service_open_connections"):
+        self.timeouts = dict(timeouts)
+        self.default_timeout = default_timeout
+        self.interval = interval
+        self.concurrency = concurrency
+        self.metrics_url = metrics_url
+        self.metric = metric
+
+    @property
+    def enabled(self):
+        return bool(self.timeouts) or self.default_timeout is not None
+
+    def start(self):
+        self.started = time.time()
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        self.task = asyncio.create_task(self.run(), name="idle-detector")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    # ========== RESUME ==========
+
+    async def resume(self, server_id: str, game: str | None = None):
+        """Scale a sleeping gameserver back up, timed until the informer sees its pod ready."""
+        now = time.perf_counter()
+        self.resuming = {key: entry for key, entry in self.resuming.items() if now - entry[1] < RESUME_TIMEOUT}
+        self.resuming.setdefault(server_id, (game or "", now))
+        self.last_active[server_id] = time.time()
+        await self.k8.resume_gameserver(server_id)
+        self.resumes += 1
+
+    def on_event(self, kind: str, obj: dict):
+        if kind != "deployment" or not self.resuming:
+            return
+        server_id = (obj["metadata"].get("labels") or {}).get("server-id")
+        if server_id not in self.resuming or gameserver_state(obj) != "running":
+            return
+        game, start = self.resuming.pop(server_id)
+        RESUME_SECONDS.labels(game).observe(time.perf_counter() - start)
+
+    # ========== DETECTOR ==========
+
+    async def run(self):
+        # a partial cache would miss servers, not a big deal, but their idle time starts over
+        while not self.informer.synced:
+            await asyncio.sleep(0.1)
+
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"idle check failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    async def activity(self) -> dict[str, float]:
+        async with self.session.get(self.metrics_url) as resp:
+            resp.raise_for_status()
+            return open_connections(await resp.text(), self.metric)
+
+    async def check(self):
+        """Put every gameserver that has been idle for its game's timeout to sleep."""
+        try:
+            connections = await self.activity()
+        except Exception as e:
+            # without the signal every server would look idle
+            self.scrape_errors += 1
+            print(f"reading traefik metrics failed, no gameserver is put to sleep: {e!r}")
+            return
+
+        self.checks += 1
+        now = time.time()
+        for server_id, count in connections.items():
+            if count > 0:
+                self.last_active[server_id] = now
+
+        # a watch is failing, the cache may still show servers that were claimed or deleted since
+        if not self.informer.synced:
+            return
+
+        timeouts = {}
+        for game_id, timeout in self.timeouts.items():
+            game = await game_catalog.get(game_id)
+            if game is not None:
+                timeouts[game.short_name] = timeout
+
+        store = self.informer.store
+        # warm pool servers are kept running on purpose
+        pooled = set().union(*store.by_pool.values())
+        idle = []
+        for deployment in list(store.objects["deployment"].values()):
+            metadata = deployment["metadata"]
+            labels = metadata.get("labels") or {}
+            server_id = labels.get("server-id")
+            if not server_id or server_id in pooled or not deployment["spec"].get("replicas"):
+                continue
+            if gameserver_state(deployment) == "sleeping":
+                continue
+            timeout = timeouts.get(labels.get("game"), self.default_timeout)
+            if timeout is None:
+                continue
+
+            annotations = metadata.get("annotations") or {}
+            stamps = (annotations.get(LAST_ACTIVE_ANNOTATION), annotations.get(CLAIMED_AT_ANNOTATION),
+                      metadata.get("creationTimestamp"))
+            active = max([self.last_active.get(server_id, self.started)]
+                         + [parse_timestamp(stamp) for stamp in stamps if stamp])
+            if now - active >= timeout:
+                idle.append(deployment)
+
+        # forget servers that are gone
+        self.last_active = {key: value for key, value in self.last_active.items() if key in store.by_server_id}
+
+        if idle:
+            await self._sleep(idle)
+
+    async def _sleep(self, deployments: list[dict]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sleep(deployment: dict):
+            metadata = deployment["metadata"]
+            async with semaphore:
+                # a server resumed in the meantime has changed and stays up
+                if await self.k8.sleep_gameserver(metadata["labels"]["server-id"], metadata["resourceVersion"]):
+                    self.sleeps += 1
+                    IDLE_SLEEPS.labels(metadata["labels"].get("game", "")).inc()
+
+        results = await asyncio.gather(*(sleep(deployment) for deployment in deployments), return_exceptions=True)
+        for deployment, result in zip(deployments, results):
+            if isinstance(result, BaseException):
+                print(f"putting gameserver {deployment['metadata']['name']} to sleep failed: {result!r}")
+
+    # ========== STATS ==========
+
+    def stats(self):
+        return {
+            "detecting": self.task is not None,
+            "checks": self.checks,
+            "sleeps": self.sleeps,
+            "resumes": self.resumes,
+            "resuming": len(self.resuming),
+            "scrape_errors": self.scrape_errors,
+        }
+
+    def collect_metrics(self):
+        sleeping = defaultdict(int)
+        for deployment in self.informer.store.objects["deployment"].values():
+            if gameserver_state(deployment) == "sleeping":
+                sleeping[(deployment["metadata"].get("labels") or {}).get("game", "")] += 1
+        yield "gameserver_sleeping", "gauge", "Gameservers scaled to zero for being idle.", \
+            [({"game": game}, count) for game, count in sleeping.items()]
+
+
+def open_connections(text: str, metric: str) -> dict[str, float]:
+    """Open connections by server-id from a prometheus text exposition of traefik's metrics."""
+    connections = defaultdict(float)
+    prefix = metric + "{"
+    for line in text.splitlines():
+        if not line.startswith(prefix):
+            continue
+        labels, _, value = line.rpartition("}")
+        match = SERVER_ID_RE.search(labels)
+        if match:
+            connections[match.group(1)] += float(value.split()[0])
+    return connections
+
+
+idle_manager = IdleManager(k8_cl, gs_informer)
+registry.add_collector(idle_manager.collect_metrics)
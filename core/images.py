@@ -0,0 +1,429 @@
+"""Keeps the images of the games table cached on every node, and pins creates to image digests.
+
+A cold start on a node that never ran the game is mostly pulling its image. Every image of
+the games table (docker_image, and the same repository at each Version tag) gets a DaemonSet
+that pulls it onto each node and keeps it there, see prepull_manifest(). Tags are resolved to
+digests through the registry api and the daemonsets pull by digest, so a tag pointing
+somewhere new rolls its daemonset.
+
+Creates use the same digests (pinned()), so the kubelet finds exactly the image the node has
+cached instead of asking the registry what the tag points at now. Images without a digest
+yet are created by tag and resolved in the background.
+
+Digests are resolved in every replica, the daemonsets should be synced by one.
+"""
+import re
+import time
+import asyncio
+import hashlib
+import aiohttp
+import orjson
+from collections import defaultdict
+from sqlmodel import select
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio.session import AsyncSession
+from .metrics import registry
+from ..models import Game
+from ..k8.client import K8sClient, k8_cl, PREPULL_LABEL_SELECTOR, PREPULL_IMAGE_ANNOTATION, \
+    PREPULL_HASH_ANNOTATION, prepull_manifest
+
+# what a registry may answer a tag with, an index first so the digest covers every platform
+MANIFEST_TYPES = ", ".join((
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+))
+# key="value" pairs of a WWW-Authenticate challenge
+CHALLENGE_RE = re.compile(r'(\w+)="([^"]*)"')
+# seconds resolving the digests may hold up startup
+START_TIMEOUT = 10
+
+
+class ImageManager:
+    """Digests and pre-pull daemonsets of the catalog images, see the module docstring."""
+
+    def __init__(self, k8: K8sClient):
+        self.k8 = k8
+        self.engine: AsyncEngine | None = None
+
+        self.pin = True
+        self.prepull = False
+        self.interval = 300.0
+        self.concurrency = 8
+        self.insecure_registries: frozenset[str] = frozenset()
+        self.helper_image = "busybox:1.36"
+        self.pause_image = "registry.k8s.io/pause:3.9"
+
+        # image -> ids of the games using it, None until the games table was read
+        self.images: dict[str, set[int]] | None = None
+        # image -> digest its tag pointed at when last resolved
+        self.digests: dict[str, str] = {}
+        # image -> monotonic time its last resolve failed, creates don't retry it before the next refresh
+        self.failed: dict[str, float] = {}
+        # images resolved in the background for a create that found no digest
+        self.resolving: set[str] = set()
+        self.background: set[asyncio.Task] = set()
+        self.last_coverage: dict | None = None
+        self.session: aiohttp.ClientSession | None = None
+        self.task: asyncio.Task | None = None
+
+        self.resolves = 0
+        self.resolve_errors = 0
+        self.created = 0
+        self.rolled = 0
+        self.deleted = 0
+        self.sync_errors = 0
+
+    def configure(self, pin: bool = True, prepull: bool = False, interval: float = 300, concurrency: int = 8,
+                  insecure_registries: list[str] = (), helper_image: str = "busybox:1.36",
+                  pause_image: str = "registry.k8s.io/pause:3.9"):
+        self.pin = pin
+        self.prepull = prepull
+        self.interval = interval
+        self.concurrency = concurrency
+        self.insecure_registries = frozenset(insecure_registries)
+        self.helper_image = helper_image
+        self.pause_image = pause_image
+
+    @property
+    def enabled(self):
+        return self.pin or self.prepull
+
+    async def start(self, engine: AsyncEngine):
+        """Resolve the digests once, then keep them and the daemonsets up to date in the background."""
+        self.engine = engine
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        # creates right after startup are pinned already, and the warm pool doesn't build servers it replaces later
+        try:
+            await asyncio.wait_for(self.refresh_digests(), START_TIMEOUT)
+        except Exception as e:
+            print(f"resolving image digests failed: {e!r}")
+        self.task = asyncio.create_task(self.run(), name="image-manager")
+
+    async def stop(self):
+        tasks = list(self.background)
+        if self.task is not None:
+            tasks.append(self.task)
+            self.task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    # ========== DIGESTS ==========
+
+    def pinned(self, image: str) -> str:
+        """image pinned to the digest of its tag, the tag itself until that is known."""
+        if not self.pin:
+            return image
+        digest = self.digests.get(image)
+        if digest is None:
+            self._resolve_later(image)
+        return pin(image, digest)
+
+    def _resolve_later(self, image: str):
+        if self.session is None or "@" in image or image in self.resolving or image in self.failed:
+            return
+        self.resolving.add(image)
+        task = asyncio.create_task(self._resolve_later_task(image))
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def _resolve_later_task(self, image: str):
+        try:
+            await self.resolve(image)
+        finally:
+            self.resolving.discard(image)
+
+    async def resolve(self, image: str) -> str | None:
+        """Ask the registry for the digest of image, None when that fails (the last one known is kept)."""
+        try:
+            digest = await resolve_digest(self.session, image, self.insecure_registries)
+        except Exception as e:
+            self.resolve_errors += 1
+            self.failed[image] = time.monotonic()
+            error = f"registry error {e.status}" if isinstance(e, aiohttp.ClientResponseError) else repr(e)
+            print(f"resolving the digest of {image} failed: {error}, creating it by tag")
+            return None
+        self.resolves += 1
+        self.failed.pop(image, None)
+        self.digests[image] = digest
+        return digest
+
+    async def refresh_digests(self):
+        """Read the images of the games table and resolve all of them again."""
+        images = await self.catalog_images()
+        self.images = images
+        self.failed = {}
+        # forget the images no game uses anymore
+        self.digests = {image: digest for image, digest in self.digests.items() if image in images}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def resolve(image: str):
+            async with semaphore:
+                await self.resolve(image)
+
+        await asyncio.gather(*(resolve(image) for image in images))
+
+    async def catalog_images(self) -> dict[str, set[int]]:
+        """Every image of the games table by the ids of the games using it."""
+        async with AsyncSession(self.engine) as session:
+            result = await session.execute(select(Game))
+            games = result.scalars().all()
+
+        images = defaultdict(set)
+        for game in games:
+            images[game.docker_image].add(game.id)
+            for version in game.versions:
+                images[with_tag(game.docker_image, version.tag)].add(game.id)
+        return dict(images)
+
+    # ========== PRE-PULL ==========
+
+    async def run(self):
+        # start() has just resolved the digests
+        refresh = False
+        while True:
+            try:
+                if refresh:
+                    await self.refresh_digests()
+                if self.prepull:
+                    await self.sync_daemonsets()
+                    self.last_coverage = await self.coverage()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.sync_errors += 1
+                print(f"image refresh failed: {e!r}")
+            refresh = True
+            await asyncio.sleep(self.interval)
+
+    def desired_daemonsets(self) -> dict[str, dict]:
+        daemonsets = {}
+        for image in self.images or {}:
+            name = prepull_name(image)
+            # pulled by digest, a tag pointing somewhere new changes the template and rolls it
+            daemonsets[name] = prepull_manifest(name, image, pin(image, self.digests.get(image)),
+                                                self.helper_image, self.pause_image)
+        return daemonsets
+
+    async def sync_daemonsets(self):
+        """Create, roll and delete pre-pull daemonsets until there is one per catalog image."""
+        # an unread games table would look empty
+        if self.images is None:
+            return
+
+        desired = self.desired_daemonsets()
+        current = {daemonset["metadata"]["name"]: daemonset for daemonset in await self.k8.list_prepull_daemonsets()}
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync(name: str):
+            body, daemonset = desired.get(name), current.get(name)
+            async with semaphore:
+                if body is None:
+                    await self.k8.delete_prepull_daemonset(name)
+                    self.deleted += 1
+                elif daemonset is None:
+                    await self.k8.create_prepull_daemonset(orjson.dumps(body))
+                    self.created += 1
+                elif (daemonset["metadata"].get("annotations") or {}).get(PREPULL_HASH_ANNOTATION) \
+                        != body["metadata"]["annotations"][PREPULL_HASH_ANNOTATION]:
+                    await self.k8.patch_prepull_daemonset(name, {
+                        "metadata": {"annotations": body["metadata"]["annotations"]},
+                        "spec": {"template": body["spec"]["template"]}
+                    })
+                    self.rolled += 1
+
+        names = sorted(desired.keys() | current.keys())
+        results = await asyncio.gather(*(sync(name) for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                self.sync_errors += 1
+                print(f"syncing pre-pull daemonset {name} failed: {result!r}")
+
+    async def coverage(self) -> dict:
+        """Which schedulable nodes have which catalog images cached, read from the pre-pull pods."""
+        nodes, daemonsets, pods = await asyncio.gather(
+            self.k8.list_nodes(),
+            self.k8.list_prepull_daemonsets(),
+            self.k8.list_pods(PREPULL_LABEL_SELECTOR)
+        )
+        schedulable = sorted(node["metadata"]["name"] for node in nodes if is_schedulable(node))
+
+        # (daemonset, node) -> image its pod there has pulled
+        pulled = {}
+        for pod in orjson.loads(pods)["items"]:
+            name = (pod["metadata"].get("labels") or {}).get("prepull")
+            for status in (pod.get("status") or {}).get("initContainerStatuses") or []:
+                terminated = (status.get("state") or {}).get("terminated") or {}
+                if status["name"] == "image" and terminated.get("exitCode") == 0:
+                    pulled[(name, pod["spec"].get("nodeName"))] = _pulled_image(pod["spec"])
+
+        images = []
+        missing_by_node = defaultdict(list)
+        for daemonset in sorted(daemonsets, key=lambda daemonset: daemonset["metadata"]["name"]):
+            name = daemonset["metadata"]["name"]
+            image = (daemonset["metadata"].get("annotations") or {}).get(PREPULL_IMAGE_ANNOTATION)
+            # a pod still on the image before a roll doesn't count
+            pinned = _pulled_image(daemonset["spec"]["template"]["spec"])
+            missing = [node for node in schedulable if pulled.get((name, node)) != pinned]
+            for node in missing:
+                missing_by_node[node].append(image)
+            cached = len(schedulable) - len(missing)
+            images.append({
+                "image": image,
+                "pinned": pinned,
+                "games": sorted((self.images or {}).get(image, ())),
+                "daemonset": name,
+                "cached_nodes": cached,
+                "coverage": round(cached / len(schedulable), 3) if schedulable else None,
+                "missing_nodes": missing,
+            })
+
+        return {
+            "schedulable_nodes": len(schedulable),
+            "images": images,
+            "nodes": {
+                node: {
+                    "cached": len(images) - len(missing_by_node[node]),
+                    "coverage": round(1 - len(missing_by_node[node]) / len(images), 3) if images else None,
+                    "missing": missing_by_node[node],
+                }
+                for node in schedulable
+            },
+        }
+
+    # ========== STATS ==========
+
+    def list_images(self):
+        return [
+            {
+                "image": image,
+                "games": sorted(game_ids),
+                "digest": self.digests.get(image),
+                "daemonset": prepull_name(image),
+            }
+            for image, game_ids in sorted((self.images or {}).items())
+        ]
+
+    def stats(self):
+        return {
+            "pinning": self.pin,
+            "prepulling": self.prepull and self.task is not None,
+            "images": len(self.images or ()),
+            "resolved": len(self.digests),
+            "resolves": self.resolves,
+            "resolve_errors": self.resolve_errors,
+            "created": self.created,
+            "rolled": self.rolled,
+            "deleted": self.deleted,
+            "sync_errors": self.sync_errors,
+        }
+
+    def collect_metrics(self):
+        if self.last_coverage is None:
+            return
+        yield "image_prepull_schedulable_nodes", "gauge", "Schedulable nodes the catalog images are pre-pulled to.", \
+            [({}, self.last_coverage["schedulable_nodes"])]
+        yield "image_prepull_cached_nodes", "gauge", "Schedulable nodes with the current digest of an image cached.", \
+            [({"image": image["image"]}, image["cached_nodes"]) for image in self.last_coverage["images"]]
+
+
+def parse_image(image: str) -> tuple[str, str, str, str | None]:
+    """Registry, repository, tag and digest of an image reference, with docker's defaults."""
+    name, _, digest = image.partition("@")
+    tag = "latest"
+    # a colon after the last slash starts the tag, one before it is a registry port
+    if name.rfind(":") > name.rfind("/"):
+        name, _, tag = name.rpartition(":")
+    host, _, rest = name.partition("/")
+    if rest and ("." in host or ":" in host or host == "localhost"):
+        return host, rest, tag, digest or None
+    if "/" not in name:
+        name = f"library/{name}"
+    return "docker.io", name, tag, digest or None
+
+
+def with_tag(image: str, tag: str) -> str:
+    """image with its tag (and digest) replaced by tag."""
+    name = image.partition("@")[0]
+    if name.rfind(":") > name.rfind("/"):
+        name = name.rpartition(":")[0]
+    return f"{name}:{tag}"
+
+
+def pin(image: str, digest: str | None) -> str:
+    # the tag stays for people reading the spec, the runtime goes by the digest
+    if digest is None or "@" in image:
+        return image
+    return f"{image}@{digest}"
+
+
+def prepull_name(image: str) -> str:
+    return f"prepull-{hashlib.sha1(image.encode()).hexdigest()[:16]}"
+
+
+def is_schedulable(node: dict) -> bool:
+    """Ready, not cordoned and without taints a gameserver wouldn't tolerate."""
+    spec = node.get("spec") or {}
+    if spec.get("unschedulable"):
+        return False
+    if any(taint.get("effect") in ("NoSchedule", "NoExecute") for taint in spec.get("taints") or []):
+        return False
+    conditions = (node.get("status") or {}).get("conditions") or []
+    return any(condition["type"] == "Ready" and condition["status"] == "True" for condition in conditions)
+
+
+def _pulled_image(pod_spec: dict) -> str | None:
+    for container in pod_spec.get("initContainers") or []:
+        if container["name"] == "image":
+            return container["image"]
+    return None
+
+
+async def resolve_digest(session: aiohttp.ClientSession, image: str, insecure: frozenset[str] = frozenset()) -> str:
+    """Digest the tag of image points at, from a HEAD of its manifest on the registry."""
+    registry_host, repository, tag, digest = parse_image(image)
+    if digest:
+        return digest
+
+    host = "registry-1.docker.io" if registry_host == "docker.io" else registry_host
+    scheme = "http" if registry_host in insecure else "https"
+    url = f"{scheme}://{host}/v2/{repository}/manifests/{tag}"
+    headers = {"Accept": MANIFEST_TYPES}
+    async with session.head(url, headers=headers) as resp:
+        if resp.status != 401:
+            return _digest(resp, image)
+        challenge = resp.headers.get("WWW-Authenticate", "")
+
+    # an anonymous pull token, what docker hub and most public registries ask for
+    headers["Authorization"] = f"Bearer {await _token(session, challenge)}"
+    async with session.head(url, headers=headers) as resp:
+        return _digest(resp, image)
+
+
+def _digest(resp: aiohttp.ClientResponse, image: str) -> str:
+    resp.raise_for_status()
+    digest = resp.headers.get("Docker-Content-Digest")
+    if not digest:
+        raise ValueError(f"the registry sent no digest for {image}")
+    return digest
+
+
+async def _token(session: aiohttp.ClientSession, challenge: str) -> str:
+    params = dict(CHALLENGE_RE.findall(challenge))
+    realm = params.pop("realm", None)
+    if not challenge.lower().startswith("bearer") or realm is None:
+        raise ValueError(f"unsupported registry auth challenge {challenge!r}")
+    async with session.get(realm, params=params) as resp:
+        resp.raise_for_status()
+        body = await resp.json(content_type=None)
+    return body.get("token") or body["access_token"]
+
+
+image_manager = ImageManager(k8_cl)
+registry.add_collector(image_manager.collect_metrics)
@@ -0,0 +1,249 @@
+import time
+import functools
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Tuple
+
+# seconds, spans a fast cache hit to a slow api server call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str):
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = ""):
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # the last slot counts observations above every bucket (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # label values -> child, bind children once and keep them around on hot paths
+        self.children: Dict[Tuple[str, ...], object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_child()
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in self.children.items():
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, values, child: _CounterChild):
+        return [f"{self.name}{_labels(self.labelnames, values)} {child.value}"]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, values, child: _HistogramChild):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            labels = _labels(self.labelnames, values, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {child.sum}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {child.count}")
+        return lines
+
+
+class Registry:
+    """Metrics rendered in the prometheus text format.
+
+    Collectors are called on every scrape and return (name, type, help, samples)
+    for values that are cheaper to read than to keep updated, like pool gauges.
+    """
+
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+        self.collectors: list[Callable] = []
+
+    def register(self, metric: _Metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+
+        for collector in self.collectors:
+            for name, metric_type, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ========== METRICS ==========
+
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent handling a request, by route template.",
+    ("method", "route")
+))
+HTTP_RESPONSES = registry.register(Counter(
+    "http_responses_total", "Responses sent, by route template and status code.",
+    ("method", "route", "status")
+))
+
+K8S_CALL_SECONDS = registry.register(Histogram(
+    "k8s_client_call_duration_seconds", "Time spent in a K8sClient method.",
+    ("method",)
+))
+K8S_CALL_ERRORS = registry.register(Counter(
+    "k8s_client_call_errors_total", "K8sClient method failures, by api server status (0 when there was none).",
+    ("method", "status")
+))
+
+RECONCILE_SECONDS = registry.register(Histogram(
+    "gameserver_reconcile_duration_seconds", "Time spent reconciling a GameServer resource, by result.",
+    ("result",)
+))
+RECONCILE_REQUEUES = registry.register(Counter(
+    "gameserver_reconcile_requeues_total", "GameServer reconciles queued again after failing."
+))
+
+WARM_POOL_CLAIMS = registry.register(Counter(
+    "warm_pool_claims_total", "Creates of a pooled game, served from the warm pool (hit) or created from scratch (miss).",
+    ("game_id", "result")
+))
+WARM_POOL_CLAIM_SECONDS = registry.register(Histogram(
+    "warm_pool_claim_duration_seconds", "Time spent claiming a warm pool server, misses include failed attempts.",
+    ("game_id", "result")
+))
+
+IDLE_SLEEPS = registry.register(Counter(
+    "gameserver_idle_sleeps_total", "Gameservers scaled to zero for being idle.",
+    ("game",)
+))
+RESUME_SECONDS = registry.register(Histogram(
+    "gameserver_resume_duration_seconds", "Time from resuming a sleeping gameserver until it has a ready pod.",
+    ("game",),
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+))
+
+RPC_SECONDS = registry.register(Histogram(
+    "rabbit_rpc_duration_seconds", "Round trip of an rpc request until its reply.",
+    ("queue",)
+))
+RPC_TIMEOUTS = registry.register(Counter(
+    "rabbit_rpc_timeouts_total", "Rpc requests that got no reply in time.",
+    ("queue",)
+))
+
+
+def observe_k8s_call(fn):
+    """Time a K8sClient coroutine method and count its failures by api status."""
+    seconds = K8S_CALL_SECONDS.labels(fn.__name__)
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            K8S_CALL_ERRORS.labels(fn.__name__, str(getattr(e, "status", None) or 0)).inc()
+            raise
+        finally:
+            seconds.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def route_path(scope) -> str:
+    # included routers stay nested, their route only knows the path below the prefix
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    # unmatched paths share one label so scanners can't blow up the series count
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """Plain asgi middleware timing every http request by its route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = route_path(scope)
+            method = scope["method"]
+            HTTP_REQUEST_SECONDS.labels(method, path).observe(time.perf_counter() - start)
+            HTTP_RESPONSES.labels(method, path, str(status)).inc()
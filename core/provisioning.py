@@ -0,0 +1,64 @@
+from .config import config
+from .catalog import CatalogGame, game_catalog
+from .images import image_manager
+from ..k8.client import k8_cl
+from ..k8.templates import GameserverTemplate
+
+# jobs for the provisioning workers, see rabbit/handlers/provisioning.py
+PROVISION_QUEUE = "gameservers.provision"
+
+
+class ManifestTemplates:
+    """Compiled gameserver templates by game, all dropped when the catalog revision moves on."""
+
+    def __init__(self):
+        self.revision = None
+        self.crd = False
+        # game id -> (catalog game and image it was compiled from, template)
+        self.templates = {}
+        self.compiles = 0
+
+    def get(self, game: CatalogGame, revision: int, crd: bool = False) -> GameserverTemplate:
+        if revision != self.revision or crd != self.crd:
+            self.templates = {}
+            self.revision = revision
+            self.crd = crd
+
+        entry = self.templates.get(game.id)
+        # pinned to the digest of its tag, which changes without the game
+        image = image_manager.pinned(game.docker_image)
+        # the catalog hands out the same object until the game changes
+        if entry is None or entry[0] is not game or entry[1] != image:
+            entry = self.templates[game.id] = (game, image, GameserverTemplate(
+                game_name=game.short_name,
+                image=image,
+                requests_memory=game.memory_requests,
+                requests_cpu=game.cpu_requests,
+                limits_memory=game.memory_limits,
+                limits_cpu=game.cpu_limits,
+                game_port=game.port,
+                crd=crd
+            ))
+            self.compiles += 1
+        return entry[2]
+
+    def stats(self):
+        return {"templates": len(self.templates), "revision": self.revision, "crd": self.crd, "compiles": self.compiles}
+
+
+manifest_templates = ManifestTemplates()
+
+
+def manifests_from_catalog(server_id: str, game: CatalogGame, user_id: str, config_data: dict):
+    """Render the kubernetes objects of a gameserver for a validated catalog game, without submitting them."""
+    template = manifest_templates.get(game, game_catalog.revision, k8_cl.gameserver_crd)
+    return template.render(server_id, user_id, config_data)
+
+
+async def create_from_catalog(server_id: str, game: CatalogGame, user_id: str, config_data: dict):
+    """Create the kubernetes objects of a gameserver for a validated catalog game."""
+    return await k8_cl.create_gameserver_from_manifests(
+        server_id,
+        manifests_from_catalog(server_id, game, user_id, config_data),
+        debug=config.CREATE_TIMINGS_ENABLED
+    )
@@ -0,0 +1,136 @@
+from contextlib import nullcontext
+from .metrics import route_path
+
+# returned by span() while tracing is off, entering it costs next to nothing
+_NOOP = nullcontext()
+
+# kubernetes annotation carrying the trace of the request that created an object
+TRACE_ANNOTATION = "traceparent"
+
+
+class Tracing:
+    """Spans exported to a jsonl file or an OTLP collector, off unless setup() is called.
+
+    opentelemetry is only imported once enabled.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.provider = None
+        self.tracer = None
+        self.propagator = None
+        # the file the file exporter writes to, ConsoleSpanExporter doesn't close it
+        self.file = None
+
+    def setup(self, exporter: str = "file", sample_ratio: float = 0.1, file_path: str = "traces.jsonl",
+              otlp_endpoint: str | None = None, service_name: str = "gameserver-api"):
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+        from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+        from opentelemetry.trace.propagation.tracecontext import TraceContextTextMapPropagator
+
+        if exporter == "otlp":
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            span_exporter = OTLPSpanExporter(endpoint=otlp_endpoint)
+        else:
+            self.file = open(file_path, "a")
+            span_exporter = ConsoleSpanExporter(
+                out=self.file,
+                formatter=lambda span: span.to_json(indent=None) + "\n"
+            )
+
+        # head sampling, the root span decides and its children follow
+        self.provider = TracerProvider(
+            resource=Resource.create({"service.name": service_name}),
+            sampler=ParentBased(TraceIdRatioBased(sample_ratio))
+        )
+        self.provider.add_span_processor(BatchSpanProcessor(span_exporter))
+        self.tracer = self.provider.get_tracer("gameserver-api")
+        self.propagator = TraceContextTextMapPropagator()
+        self.enabled = True
+
+    def shutdown(self):
+        if self.provider is not None:
+            # flushes the spans still queued in the batch processor
+            self.provider.shutdown()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.enabled = False
+        self.provider = None
+        self.tracer = None
+
+    def span(self, name: str, attributes: dict | None = None, parent: dict | None = None, kind=None):
+        """Context manager for a span, parent is a carrier (e.g. message headers) to continue a trace from."""
+        if not self.enabled:
+            return _NOOP
+
+        kwargs = {"attributes": attributes}
+        if parent is not None:
+            kwargs["context"] = self.propagator.extract(parent)
+        if kind is not None:
+            kwargs["kind"] = kind
+        return self.tracer.start_as_current_span(name, **kwargs)
+
+    def start_span(self, name: str, attributes: dict | None = None):
+        """A child of the current span that is not made current itself, end() it when done. None while tracing is off.
+
+        For spans opened and closed in separate callbacks, where a context manager doesn't fit.
+        """
+        if not self.enabled:
+            return None
+        return self.tracer.start_span(name, attributes=attributes)
+
+    def inject(self, carrier: dict | None = None) -> dict | None:
+        """Add the current trace to a carrier like message headers, None while tracing is off."""
+        if not self.enabled:
+            return carrier
+        carrier = {} if carrier is None else carrier
+        self.propagator.inject(carrier)
+        return carrier
+
+    def annotations(self) -> dict | None:
+        """Annotations linking a kubernetes object to the current trace."""
+        carrier = self.inject()
+        if not carrier or "traceparent" not in carrier:
+            return None
+        return {TRACE_ANNOTATION: carrier["traceparent"]}
+
+
+tracing = Tracing()
+
+
+class TracingMiddleware:
+    """Starts the root span of every http request, continuing an incoming traceparent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracing.enabled:
+            return await self.app(scope, receive, send)
+
+        from opentelemetry.trace import SpanKind
+
+        carrier = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+            if key in (b"traceparent", b"tracestate")
+        }
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        with tracing.span(scope["method"], parent=carrier, kind=SpanKind.SERVER) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = route_path(scope)
+                span.update_name(f"{scope['method']} {route}")
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.response.status_code", status)
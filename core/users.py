@@ -0,0 +1,126 @@
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Tuple
+from aio_pika import IncomingMessage
+from ..rabbit.client import mq_cl
+
+USERS_UPDATED_EXCHANGE = "users.updated"
+
+
+class UserLookupError(Exception):
+    """The users service answered with an error instead of a user or a null for an unknown one."""
+
+
+class UserCache:
+    """LRU of users.get_by_id replies with a ttl, concurrent misses share one rpc."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60, negative_ttl: float = 10):
+        self.max_size = max_size
+        self.ttl = ttl
+        # unknown users are remembered for a shorter time
+        self.negative_ttl = negative_ttl
+
+        # user id -> (expires at, user or None)
+        self.users: OrderedDict[int, Tuple[float, dict | None]] = OrderedDict()
+        # user id -> rpc in flight for it
+        self.loads: Dict[int, asyncio.Task] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.rpc_calls = 0
+        self.invalidations = 0
+
+    def configure(self, max_size: int, ttl: float, negative_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    async def get(self, user_id: int) -> dict | None:
+        entry = self.users.get(user_id)
+        if entry is not None:
+            expires_at, user = entry
+            if expires_at > time.monotonic():
+                self.users.move_to_end(user_id)
+                self.hits += 1
+                if user is None:
+                    self.negative_hits += 1
+                return user
+            del self.users[user_id]
+
+        load = self.loads.get(user_id)
+        if load is None:
+            self.misses += 1
+            load = asyncio.create_task(self._load(user_id), name=f"user-load-{user_id}")
+            self.loads[user_id] = load
+            # every waiter may have given up by the time a failed load finishes
+            load.add_done_callback(lambda task: task.cancelled() or task.exception())
+        else:
+            self.coalesced += 1
+
+        # a waiter that gets cancelled must not cancel the rpc the others are waiting on
+        return await asyncio.shield(load)
+
+    async def _load(self, user_id: int) -> dict | None:
+        self.rpc_calls += 1
+        try:
+            response = await mq_cl.send_rpc_message("users.get_by_id", {"user_id": user_id})
+            # only an explicit {"data": null} means the user doesn't exist, anything else isn't cached
+            if not isinstance(response, dict) or response.get("error") or "data" not in response:
+                raise UserLookupError(f"users.get_by_id failed for user {user_id}: {response!r}")
+            user = response["data"]
+
+            # an invalidation while the rpc was in flight replaces the load, don't cache a stale reply
+            if self.loads.get(user_id) is asyncio.current_task():
+                self._put(user_id, user)
+            return user
+        finally:
+            if self.loads.get(user_id) is asyncio.current_task():
+                del self.loads[user_id]
+
+    def _put(self, user_id: int, user: dict | None):
+        ttl = self.ttl if user is not None else self.negative_ttl
+        self.users[user_id] = (time.monotonic() + ttl, user)
+        self.users.move_to_end(user_id)
+        while len(self.users) > self.max_size:
+            self.users.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None):
+        self.invalidations += 1
+        if user_id is None:
+            self.users.clear()
+            self.loads.clear()
+        else:
+            self.users.pop(user_id, None)
+            self.loads.pop(user_id, None)
+
+    async def on_user_updated(self, msg: IncomingMessage):
+        """Handler for the users.updated fanout, the body carries the changed user_id."""
+        try:
+            user_id = int(json.loads(msg.body.decode())["user_id"])
+        except (ValueError, KeyError, TypeError):
+            # anything we can't make sense of drops the whole cache
+            user_id = None
+
+        self.invalidate(user_id)
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "users": len(self.users),
+            "in_flight": len(self.loads),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "rpc_calls": self.rpc_calls,
+            "rpc_saved": self.hits + self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserCache()
@@ -0,0 +1,325 @@
+"""Running but unassigned gameservers per game, claimed by creates instead of starting a server.
+
+A claim is one patch with a resourceVersion precondition (K8sClient.claim_gameserver), so
+concurrent claims never get the same server, not even from different replicas. Claims read
+the pools from the informer cache and work in every replica. The refiller tops the pools up
+and shrinks them to the recent demand, it should run in one replica only (WARM_POOL_REFILL_ENABLED,
+off by default).
+
+Pool servers start without owner and config, claiming one with config restarts its pod
+with that config, which still skips scheduling and creating the objects.
+"""
+import math
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import orjson
+from collections import defaultdict
+from .catalog import CatalogGame, game_catalog
+from .images import image_manager
+from .metrics import registry, WARM_POOL_CLAIMS, WARM_POOL_CLAIM_SECONDS
+from .provisioning import manifest_templates
+from ..k8.client import K8sClient, k8_cl, API_EXCEPTIONS, HTTP_CONFLICT, POOL_LABEL, POOL_SPEC_LABEL, \
+    CLAIMED_AT_ANNOTATION, parse_timestamp
+from ..k8.informer import GameserverInformer, gs_informer
+
+# pool servers tried before a create falls back to starting a new one
+CLAIM_ATTEMPTS = 3
+# seconds a claimed server is skipped, until the cache shows it without the pool label
+CLAIMED_TTL = 60
+
+
+class WarmPool:
+    """Warm pools of the games in WARM_POOL_SIZES, see the module docstring."""
+
+    def __init__(self, k8: K8sClient, informer: GameserverInformer):
+        self.k8 = k8
+        self.informer = informer
+
+        # game id -> most servers kept warm
+        self.sizes: dict[int, int] = {}
+        self.min_size = 1
+        self.demand_window = 600.0
+        self.lead_time = 120.0
+        self.concurrency = 4
+        self.interval = 5.0
+
+        # server-id -> monotonic time, claimed here but maybe not in the cache yet
+        self.claimed: dict[str, float] = {}
+        # server-id -> (game id, monotonic time), created by the refiller but maybe not in the cache yet
+        self.creating: dict[str, tuple[int, float]] = {}
+        # game id -> size the refiller last aimed for
+        self.targets: dict[int, int] = {}
+        self.task: asyncio.Task | None = None
+
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.created = 0
+        self.deleted = 0
+        self.errors = 0
+
+    def configure(self, sizes: dict[int, int], min_size: int = 1, demand_window: float = 600,
+                  lead_time: float = 120, concurrency: int = 4, interval: float = 5):
+        self.sizes = dict(sizes)
+        self.min_size = min_size
+        self.demand_window = demand_window
+        self.lead_time = lead_time
+        self.concurrency = concurrency
+        self.interval = interval
+
+    @property
+    def enabled(self):
+        return bool(self.sizes)
+
+    def has_pool(self, game_id: int):
+        return game_id in self.sizes
+
+    def start(self):
+        self.task = asyncio.create_task(self.run(), name="warm-pool")
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+    # ========== CLAIMS ==========
+
+    async def claim(self, game: CatalogGame, user_id: str, config_data: dict) -> dict | None:
+        """Hand a ready pool server of game to user_id, None when there is none to claim."""
+        start = time.perf_counter()
+        server_id = await self._claim(game, user_id, config_data)
+        result = "hit" if server_id else "miss"
+        (self.hits if server_id else self.misses)[game.id] += 1
+        WARM_POOL_CLAIMS.labels(str(game.id), result).inc()
+        WARM_POOL_CLAIM_SECONDS.labels(str(game.id), result).observe(time.perf_counter() - start)
+        if server_id is None:
+            return None
+        return {"server_id": server_id, "status": "created", "claimed": True}
+
+    async def _claim(self, game: CatalogGame, user_id: str, config_data: dict) -> str | None:
+        # without the cache there is nothing to pick from
+        if not self.has_pool(game.id) or not self.informer.synced:
+            return None
+
+        spec = pool_spec(game)
+        candidates = [
+            resource for resource in self.informer.store.pool_servers(str(game.id))
+            if is_ready(resource)
+            and resource["metadata"]["labels"].get(POOL_SPEC_LABEL) == spec
+            and resource["metadata"]["labels"]["server-id"] not in self.claimed
+        ]
+        # replicas claiming at the same time rarely go for the same server
+        random.shuffle(candidates)
+
+        for resource in candidates[:CLAIM_ATTEMPTS]:
+            server_id = resource["metadata"]["labels"]["server-id"]
+            self.claimed[server_id] = time.monotonic()
+            try:
+                await self.k8.claim_gameserver(server_id, resource["metadata"]["resourceVersion"], user_id, config_data)
+                return server_id
+            except API_EXCEPTIONS as e:
+                if e.status == HTTP_CONFLICT:
+                    # claimed by someone else or being deleted by the refiller
+                    continue
+                error = f"api error {e.status}"
+            except Exception as e:
+                error = repr(e)
+
+            # maybe half claimed, nobody gets a server like that
+            print(f"claiming warm pool gameserver {server_id} failed: {error}, deleting it")
+            try:
+                await self.k8.delete_gameserver(server_id)
+            except Exception as e:
+                print(f"deleting warm pool gameserver {server_id} failed: {e!r}")
+        return None
+
+    # ========== REFILLER ==========
+
+    async def run(self):
+        # a partial cache would look like empty pools
+        while not self.informer.synced:
+            await asyncio.sleep(0.1)
+
+        while True:
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                print(f"warm pool refill failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    async def refill(self):
+        # a watch is failing, the pools may look emptier or fuller than they are
+        if not self.informer.synced:
+            return
+
+        store = self.informer.store
+        now = time.monotonic()
+        self.claimed = {server_id: at for server_id, at in self.claimed.items() if now - at < CLAIMED_TTL}
+        self.creating = {
+            server_id: entry for server_id, entry in self.creating.items()
+            if now - entry[1] < CLAIMED_TTL and store.main_kind not in store.by_server_id.get(server_id, ())
+        }
+
+        for game_id in self.sizes:
+            game = await game_catalog.get(game_id)
+            if game is None:
+                continue
+            await self.refill_game(game)
+
+    async def refill_game(self, game: CatalogGame):
+        """Create or delete pool servers of one game until it has its target size."""
+        spec = pool_spec(game)
+        current, stale = [], []
+        for resource in self.informer.store.pool_servers(str(game.id)):
+            labels = resource["metadata"]["labels"]
+            if labels["server-id"] in self.claimed:
+                continue
+            (current if labels.get(POOL_SPEC_LABEL) == spec else stale).append(resource)
+
+        target = self.targets[game.id] = self.target(game.id, self.demand(game))
+        # keep the ready ones, starting servers go first
+        current.sort(key=is_ready, reverse=True)
+        # creates still in flight count towards the target, but never push out a server that exists.
+        # When they turn out to be too many they show up as starting servers and go on a later pass
+        creating = sum(1 for game_id, _ in self.creating.values() if game_id == game.id)
+        missing = target - len(current) - creating
+
+        surplus = stale + current[target:]
+        if surplus:
+            await self._delete(surplus)
+
+        if missing > 0:
+            gameservers = []
+            for _ in range(missing):
+                server_id = uuid.uuid4().hex
+                self.creating[server_id] = (game.id, time.monotonic())
+                gameservers.append((server_id, pool_manifests(server_id, game, spec, self.k8.gameserver_crd)))
+
+            results = await self.k8.create_gameservers(gameservers, concurrency=self.concurrency)
+            for (server_id, _), result in zip(gameservers, results):
+                if isinstance(result, BaseException):
+                    self.creating.pop(server_id, None)
+                    self.errors += 1
+                    print(f"creating warm pool gameserver {server_id} failed: {result!r}")
+                else:
+                    self.created += 1
+
+    async def _delete(self, resources: list[dict]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def delete(resource: dict):
+            async with semaphore:
+                metadata = resource["metadata"]
+                # a server claimed in the meantime has moved on and is left alone
+                return await self.k8.delete_gameserver_if_unchanged(metadata["labels"]["server-id"],
+                                                                    metadata["resourceVersion"])
+
+        results = await asyncio.gather(*(delete(resource) for resource in resources), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                self.errors += 1
+                print(f"deleting warm pool gameserver failed: {result!r}")
+            elif result:
+                self.deleted += 1
+
+    def demand(self, game: CatalogGame) -> int:
+        """Servers of game handed out within the demand window, claimed or started.
+
+        Counted from the cache, so it includes the creates of every replica.
+        """
+        store = self.informer.store
+        cutoff = time.time() - self.demand_window
+        count = 0
+        for server_id in store.by_game.get(game.short_name, ()):
+            for resource in store.by_server_id[server_id].get(store.main_kind, {}).values():
+                metadata = resource["metadata"]
+                if POOL_LABEL in metadata["labels"]:
+                    continue
+                handed_out = (metadata.get("annotations") or {}).get(CLAIMED_AT_ANNOTATION) \
+                    or metadata.get("creationTimestamp")
+                if handed_out and parse_timestamp(handed_out) >= cutoff:
+                    count += 1
+        return count
+
+    def target(self, game_id: int, demand: int) -> int:
+        # the creates expected while a new pool server gets ready
+        expected = math.ceil(demand * self.lead_time / self.demand_window)
+        return min(self.sizes[game_id], max(self.min_size, expected))
+
+    # ========== STATS ==========
+
+    def _counts(self, game_id: int):
+        servers = self.informer.store.pool_servers(str(game_id))
+        ready = sum(1 for resource in servers if is_ready(resource))
+        return ready, len(servers) - ready
+
+    def stats(self):
+        games = {}
+        for game_id, size in self.sizes.items():
+            ready, starting = self._counts(game_id)
+            hits, misses = self.hits[game_id], self.misses[game_id]
+            games[game_id] = {
+                "ready": ready,
+                "starting": starting,
+                "target": self.targets.get(game_id),
+                "max": size,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+        return {
+            "refilling": self.task is not None,
+            "created": self.created,
+            "deleted": self.deleted,
+            "errors": self.errors,
+            "games": games,
+        }
+
+    def collect_metrics(self):
+        if not self.sizes:
+            return
+        ready, starting, targets = [], [], []
+        for game_id in self.sizes:
+            labels = {"game_id": str(game_id)}
+            game_ready, game_starting = self._counts(game_id)
+            ready.append((labels, game_ready))
+            starting.append((labels, game_starting))
+            if game_id in self.targets:
+                targets.append((labels, self.targets[game_id]))
+        yield "warm_pool_ready_servers", "gauge", "Unclaimed warm pool servers ready to be claimed.", ready
+        yield "warm_pool_starting_servers", "gauge", "Unclaimed warm pool servers still starting.", starting
+        yield "warm_pool_target_servers", "gauge", "Size the refiller keeps a warm pool at.", targets
+
+
+def pool_spec(game: CatalogGame) -> str:
+    """Digest of what a pool server is built from, servers of an older version or image digest get replaced."""
+    spec = (game.short_name, image_manager.pinned(game.docker_image), game.cpu_requests, game.cpu_limits,
+            game.memory_requests, game.memory_limits, game.port)
+    return hashlib.sha1(orjson.dumps(spec)).hexdigest()[:16]
+
+
+def pool_manifests(server_id: str, game: CatalogGame, spec: str, crd: bool = False) -> dict[str, bytes]:
+    """A server of game without owner and config, labelled as part of the game's pool."""
+    template = manifest_templates.get(game, game_catalog.revision, crd)
+    manifests = template.render(server_id, "", {})
+    for component, body in manifests.items():
+        manifest = orjson.loads(body)
+        manifest["metadata"]["labels"].update({POOL_LABEL: str(game.id), POOL_SPEC_LABEL: spec})
+        manifests[component] = orjson.dumps(manifest)
+    return manifests
+
+
+def is_ready(resource: dict) -> bool:
+    # deployments and GameServer resources both report it
+    return ((resource.get("status") or {}).get("readyReplicas") or 0) > 0
+
+
+warm_pool = WarmPool(k8_cl, gs_informer)
+registry.add_collector(warm_pool.collect_metrics)
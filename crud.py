@@ -3,3 +3,36 @@ from datetime import datetime
 from sqlmodel import select, col, delete
 from sqlalchemy.ext.asyncio.session import AsyncSession
 
+# ========== OPERATIONS ==========
+
+async def create_operation(session: AsyncSession, operation: Operation) -> Operation:
+    session.add(operation)
+    await session.commit()
+    await session.refresh(operation)
+    return operation
+
+
+async def get_operation(session: AsyncSession, operation_id: str) -> Operation | None:
+    return await session.get(Operation, operation_id)
+
+
+async def get_operation_by_idempotency_key(session: AsyncSession, user_id: str, idempotency_key: str) -> Operation | None:
+    result = await session.execute(select(Operation).where(
+        Operation.user_id == user_id,
+        Operation.idempotency_key == idempotency_key
+    ))
+    return result.scalar_one_or_none()
+
+
+async def update_operation(session: AsyncSession, operation_id: str, **values) -> Operation | None:
+    operation = await session.get(Operation, operation_id)
+    if operation is None:
+        return None
+
+    for key, value in values.items():
+        setattr(operation, key, value)
+    operation.updated_at = datetime.now(UTC)
+
+    await session.commit()
+    await session.refresh(operation)
+    return operation
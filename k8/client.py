@@ -1,5 +1,16 @@
 import os
+import re
+import time
+import hashlib
+import calendar
+import asyncio
+import threading
+import orjson
+from fastapi.concurrency import run_in_threadpool
+from ..core.metrics import observe_k8s_call
+from ..core.tracing import tracing
 from kubernetes import client, config
+from kubernetes_asyncio import client as async_client, config as async_config
 from kubernetes.client import V1ObjectMeta
 # configmap
 from kubernetes.client import V1ConfigMap
@@ -9,332 +20,932 @@ from kubernetes.client import V1Deployment, V1DeploymentSpec, V1LabelSelector, V
 # service
 from kubernetes.client import V1Service, V1ServiceSpec, V1ServicePort
 
+# both client libraries raise their own ApiException, catch either
+API_EXCEPTIONS = (client.exceptions.ApiException, async_client.exceptions.ApiException)
+
+# the GameServer custom resource, see manifests/gameserver-crd.yml
+GAMESERVER_GROUP = "kondukter.dev"
+GAMESERVER_VERSION = "v1alpha1"
+GAMESERVER_PLURAL = "gameservers"
+# continue tokens of listings that moved on from GameServer resources to older deployments
+LEGACY_CONTINUE = "legacy:"
+
+MERGE_PATCH = "application/merge-patch+json"
+
+# unassigned warm pool servers carry these labels until they are claimed, see core/warm_pool.py
+POOL_LABEL = "pool"
+POOL_SPEC_LABEL = "pool-spec"
+CLAIMED_AT_ANNOTATION = "kondukter.dev/claimed-at"
+# pod template annotation, a config change rolls the pods so they start with the new environment
+CONFIG_HASH_ANNOTATION = "kondukter.dev/config-hash"
+# deployment annotations of the idle detector, see core/idle.py
+SLEEPING_ANNOTATION = "kondukter.dev/sleeping-since"
+LAST_ACTIVE_ANNOTATION = "kondukter.dev/last-active"
+# the catalog image a pre-pull daemonset keeps cached, and the digest of its pod template, see core/images.py
+PREPULL_LABEL_SELECTOR = "app=image-prepull"
+PREPULL_IMAGE_ANNOTATION = "kondukter.dev/image"
+PREPULL_HASH_ANNOTATION = "kondukter.dev/prepull-hash"
+
+HTTP_NOT_FOUND = 404
+HTTP_CONFLICT = 409
+
+
+class CreateSkipped(Exception):
+    """A create of a fail_fast batch that wasn't attempted because another one failed."""
+
+
 class K8sClient:
     def __init__(self):
-        pass
+        # "async" uses kubernetes_asyncio (aiohttp, pooled keep-alive connections)
+        # "threadpool" runs the blocking kubernetes client in starlette's threadpool
+        self.mode = "async"
 
+        self.api_client = None
         self.v1_api = None
         self.v1_app_api = None
         self.crd_api = None
 
         self.namespace = "gs"
+        # create gameservers as a single GameServer resource, its objects are left to the reconciler
+        self.gameserver_crd = False
 
-    def load_service_account(self):
-        # config.load_incluster_config()
-
+    async def load_service_account(self, mode: str = "async", pool_maxsize: int = 50):
+        self.mode = mode
         # Detect if running in cluster
-        if os.environ.get("KUBERNETES_SERVICE_HOST"):
-            config.load_incluster_config()
+        in_cluster = bool(os.environ.get("KUBERNETES_SERVICE_HOST"))
+
+        if mode == "async":
+            configuration = async_client.Configuration()
+            if in_cluster:
+                async_config.load_incluster_config(client_configuration=configuration)
+            else:
+                contexts, active_context = async_config.list_kube_config_contexts()
+                await async_config.load_kube_config(context=active_context["name"], client_configuration=configuration)
+
+            # size of the aiohttp connector, connections are kept alive between calls
+            configuration.connection_pool_maxsize = pool_maxsize
+            self.api_client = async_client.ApiClient(configuration)
+
+            self.v1_api = async_client.CoreV1Api(self.api_client)
+            self.v1_app_api = async_client.AppsV1Api(self.api_client)
+            self.crd_api = async_client.CustomObjectsApi(self.api_client)
         else:
-            contexts, active_context = config.list_kube_config_contexts()
-            config.load_kube_config(context=active_context["name"])
+            configuration = client.Configuration()
+            if in_cluster:
+                config.load_incluster_config(client_configuration=configuration)
+            else:
+                contexts, active_context = config.list_kube_config_contexts()
+                config.load_kube_config(context=active_context["name"], client_configuration=configuration)
+
+            # urllib3 pool size, should match the threadpool size so threads don't wait on sockets
+            configuration.connection_pool_maxsize = pool_maxsize
+            self.api_client = client.ApiClient(configuration)
+
+            self.v1_api = client.CoreV1Api(self.api_client)
+            self.v1_app_api = client.AppsV1Api(self.api_client)
+            self.crd_api = client.CustomObjectsApi(self.api_client)
+
+    async def close(self):
+        if self.api_client is None:
+            return
+        if self.mode == "async":
+            await self.api_client.close()
+        else:
+            self.api_client.close()
+        self.api_client = None
+
+    async def _call(self, fn, *args, **kwargs):
+        """Run a kubernetes api call without blocking the event loop."""
+        if self.mode == "async":
+            return await fn(*args, **kwargs)
+        return await run_in_threadpool(fn, *args, **kwargs)
+
+    async def _call_bytes(self, fn, *args, **kwargs) -> bytes:
+        """Like _call, but skips model deserialization and returns the raw json body."""
+        kwargs["_preload_content"] = False
+        if self.mode == "async":
+            resp = await fn(*args, **kwargs)
+            try:
+                # kubernetes_asyncio only raises for error statuses when preloading
+                if not 200 <= resp.status <= 299:
+                    raise async_client.exceptions.ApiException(status=resp.status, reason=resp.reason)
+                return await resp.read()
+            finally:
+                resp.release()
+
+        return await run_in_threadpool(lambda: fn(*args, **kwargs).data)
 
+    async def _call_raw(self, fn, *args, **kwargs):
+        """Like _call_bytes, but returns the parsed json body."""
+        if self.mode == "async":
+            return orjson.loads(await self._call_bytes(fn, *args, **kwargs))
 
-        # get serviceAccount
-        self.v1_api = client.CoreV1Api()
-        self.v1_app_api = client.AppsV1Api()
-        self.crd_api = client.CustomObjectsApi()
+        kwargs["_preload_content"] = False
+        # parse in the worker thread too, big lists take a while
+        return await run_in_threadpool(lambda: orjson.loads(fn(*args, **kwargs).data))
+
+    async def _create_raw(self, path: str, body: bytes):
+        """POST an already serialized json body, skipping model validation and serialization.
+
+        The client libraries only pass a body through untouched for non-json content types,
+        so it goes out as application/yaml, which the api server parses json as too.
+        """
+        headers = {"Content-Type": "application/yaml", "Accept": "application/json"}
+        if self.mode == "async":
+            # raises ApiException for error statuses
+            await self.api_client.call_api(path, "POST", header_params=headers, body=body, auth_settings=["BearerToken"])
+            return
+
+        def post():
+            request = self.api_client.param_serialize("POST", path, header_params=headers, body=body,
+                                                      auth_settings=["BearerToken"])
+            resp = self.api_client.call_api(*request)
+            resp.read()
+            if not 200 <= resp.status <= 299:
+                raise client.exceptions.ApiException(http_resp=resp)
+
+        await run_in_threadpool(post)
+
+    async def watch(self, fn, **kwargs):
+        """Stream raw watch events ({"type": ..., "object": {...}}) of a list call."""
+        kwargs["watch"] = True
+        kwargs["_preload_content"] = False
+
+        if self.mode == "async":
+            resp = await fn(**kwargs)
+            try:
+                if not 200 <= resp.status <= 299:
+                    raise async_client.exceptions.ApiException(status=resp.status, reason=resp.reason)
+                async for event in _iter_events(resp.content.iter_any()):
+                    yield event
+            finally:
+                resp.release()
+            return
+
+        resp = await run_in_threadpool(fn, **kwargs)
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue()
+
+        finished = threading.Event()
+
+        def pump():
+            try:
+                for chunk in resp.stream(64 * 1024):
+                    loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+            except Exception as e:
+                loop.call_soon_threadsafe(chunks.put_nowait, e)
+            finished.set()
+            loop.call_soon_threadsafe(chunks.put_nowait, None)
+
+        async def drain():
+            while (chunk := await chunks.get()) is not None:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+
+        # reading a watch blocks for its whole lifetime, so it gets its own thread
+        # instead of a slot in the request threadpool
+        threading.Thread(target=pump, daemon=True).start()
+        try:
+            async for event in _iter_events(drain()):
+                yield event
+        finally:
+            # unblocks the pump thread if we stop early
+            if not finished.is_set():
+                resp.shutdown()
+                resp.close()
 
     # ========== GAMESERVER CRUD OPERATIONS ==========
 
-    def create_gameserver(self, server_id: str, game_name: str, user_id: str, image: str, 
+    @observe_k8s_call
+    async def create_gameserver(self, server_id: str, game_name: str, user_id: str, image: str, 
                          requests_memory: str, requests_cpu: str,
                          limits_memory: str, limits_cpu: str,
-                         game_port: int, config_data: dict):
+                         game_port: int, config_data: dict, debug: bool = False):
         """Create a complete gameserver with configmap, deployment, service, and traefik route."""
-        
-        # Create all components
-        self.create_gameserver_config_map(server_id, user_id, config_data)
-        self.create_gameserver_deployment(server_id, game_name, user_id, image, requests_memory, requests_cpu, 
-                                        limits_memory, limits_cpu, game_port)
-        self.create_gameserver_service(server_id, user_id, game_port)
-        self.create_gameserver_traefik_route(server_id, user_id)
-        
-        return {"server_id": server_id, "status": "created"}
-
-    def get_gameserver(self, server_id: str):
+        if self.gameserver_crd:
+            manifests = {"gameserver": gameserver_resource_manifest(
+                server_id, game_name, user_id, image, requests_memory, requests_cpu,
+                limits_memory, limits_cpu, game_port, config_data
+            )}
+        else:
+            manifests = gameserver_manifests(server_id, game_name, user_id, image, requests_memory, requests_cpu,
+                                             limits_memory, limits_cpu, game_port, config_data)
+        return await self.create_gameserver_from_manifests(server_id, manifests, debug)
+
+    @observe_k8s_call
+    async def create_gameserver_from_manifests(self, server_id: str, manifests: dict, debug: bool = False):
+        """Submit the manifests of a gameserver, models from gameserver_manifests() or json rendered by a template.
+
+        The components only reference each other by name, so they are created concurrently.
+        If any of them fails, the ones that were created are deleted again before re-raising.
+        With the GameServer resource there is just one component, "gameserver".
+        """
+        steps = list(manifests)
+        timings = {}
+
+        async def timed(step: str, body):
+            start = time.perf_counter()
+            try:
+                with tracing.span(f"k8s.create_{step}"):
+                    return await self.create_gameserver_component(step, body)
+            finally:
+                timings[step] = round((time.perf_counter() - start) * 1000, 2)
+
+        results = await asyncio.gather(
+            *(timed(step, manifests[step]) for step in steps),
+            return_exceptions=True
+        )
+
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            created = [step for step, result in zip(steps, results) if not isinstance(result, BaseException)]
+            await self.rollback_gameserver(server_id, created)
+            raise errors[0]
+
+        result = {"server_id": server_id, "status": "created"}
+        if debug:
+            result["timings"] = timings
+        return result
+
+    @observe_k8s_call
+    async def create_gameservers(self, gameservers: list[tuple[str, dict]], concurrency: int = 10,
+                                 fail_fast: bool = False):
+        """Create many gameservers from (server_id, manifests) pairs, at most `concurrency` at a time.
+
+        Returns a result per gameserver in the given order, or the exception it failed with
+        (its created components are already deleted again). With fail_fast, creates that
+        haven't started when one fails are skipped with CreateSkipped.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        failed = False
+
+        async def create(server_id: str, manifests: dict):
+            nonlocal failed
+            async with semaphore:
+                if fail_fast and failed:
+                    raise CreateSkipped(f"gameserver {server_id} skipped, another one in the batch failed")
+                try:
+                    return await self.create_gameserver_from_manifests(server_id, manifests)
+                except Exception:
+                    failed = True
+                    raise
+
+        return await asyncio.gather(
+            *(create(server_id, manifests) for server_id, manifests in gameservers),
+            return_exceptions=True
+        )
+
+    @observe_k8s_call
+    async def rollback_gameserver(self, server_id: str, steps: list[str]):
+        """Delete the components of a partially created gameserver."""
+        deletes = {
+            "config_map": self.delete_gameserver_config_map,
+            "deployment": self.delete_gameserver_deployment,
+            "service": self.delete_gameserver_service,
+            "traefik_route": self.delete_gameserver_traefik_route,
+            "gameserver": self.delete_gameserver_resource,
+        }
+        results = await asyncio.gather(
+            *(deletes[step](server_id) for step in steps),
+            return_exceptions=True
+        )
+        for step, result in zip(steps, results):
+            if isinstance(result, BaseException):
+                print(f"rollback of {step} for gameserver {server_id} failed: {result!r}")
+
+    @observe_k8s_call
+    async def get_gameserver(self, server_id: str):
         """Get a single gameserver by server_id."""
+        if self.gameserver_crd:
+            return await self._get_gameserver_resource(server_id)
+
         try:
             # Get deployment (main resource)
-            deployment = self.v1_app_api.read_namespaced_deployment(
+            deployment = await self._call_raw(
+                self.v1_app_api.read_namespaced_deployment,
                 name=f"gameserver-{server_id}",
                 namespace=self.namespace
             )
             
             # Get service
-            service = self.v1_api.read_namespaced_service(
+            service = await self._call_raw(
+                self.v1_api.read_namespaced_service,
                 name=f"gameserver-{server_id}",
                 namespace=self.namespace
             )
             
             # Get configmap
-            config_map = self.v1_api.read_namespaced_config_map(
+            config_map = await self._call_raw(
+                self.v1_api.read_namespaced_config_map,
                 name=f"config-{server_id}",
                 namespace=self.namespace
             )
             
             # Get pods
-            pods = self.v1_api.list_namespaced_pod(
+            pods = await self._call_raw(
+                self.v1_api.list_namespaced_pod,
                 namespace=self.namespace,
                 label_selector=f"server-id={server_id}"
             )
             
             return {
                 "server_id": server_id,
-                "deployment": deployment.to_dict(),
-                "service": service.to_dict(),
-                "config_map": config_map.to_dict(),
-                "pods": pods.to_dict()
+                "deployment": deployment,
+                "service": service,
+                "config_map": config_map,
+                "pods": pods
             }
             
-        except client.exceptions.ApiException as e:
+        except API_EXCEPTIONS as e:
             if e.status == 404:
                 return None
             raise e
 
-    def list_gameservers(self):
-        """List all gameservers."""
-        deployments = self.v1_app_api.list_namespaced_deployment(
-            namespace=self.namespace,
-            label_selector="app=gameserver"
+    async def _get_gameserver_resource(self, server_id: str):
+        """get_gameserver for GameServer resources, objects the reconciler hasn't created yet are None."""
+        results = await asyncio.gather(
+            self._call_raw(
+                self.crd_api.get_namespaced_custom_object,
+                group=GAMESERVER_GROUP,
+                version=GAMESERVER_VERSION,
+                plural=GAMESERVER_PLURAL,
+                name=f"gameserver-{server_id}",
+                namespace=self.namespace
+            ),
+            self._call_raw(self.v1_app_api.read_namespaced_deployment, name=f"gameserver-{server_id}", namespace=self.namespace),
+            self._call_raw(self.v1_api.read_namespaced_service, name=f"gameserver-{server_id}", namespace=self.namespace),
+            self._call_raw(self.v1_api.read_namespaced_config_map, name=f"config-{server_id}", namespace=self.namespace),
+            self._call_raw(self.v1_api.list_namespaced_pod, namespace=self.namespace, label_selector=f"server-id={server_id}"),
+            return_exceptions=True
         )
-        
+        for result in results:
+            if isinstance(result, BaseException) and not (isinstance(result, API_EXCEPTIONS) and result.status == 404):
+                raise result
+
+        gameserver, deployment, service, config_map, pods = [
+            None if isinstance(result, BaseException) else result for result in results
+        ]
+        if gameserver is None:
+            # created before the switch to GameServer resources, read the way it was created
+            if deployment is None or service is None or config_map is None or not is_legacy_deployment(deployment):
+                return None
+            return {
+                "server_id": server_id,
+                "deployment": deployment,
+                "service": service,
+                "config_map": config_map,
+                "pods": pods
+            }
+
+        return {
+            "server_id": server_id,
+            "gameserver": gameserver,
+            "deployment": deployment,
+            "service": service,
+            "config_map": config_map,
+            "pods": pods
+        }
+
+    @observe_k8s_call
+    async def list_gameservers(self, label_selector: str = "app=gameserver"):
+        """List all gameservers."""
         gameservers = []
-        for deployment in deployments.items:
-            server_id = deployment.metadata.labels.get("server-id")
-            if server_id:
-                gameserver_info = {
-                    "server_id": server_id,
-                    "username": deployment.metadata.labels.get("owner"),
-                    "name": deployment.metadata.name,
-                    "status": deployment.status.ready_replicas or 0,
-                    "replicas": deployment.spec.replicas,
-                    "created_at": deployment.metadata.creation_timestamp.isoformat() if deployment.metadata.creation_timestamp else None
-                }
-                gameservers.append(gameserver_info)
-        
+        async for page in self.iter_gameserver_pages(label_selector):
+            gameservers.extend(page)
         return gameservers
 
-    def delete_gameserver(self, server_id: str):
-        """Delete a complete gameserver and all its resources."""
+    @observe_k8s_call
+    async def list_gameservers_page(self, label_selector: str = "app=gameserver",
+                                    limit: int | None = None, continue_token: str | None = None):
+        """List one page of gameservers, returns the rows and the token for the next page."""
+        # with GameServer resources those are listed first, then the deployments of servers created
+        # before the switch, whose continue tokens carry LEGACY_CONTINUE in front
+        legacy = self.gameserver_crd and (continue_token or "").startswith(LEGACY_CONTINUE)
+        if legacy:
+            continue_token = continue_token[len(LEGACY_CONTINUE):]
+
+        kwargs = {}
+        if limit:
+            kwargs["limit"] = limit
+        if continue_token:
+            kwargs["_continue"] = continue_token
+
+        if self.gameserver_crd and not legacy:
+            # one list of the small GameServer resources instead of the deployments
+            fn, summary = self.crd_api.list_namespaced_custom_object, gameserver_resource_summary
+            kwargs.update(group=GAMESERVER_GROUP, version=GAMESERVER_VERSION, plural=GAMESERVER_PLURAL)
+        else:
+            fn, summary = self.v1_app_api.list_namespaced_deployment, gameserver_summary
+
+        resources = await self._call_raw(
+            fn,
+            namespace=self.namespace,
+            label_selector=label_selector,
+            **kwargs
+        )
+
+        gameservers = [
+            summary(resource)
+            for resource in resources["items"]
+            if resource["metadata"].get("labels", {}).get("server-id")
+            # the deployments of GameServer resources were listed as those already
+            and (not legacy or is_legacy_deployment(resource))
+        ]
+        next_token = resources["metadata"].get("continue") or None
+        if self.gameserver_crd and not legacy:
+            return gameservers, next_token or LEGACY_CONTINUE
+        if legacy and next_token:
+            return gameservers, LEGACY_CONTINUE + next_token
+        return gameservers, next_token
+
+    async def iter_gameserver_pages(self, label_selector: str = "app=gameserver",
+                                    page_size: int = 500, continue_token: str | None = None):
+        """Yield gameservers page by page, so only one page is held in memory at a time."""
+        while True:
+            page, continue_token = await self.list_gameservers_page(label_selector, page_size, continue_token)
+            yield page
+            if not continue_token:
+                return
+
+    @observe_k8s_call
+    async def get_gameserver_status(self, server_id: str):
+        """Get the status of a gameserver from its deployment status and pods only."""
         try:
-            # Delete in reverse order
-            self.delete_gameserver_traefik_route(server_id)
-            self.delete_gameserver_service(server_id)
-            self.delete_gameserver_deployment(server_id)
-            self.delete_gameserver_config_map(server_id)
-            
-            return {"server_id": server_id, "status": "deleted"}
-            
-        except client.exceptions.ApiException as e:
+            deployment, pods = await asyncio.gather(
+                self._call_raw(
+                    self.v1_app_api.read_namespaced_deployment_status,
+                    name=f"gameserver-{server_id}",
+                    namespace=self.namespace
+                ),
+                self._call_raw(
+                    self.v1_api.list_namespaced_pod,
+                    namespace=self.namespace,
+                    label_selector=f"server-id={server_id}"
+                )
+            )
+        except API_EXCEPTIONS as e:
             if e.status == 404:
-                return {"server_id": server_id, "status": "not_found"}
+                return None
             raise e
 
-    # ========== INDIVIDUAL RESOURCE METHODS ==========
+        return gameserver_status(server_id, deployment, pods["items"])
 
-    def create_gameserver_config_map(self, server_id: str, user_id: str, data: dict):
-        """Create configmap for gameserver."""
-        metadata = V1ObjectMeta(
-            name=f"config-{server_id}",
-            labels={
-                "app": "gameserver",
-                "owner": user_id,
-                "server-id": server_id
-            }
-        )
+    @observe_k8s_call
+    async def get_gameserver_statuses(self, server_ids: list[str], chunk_size: int = 100, concurrency: int = 2):
+        """Get the status of many gameservers with `server-id in (...)` list calls.
+
+        Ids are queried in chunks to keep the selector within url length limits, at most
+        `concurrency` chunks (two list calls each) at a time.
+        Returns server-id -> status, servers without a deployment are left out.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def list_chunk(chunk: list[str]):
+            async with semaphore:
+                return await self._list_status_chunk(chunk)
 
-        config_map = V1ConfigMap(
-            api_version="v1",
-            metadata=metadata,
-            data=data
+        chunks = [server_ids[i:i + chunk_size] for i in range(0, len(server_ids), chunk_size)]
+        results = await asyncio.gather(*(list_chunk(chunk) for chunk in chunks))
+
+        statuses = {}
+        for result in results:
+            statuses.update(result)
+        return statuses
+
+    async def _list_status_chunk(self, server_ids: list[str]):
+        selector = f"app=gameserver,server-id in ({','.join(server_ids)})"
+        deployments, pods = await asyncio.gather(
+            self._call_raw(
+                self.v1_app_api.list_namespaced_deployment,
+                namespace=self.namespace,
+                label_selector=selector
+            ),
+            self._call_raw(
+                self.v1_api.list_namespaced_pod,
+                namespace=self.namespace,
+                label_selector=selector
+            )
         )
 
-        self.v1_api.create_namespaced_config_map(
+        pods_by_server = {}
+        for pod in pods["items"]:
+            server_id = (pod["metadata"].get("labels") or {}).get("server-id")
+            pods_by_server.setdefault(server_id, []).append(pod)
+
+        statuses = {}
+        for deployment in deployments["items"]:
+            server_id = (deployment["metadata"].get("labels") or {}).get("server-id")
+            statuses[server_id] = gameserver_status(server_id, deployment, pods_by_server.get(server_id, []))
+        return statuses
+
+    @observe_k8s_call
+    async def list_pods(self, label_selector: str | None = None, field_selector: str | None = None) -> bytes:
+        """List all pods in the gameserver namespace, returns the raw json body."""
+        return await self._call_bytes(
+            self.v1_api.list_namespaced_pod,
             namespace=self.namespace,
-            body=config_map,
+            **_selectors(label_selector, field_selector)
         )
 
-    def create_gameserver_deployment(self, server_id: str, game_name: str, user_id: str, image: str,
-                                   requests_memory: str, requests_cpu: str,
-                                   limits_memory: str, limits_cpu: str, game_port: int):
-        """Create deployment for gameserver."""
-        metadata = V1ObjectMeta(
-            name=f"gameserver-{server_id}",
-            labels={
-                "app": "gameserver",
-                "game": game_name,
-                "owner": user_id,
-                "server-id": server_id
-            }
-        )
+    @observe_k8s_call
+    async def list_pods_page(self, label_selector: str | None = None, field_selector: str | None = None,
+                             limit: int | None = None, continue_token: str | None = None):
+        """List one page of pods, returns the raw pods and the token for the next page."""
+        kwargs = _selectors(label_selector, field_selector)
+        if limit:
+            kwargs["limit"] = limit
+        if continue_token:
+            kwargs["_continue"] = continue_token
 
-        spec = V1DeploymentSpec(
-            selector=V1LabelSelector(
-                match_labels={
-                    "app": "gameserver",
-                    "server-id": server_id
-                }
-            ),
-            template=V1PodTemplateSpec(
-                metadata=V1ObjectMeta(
-                    labels={
-                        "app": "gameserver",
-                        "game": game_name,
-                        "owner": user_id,
-                        "server-id": server_id
-                    }
-                ),
-                spec=V1PodSpec(
-                    containers=[
-                        V1Container(
-                            name="gameserver",
-                            image=image,
-                            resources=V1ResourceRequirements(
-                                requests={
-                                    "memory": requests_memory,
-                                    "cpu": requests_cpu,
-                                },
-                                limits={
-                                    "memory": limits_memory,
-                                    "cpu": limits_cpu,
-                                },
-                            ),
-                            env_from=[V1EnvFromSource(
-                                config_map_ref=V1ConfigMapEnvSource(
-                                    name=f"config-{server_id}"
-                                )
-                            )],
-                            ports=[V1ContainerPort(
-                                container_port=game_port,
-                                name="game-port"
-                            )]
-                        )
-                    ]
-                )
-            )
+        pods = await self._call_raw(
+            self.v1_api.list_namespaced_pod,
+            namespace=self.namespace,
+            **kwargs
         )
+        return pods["items"], pods["metadata"].get("continue") or None
+
+    async def iter_pod_pages(self, label_selector: str | None = None, field_selector: str | None = None,
+                             page_size: int = 500, continue_token: str | None = None):
+        """Yield raw pods page by page, so only one page is held in memory at a time."""
+        while True:
+            page, continue_token = await self.list_pods_page(label_selector, field_selector, page_size, continue_token)
+            yield page
+            if not continue_token:
+                return
+
+    @observe_k8s_call
+    async def delete_gameserver(self, server_id: str):
+        """Delete a complete gameserver and all its resources.
+
+        Components that are already gone are skipped, so partially deleted servers get cleaned up too.
+        """
+        deleted = await self.delete_gameservers(f"app=gameserver,server-id={server_id}")
+        if not deleted:
+            return {"server_id": server_id, "status": "not_found"}
+        return {"server_id": server_id, "status": "deleted"}
+
+    @observe_k8s_call
+    async def delete_gameservers(self, label_selector: str):
+        """Delete every gameserver component matching a label selector.
+
+        Issues one deletecollection per kind, concurrently, and lets the garbage collector
+        remove dependents (replicasets, pods) in the background.
+        With GameServer resources those go first, they own everything else. The four kinds are
+        deleted after them all the same, for servers created before the switch that no GameServer owns.
+        Returns the server-ids that had at least one component deleted.
+        """
+        kwargs = {
+            "namespace": self.namespace,
+            "label_selector": label_selector,
+            "propagation_policy": "Background"
+        }
+        results = []
+        if self.gameserver_crd:
+            # first, or the reconciler could recreate the objects of a GameServer that is still there
+            results.append(await self._call_raw(self.crd_api.delete_collection_namespaced_custom_object, group=GAMESERVER_GROUP,
+                                                version=GAMESERVER_VERSION, plural=GAMESERVER_PLURAL, **kwargs))
+        results.extend(await asyncio.gather(
+            self._call_raw(self.crd_api.delete_collection_namespaced_custom_object,
+                           group="traefik.io", version="v1alpha1", plural="ingressroutetcps", **kwargs),
+            self._call_raw(self.v1_api.delete_collection_namespaced_service, **kwargs),
+            self._call_raw(self.v1_app_api.delete_collection_namespaced_deployment, **kwargs),
+            self._call_raw(self.v1_api.delete_collection_namespaced_config_map, **kwargs),
+        ))
+
+        server_ids = set()
+        for result in results:
+            for item in result.get("items") or []:
+                server_id = (item["metadata"].get("labels") or {}).get("server-id")
+                if server_id:
+                    server_ids.add(server_id)
+        return sorted(server_ids)
 
-        deployment = V1Deployment(
-            api_version="apps/v1",
-            kind="Deployment",
-            metadata=metadata,
-            spec=spec,
+    # ========== INDIVIDUAL RESOURCE METHODS ==========
+
+    @observe_k8s_call
+    async def create_gameserver_component(self, component: str, body):
+        """Create one component of a gameserver by its gameserver_manifests() key, or "gameserver"."""
+        creates = {
+            "config_map": self.create_gameserver_config_map,
+            "deployment": self.create_gameserver_deployment,
+            "service": self.create_gameserver_service,
+            "traefik_route": self.create_gameserver_traefik_route,
+            "gameserver": self.create_gameserver_resource,
+        }
+        return await creates[component](body)
+
+    @observe_k8s_call
+    async def patch_gameserver_component(self, component: str, name: str, patch: dict):
+        """Merge patch one component of a gameserver, returns the patched object."""
+        kwargs = {"name": name, "namespace": self.namespace, "body": patch, "_content_type": MERGE_PATCH}
+        if component == "config_map":
+            fn = self.v1_api.patch_namespaced_config_map
+        elif component == "deployment":
+            fn = self.v1_app_api.patch_namespaced_deployment
+        elif component == "service":
+            fn = self.v1_api.patch_namespaced_service
+        else:
+            fn = self.crd_api.patch_namespaced_custom_object
+            kwargs.update(group="traefik.io", version="v1alpha1", plural="ingressroutetcps")
+        return await self._call_raw(fn, **kwargs)
+
+    @observe_k8s_call
+    async def create_gameserver_config_map(self, config_map: V1ConfigMap | bytes):
+        """Create configmap for gameserver."""
+        if isinstance(config_map, bytes):
+            return await self._create_raw(f"/api/v1/namespaces/{self.namespace}/configmaps", config_map)
+
+        await self._call(
+            self.v1_api.create_namespaced_config_map,
+            namespace=self.namespace,
+            body=config_map,
         )
 
-        self.v1_app_api.create_namespaced_deployment(
+    @observe_k8s_call
+    async def create_gameserver_deployment(self, deployment: V1Deployment | bytes):
+        """Create deployment for gameserver."""
+        if isinstance(deployment, bytes):
+            return await self._create_raw(f"/apis/apps/v1/namespaces/{self.namespace}/deployments", deployment)
+
+        await self._call(
+            self.v1_app_api.create_namespaced_deployment,
             namespace=self.namespace,
             body=deployment
         )
 
-    def create_gameserver_service(self, server_id: str, user_id: str, game_port: int):
+    @observe_k8s_call
+    async def create_gameserver_service(self, service: V1Service | bytes):
         """Create service for gameserver."""
-        metadata = V1ObjectMeta(
-            name=f"gameserver-{server_id}",
-            labels={
-                "app": "gameserver",
-                "owner": user_id,
-                "server-id": server_id
-            }
+        if isinstance(service, bytes):
+            return await self._create_raw(f"/api/v1/namespaces/{self.namespace}/services", service)
+
+        await self._call(
+            self.v1_api.create_namespaced_service,
+            namespace=self.namespace,
+            body=service
         )
 
-        spec = V1ServiceSpec(
-            selector={
-                "app": "gameserver",
-                "server-id": server_id
-            },
-            ports=[
-                V1ServicePort(
-                    name="game-port",
-                    app_protocol="TCP",
-                    protocol="TCP",
-                    target_port="game-port",
-                    port=game_port
-                )
-            ]
+    @observe_k8s_call
+    async def create_gameserver_traefik_route(self, route: dict | bytes):
+        """Create Traefik TCP IngressRoute for gameserver."""
+        if isinstance(route, bytes):
+            return await self._create_raw(f"/apis/traefik.io/v1alpha1/namespaces/{self.namespace}/ingressroutetcps", route)
+
+        await self._call(
+            self.crd_api.create_namespaced_custom_object,
+            group="traefik.io",
+            version="v1alpha1",
+            namespace=self.namespace,
+            plural="ingressroutetcps",
+            body=route
         )
 
-        service = V1Service(
-            api_version="v1",
-            metadata=metadata,
-            spec=spec
+    @observe_k8s_call
+    async def create_gameserver_resource(self, gameserver: dict | bytes):
+        """Create the GameServer resource, everything else is derived from it by the reconciler."""
+        if isinstance(gameserver, bytes):
+            return await self._create_raw(
+                f"/apis/{GAMESERVER_GROUP}/{GAMESERVER_VERSION}/namespaces/{self.namespace}/{GAMESERVER_PLURAL}",
+                gameserver
+            )
+
+        await self._call(
+            self.crd_api.create_namespaced_custom_object,
+            group=GAMESERVER_GROUP,
+            version=GAMESERVER_VERSION,
+            namespace=self.namespace,
+            plural=GAMESERVER_PLURAL,
+            body=gameserver
         )
 
-        self.v1_api.create_namespaced_service(
+    @observe_k8s_call
+    async def patch_gameserver_resource_status(self, server_id: str, status: dict):
+        """Merge patch the status subresource of a GameServer."""
+        await self._call_raw(
+            self.crd_api.patch_namespaced_custom_object_status,
+            group=GAMESERVER_GROUP,
+            version=GAMESERVER_VERSION,
             namespace=self.namespace,
-            body=service
+            plural=GAMESERVER_PLURAL,
+            name=f"gameserver-{server_id}",
+            body={"status": status},
+            _content_type=MERGE_PATCH
         )
 
-    def create_gameserver_traefik_route(self, server_id: str, user_id: str):
-        """Create Traefik TCP IngressRoute for gameserver."""
-        group = "traefik.io"
-        version = "v1alpha1"
-        plural = "ingressroutetcps"
-        kind = "IngressRouteTCP"
-
-        body = {
-            "apiVersion": f"{group}/{version}",
-            "kind": f"{kind}",
+    @observe_k8s_call
+    async def claim_gameserver(self, server_id: str, resource_version: str, user_id: str, config_data: dict):
+        """Hand an unassigned warm pool gameserver to user_id with config_data.
+
+        The first patch carries resource_version as a precondition, so of two claims (or a claim
+        and the pool shrinking) only one wins and the other gets a 409. With GameServer resources
+        that patch is all there is, the reconciler passes owner and config on.
+        """
+        name = f"gameserver-{server_id}"
+        labels = {"owner": user_id, POOL_LABEL: None, POOL_SPEC_LABEL: None}
+        claim = {
             "metadata": {
-                "name": f"gameserver-{server_id}-route",
-                "labels": {
-                    "app": "gameserver",
-                    "owner": user_id,
-                    "server-id": server_id
-                }
-            },
-            "spec": {
-                "entryPoints": [
-                    "web"
-                ],
-                "routes": [
-                    {
-                        "match": f"HostSNI(`*`)",
-                        "services": [
-                            {
-                                "name": f"gameserver-{server_id}",
-                                "port": "game-port"
-                            }
-                        ]
-                    }
-                ]
+                "resourceVersion": resource_version,
+                "labels": labels,
+                "annotations": {CLAIMED_AT_ANNOTATION: _now()}
             }
         }
+        if self.gameserver_crd:
+            claim["spec"] = {"owner": user_id, "config": config_data}
+            await self._call_raw(
+                self.crd_api.patch_namespaced_custom_object,
+                group=GAMESERVER_GROUP,
+                version=GAMESERVER_VERSION,
+                namespace=self.namespace,
+                plural=GAMESERVER_PLURAL,
+                name=name,
+                body=claim,
+                _content_type=MERGE_PATCH
+            )
+            return
+
+        deployment = await self.patch_gameserver_component("deployment", name, claim)
+        relabel = {"metadata": {"labels": labels}}
+        await asyncio.gather(
+            # pool servers start without config, so there is nothing to remove
+            self.patch_gameserver_component("config_map", f"config-{server_id}", {**relabel, "data": config_data}),
+            self.patch_gameserver_component("service", name, relabel),
+            self.patch_gameserver_component("traefik_route", f"{name}-route", relabel),
+        )
+
+        digest = config_hash(config_data)
+        template_annotations = deployment["spec"]["template"]["metadata"].get("annotations") or {}
+        if template_annotations.get(CONFIG_HASH_ANNOTATION) != digest:
+            # only now that the configmap has the config, or a new pod could start with the old one
+            await self.patch_gameserver_component("deployment", name, {
+                "spec": {"template": {"metadata": {"annotations": {CONFIG_HASH_ANNOTATION: digest}}}}
+            })
+
+    @observe_k8s_call
+    async def sleep_gameserver(self, server_id: str, resource_version: str) -> bool:
+        """Scale an idle gameserver to zero, unless its deployment changed since resource_version.
+
+        Returns False when it did or is gone, so a resume or claim racing the idle detector wins.
+        """
+        patch = {
+            "metadata": {
+                "resourceVersion": resource_version,
+                "annotations": {SLEEPING_ANNOTATION: _now()}
+            },
+            "spec": {"replicas": 0}
+        }
+        try:
+            await self.patch_gameserver_component("deployment", f"gameserver-{server_id}", patch)
+        except API_EXCEPTIONS as e:
+            if e.status in (HTTP_NOT_FOUND, HTTP_CONFLICT):
+                return False
+            raise
+        return True
 
-        self.crd_api.create_namespaced_custom_object(
-            group=group,
-            version=version,
+    @observe_k8s_call
+    async def resume_gameserver(self, server_id: str):
+        """Scale a sleeping gameserver back to one replica, returns the patched deployment."""
+        patch = {
+            "metadata": {
+                "annotations": {SLEEPING_ANNOTATION: None, LAST_ACTIVE_ANNOTATION: _now()}
+            },
+            "spec": {"replicas": 1}
+        }
+        return await self.patch_gameserver_component("deployment", f"gameserver-{server_id}", patch)
+
+    # ========== IMAGE PRE-PULL ==========
+
+    @observe_k8s_call
+    async def list_nodes(self):
+        """List the raw nodes of the cluster."""
+        nodes = await self._call_raw(self.v1_api.list_node)
+        return nodes["items"]
+
+    @observe_k8s_call
+    async def list_prepull_daemonsets(self):
+        """List the raw pre-pull daemonsets in the gameserver namespace."""
+        daemonsets = await self._call_raw(
+            self.v1_app_api.list_namespaced_daemon_set,
             namespace=self.namespace,
-            plural=plural,
-            body=body
+            label_selector=PREPULL_LABEL_SELECTOR
+        )
+        return daemonsets["items"]
+
+    @observe_k8s_call
+    async def create_prepull_daemonset(self, daemonset: bytes):
+        return await self._create_raw(f"/apis/apps/v1/namespaces/{self.namespace}/daemonsets", daemonset)
+
+    @observe_k8s_call
+    async def patch_prepull_daemonset(self, name: str, patch: dict):
+        return await self._call_raw(
+            self.v1_app_api.patch_namespaced_daemon_set,
+            name=name,
+            namespace=self.namespace,
+            body=patch,
+            _content_type=MERGE_PATCH
+        )
+
+    @observe_k8s_call
+    async def delete_prepull_daemonset(self, name: str):
+        await self._call_raw(
+            self.v1_app_api.delete_namespaced_daemon_set,
+            name=name,
+            namespace=self.namespace,
+            propagation_policy="Background"
         )
 
     # ========== DELETE METHODS ==========
 
-    def delete_gameserver_config_map(self, server_id: str):
+    @observe_k8s_call
+    async def delete_gameserver_if_unchanged(self, server_id: str, resource_version: str) -> bool:
+        """Delete a gameserver unless its deployment (or GameServer) changed since resource_version.
+
+        Returns False when it did or is gone already. The warm pool shrinks with this,
+        so a server claimed in the meantime is left alone.
+        """
+        if self.mode == "async":
+            options = async_client.V1DeleteOptions(
+                preconditions=async_client.V1Preconditions(resource_version=resource_version),
+                propagation_policy="Background"
+            )
+        else:
+            options = client.V1DeleteOptions(
+                preconditions=client.V1Preconditions(resource_version=resource_version),
+                propagation_policy="Background"
+            )
+
+        try:
+            if self.gameserver_crd:
+                await self._call_raw(
+                    self.crd_api.delete_namespaced_custom_object,
+                    group=GAMESERVER_GROUP,
+                    version=GAMESERVER_VERSION,
+                    namespace=self.namespace,
+                    plural=GAMESERVER_PLURAL,
+                    name=f"gameserver-{server_id}",
+                    body=options
+                )
+                return True
+            await self._call_raw(
+                self.v1_app_api.delete_namespaced_deployment,
+                name=f"gameserver-{server_id}",
+                namespace=self.namespace,
+                body=options
+            )
+        except API_EXCEPTIONS as e:
+            if e.status in (HTTP_NOT_FOUND, HTTP_CONFLICT):
+                return False
+            raise
+
+        # the deployment decided it, the rest goes unconditionally
+        await self.delete_gameservers(f"app=gameserver,server-id={server_id}")
+        return True
+
+    @observe_k8s_call
+    async def delete_gameserver_config_map(self, server_id: str):
         """Delete configmap for gameserver."""
-        self.v1_api.delete_namespaced_config_map(
+        await self._call(
+            self.v1_api.delete_namespaced_config_map,
             name=f"config-{server_id}",
             namespace=self.namespace
         )
 
-    def delete_gameserver_deployment(self, server_id: str):
+    @observe_k8s_call
+    async def delete_gameserver_deployment(self, server_id: str):
         """Delete deployment for gameserver."""
-        self.v1_app_api.delete_namespaced_deployment(
+        await self._call(
+            self.v1_app_api.delete_namespaced_deployment,
             name=f"gameserver-{server_id}",
             namespace=self.namespace
         )
 
-    def delete_gameserver_service(self, server_id: str):
+    @observe_k8s_call
+    async def delete_gameserver_service(self, server_id: str):
         """Delete service for gameserver."""
-        self.v1_api.delete_namespaced_service(
+        await self._call(
+            self.v1_api.delete_namespaced_service,
             name=f"gameserver-{server_id}",
             namespace=self.namespace
         )
 
-    def delete_gameserver_traefik_route(self, server_id: str):
+    @observe_k8s_call
+    async def delete_gameserver_resource(self, server_id: str):
+        """Delete the GameServer resource, the garbage collector removes the objects it owns."""
+        await self._call(
+            self.crd_api.delete_namespaced_custom_object,
+            group=GAMESERVER_GROUP,
+            version=GAMESERVER_VERSION,
+            namespace=self.namespace,
+            plural=GAMESERVER_PLURAL,
+            name=f"gameserver-{server_id}",
+            propagation_policy="Background"
+        )
+
+    @observe_k8s_call
+    async def delete_gameserver_traefik_route(self, server_id: str):
         """Delete Traefik route for gameserver."""
-        self.crd_api.delete_namespaced_custom_object(
+        await self._call(
+            self.crd_api.delete_namespaced_custom_object,
             group="traefik.io",
             version="v1alpha1",
             namespace=self.namespace,
@@ -344,4 +955,445 @@ class K8sClient:
 
     
 
+# ========== MANIFESTS ==========
+
+def config_map_manifest(server_id: str, user_id: str, data: dict):
+    metadata = V1ObjectMeta(
+        name=f"config-{server_id}",
+        labels={
+            "app": "gameserver",
+            "owner": user_id,
+            "server-id": server_id
+        },
+        annotations=tracing.annotations()
+    )
+
+    return V1ConfigMap(
+        api_version="v1",
+        metadata=metadata,
+        data=data
+    )
+
+
+def deployment_manifest(server_id: str, game_name: str, user_id: str, image: str,
+                        requests_memory: str, requests_cpu: str,
+                        limits_memory: str, limits_cpu: str, game_port: int, config_hash: str | None = None):
+    metadata = V1ObjectMeta(
+        name=f"gameserver-{server_id}",
+        labels={
+            "app": "gameserver",
+            "game": game_name,
+            "owner": user_id,
+            "server-id": server_id
+        },
+        annotations=tracing.annotations()
+    )
+
+    spec = V1DeploymentSpec(
+        selector=V1LabelSelector(
+            match_labels={
+                "app": "gameserver",
+                "server-id": server_id
+            }
+        ),
+        template=V1PodTemplateSpec(
+            # no owner here, handing a warm pool server to a user must not roll its pods
+            metadata=V1ObjectMeta(
+                labels={
+                    "app": "gameserver",
+                    "game": game_name,
+                    "server-id": server_id
+                },
+                annotations={CONFIG_HASH_ANNOTATION: config_hash} if config_hash else None
+            ),
+            spec=V1PodSpec(
+                containers=[
+                    V1Container(
+                        name="gameserver",
+                        image=image,
+                        # a pinned ":latest@sha256:..." would still default to Always
+                        image_pull_policy="IfNotPresent" if "@" in image else None,
+                        resources=V1ResourceRequirements(
+                            requests={
+                                "memory": requests_memory,
+                                "cpu": requests_cpu,
+                            },
+                            limits={
+                                "memory": limits_memory,
+                                "cpu": limits_cpu,
+                            },
+                        ),
+                        env_from=[V1EnvFromSource(
+                            config_map_ref=V1ConfigMapEnvSource(
+                                name=f"config-{server_id}"
+                            )
+                        )],
+                        ports=[V1ContainerPort(
+                            container_port=game_port,
+                            name="game-port"
+                        )]
+                    )
+                ]
+            )
+        )
+    )
+
+    return V1Deployment(
+        api_version="apps/v1",
+        kind="Deployment",
+        metadata=metadata,
+        spec=spec,
+    )
+
+
+def service_manifest(server_id: str, user_id: str, game_port: int):
+    metadata = V1ObjectMeta(
+        name=f"gameserver-{server_id}",
+        labels={
+            "app": "gameserver",
+            "owner": user_id,
+            "server-id": server_id
+        },
+        annotations=tracing.annotations()
+    )
+
+    spec = V1ServiceSpec(
+        selector={
+            "app": "gameserver",
+            "server-id": server_id
+        },
+        ports=[
+            V1ServicePort(
+                name="game-port",
+                app_protocol="TCP",
+                protocol="TCP",
+                target_port="game-port",
+                port=game_port
+            )
+        ]
+    )
+
+    return V1Service(
+        api_version="v1",
+        metadata=metadata,
+        spec=spec
+    )
+
+
+def traefik_route_manifest(server_id: str, user_id: str):
+    body = {
+        "apiVersion": "traefik.io/v1alpha1",
+        "kind": "IngressRouteTCP",
+        "metadata": {
+            "name": f"gameserver-{server_id}-route",
+            "labels": {
+                "app": "gameserver",
+                "owner": user_id,
+                "server-id": server_id
+            }
+        },
+        "spec": {
+            "entryPoints": [
+                "web"
+            ],
+            "routes": [
+                {
+                    "match": f"HostSNI(`*`)",
+                    "services": [
+                        {
+                            "name": f"gameserver-{server_id}",
+                            "port": "game-port"
+                        }
+                    ]
+                }
+            ]
+        }
+    }
+
+    annotations = tracing.annotations()
+    if annotations:
+        body["metadata"]["annotations"] = annotations
+    return body
+
+
+def gameserver_manifests(server_id: str, game_name: str, user_id: str, image: str,
+                         requests_memory: str, requests_cpu: str,
+                         limits_memory: str, limits_cpu: str,
+                         game_port: int, config_data: dict):
+    """Everything create_gameserver_from_manifests() submits for one gameserver, by component."""
+    return {
+        "config_map": config_map_manifest(server_id, user_id, config_data),
+        "deployment": deployment_manifest(server_id, game_name, user_id, image, requests_memory, requests_cpu,
+                                          limits_memory, limits_cpu, game_port, config_hash(config_data)),
+        "service": service_manifest(server_id, user_id, game_port),
+        "traefik_route": traefik_route_manifest(server_id, user_id),
+    }
+
+
+def gameserver_resource_manifest(server_id: str, game_name: str, user_id: str, image: str,
+                                 requests_memory: str, requests_cpu: str,
+                                 limits_memory: str, limits_cpu: str,
+                                 game_port: int, config_data: dict):
+    """The GameServer resource, its spec holds everything the reconciler builds the other objects from."""
+    body = {
+        "apiVersion": f"{GAMESERVER_GROUP}/{GAMESERVER_VERSION}",
+        "kind": "GameServer",
+        "metadata": {
+            "name": f"gameserver-{server_id}",
+            # owner and game are labels too, so listings can select on them
+            "labels": {
+                "app": "gameserver",
+                "game": game_name,
+                "owner": user_id,
+                "server-id": server_id
+            }
+        },
+        "spec": {
+            "game": game_name,
+            "owner": user_id,
+            "image": image,
+            "resources": {
+                "requests": {
+                    "memory": requests_memory,
+                    "cpu": requests_cpu,
+                },
+                "limits": {
+                    "memory": limits_memory,
+                    "cpu": limits_cpu,
+                },
+            },
+            "port": game_port,
+            "config": config_data
+        }
+    }
+
+    annotations = tracing.annotations()
+    if annotations:
+        body["metadata"]["annotations"] = annotations
+    return body
+
+
+def prepull_manifest(name: str, image: str, pinned: str, helper_image: str, pause_image: str):
+    """DaemonSet keeping image cached on every node it runs on.
+
+    The image only runs as an init container, with a static busybox copied in by the helper
+    so images without a shell work too, and the pod stays up on a pause container.
+    Its exited init container keeps the image in use, so the kubelet's image gc leaves it alone.
+    """
+    labels = {"app": "image-prepull", "prepull": name}
+    mount = [{"name": "prepull", "mountPath": "/prepull"}]
+    resources = {"requests": {"cpu": "1m", "memory": "4Mi"}, "limits": {"memory": "32Mi"}}
+    template = {
+        "metadata": {"labels": labels},
+        "spec": {
+            "initContainers": [
+                {
+                    "name": "helper",
+                    "image": helper_image,
+                    "command": ["cp", "/bin/busybox", "/prepull/busybox"],
+                    "volumeMounts": mount,
+                    "resources": resources
+                },
+                {
+                    "name": "image",
+                    "image": pinned,
+                    "imagePullPolicy": "IfNotPresent",
+                    "command": ["/prepull/busybox", "true"],
+                    "volumeMounts": mount,
+                    "resources": resources
+                }
+            ],
+            "containers": [{"name": "pause", "image": pause_image, "resources": resources}],
+            "volumes": [{"name": "prepull", "emptyDir": {}}],
+            "automountServiceAccountToken": False,
+            "terminationGracePeriodSeconds": 0
+        }
+    }
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "DaemonSet",
+        "metadata": {
+            "name": name,
+            "labels": labels,
+            "annotations": {
+                PREPULL_IMAGE_ANNOTATION: image,
+                PREPULL_HASH_ANNOTATION: hashlib.sha1(orjson.dumps(template, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+            }
+        },
+        "spec": {
+            "selector": {"matchLabels": labels},
+            # a new image is pulled by a quarter of the nodes at a time
+            "updateStrategy": {"type": "RollingUpdate", "rollingUpdate": {"maxUnavailable": "25%"}},
+            "template": template
+        }
+    }
+
+
+def _now() -> str:
+    # the timestamp format of the api server
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def parse_timestamp(value: str) -> float:
+    """Unix time of an api server timestamp."""
+    return calendar.timegm(time.strptime(value, "%Y-%m-%dT%H:%M:%SZ"))
+
+
+def config_hash(config_data: dict) -> str:
+    """Short digest of a gameserver config for the CONFIG_HASH_ANNOTATION."""
+    return hashlib.sha1(orjson.dumps(config_data, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+
+
+# kubernetes label value syntax, anything else could widen a label selector
+LABEL_VALUE_RE = re.compile(r"^([A-Za-z0-9]([-A-Za-z0-9_.]{0,61}[A-Za-z0-9])?)?$")
+
+
+def is_label_value(value: str):
+    return bool(LABEL_VALUE_RE.match(value))
+
+
+def gameserver_status(server_id: str, deployment: dict, pods: list):
+    """Simplified status of a gameserver from its raw deployment and pods."""
+    deployment_status = deployment.get("status") or {}
+    return {
+        "server_id": server_id,
+        "state": gameserver_state(deployment),
+        "deployment_status": {
+            "ready_replicas": deployment_status.get("readyReplicas", 0),
+            "replicas": deployment["spec"].get("replicas"),
+            "available_replicas": deployment_status.get("availableReplicas", 0)
+        },
+        "pods": [
+            {
+                "name": pod["metadata"]["name"],
+                "phase": (pod.get("status") or {}).get("phase"),
+                "ready": (pod.get("status") or {}).get("conditions", [])
+            }
+            for pod in pods
+        ]
+    }
+
+
+def pod_summary(pod: dict):
+    """Compact view of a raw pod."""
+    status = pod.get("status") or {}
+    conditions = status.get("conditions") or []
+    return {
+        "name": pod["metadata"]["name"],
+        "phase": status.get("phase"),
+        "node": (pod.get("spec") or {}).get("nodeName"),
+        "restarts": sum(container.get("restartCount", 0) for container in status.get("containerStatuses") or []),
+        "ready": any(condition["type"] == "Ready" and condition["status"] == "True" for condition in conditions)
+    }
+
+
+def _selectors(label_selector: str | None, field_selector: str | None):
+    kwargs = {}
+    if label_selector:
+        kwargs["label_selector"] = label_selector
+    if field_selector:
+        kwargs["field_selector"] = field_selector
+    return kwargs
+
+
+def parse_field_paths(fields: str):
+    """Parse a comma separated list of dotted paths, e.g. "metadata.name,status.phase"."""
+    return [field.strip().split(".") for field in fields.split(",") if field.strip()]
+
+
+def project(obj: dict, paths: list[list[str]]):
+    """Copy only the given paths of a raw object, paths that don't exist are skipped."""
+    result = {}
+    for path in paths:
+        value = obj
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = result
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+    return result
+
+
+def gameserver_selector(owner: str | None = None, game: str | None = None):
+    """Build the label selector for gameservers, optionally of one owner and/or game."""
+    # unclaimed warm pool servers belong to nobody yet
+    selector = f"app=gameserver,!{POOL_LABEL}"
+    if owner is not None:
+        selector += f",owner={owner}"
+    if game is not None:
+        selector += f",game={game}"
+    return selector
+
+
+async def _iter_events(chunks):
+    """Split a chunked watch stream into json events, objects can be larger than one chunk."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield orjson.loads(line)
+    if buffer.strip():
+        yield orjson.loads(buffer)
+
+
+# keys of a gameserver listing row
+GAMESERVER_FIELDS = ("server_id", "username", "name", "status", "state", "replicas", "created_at")
+
+
+def gameserver_summary(deployment: dict):
+    """Summarize a raw gameserver deployment for listings."""
+    metadata = deployment["metadata"]
+    labels = metadata.get("labels") or {}
+    return {
+        "server_id": labels.get("server-id"),
+        "username": labels.get("owner"),
+        "name": metadata["name"],
+        "status": (deployment.get("status") or {}).get("readyReplicas") or 0,
+        "state": gameserver_state(deployment),
+        "replicas": deployment["spec"].get("replicas"),
+        "created_at": metadata.get("creationTimestamp")
+    }
+
+
+def gameserver_state(deployment: dict) -> str:
+    """"sleeping" when the idle detector scaled it to zero, else "running" once a pod is ready."""
+    if SLEEPING_ANNOTATION in (deployment["metadata"].get("annotations") or {}):
+        return "sleeping"
+    return "running" if (deployment.get("status") or {}).get("readyReplicas") else "starting"
+
+
+def is_legacy_deployment(deployment: dict) -> bool:
+    """Whether a gameserver deployment predates GameServer resources, none of them owns it."""
+    return not any(
+        owner.get("kind") == "GameServer"
+        for owner in deployment["metadata"].get("ownerReferences") or ()
+    )
+
+
+# GameServer status phase -> gameserver_state()
+RESOURCE_STATES = {"Running": "running", "Sleeping": "sleeping"}
+
+
+def gameserver_resource_summary(gameserver: dict):
+    """Summarize a raw GameServer resource for listings, same keys as gameserver_summary()."""
+    metadata = gameserver["metadata"]
+    labels = metadata.get("labels") or {}
+    status = gameserver.get("status") or {}
+    return {
+        "server_id": labels.get("server-id"),
+        "username": labels.get("owner"),
+        "name": metadata["name"],
+        "status": status.get("readyReplicas") or 0,
+        "state": RESOURCE_STATES.get(status.get("phase"), "starting"),
+        "replicas": status.get("replicas"),
+        "created_at": metadata.get("creationTimestamp")
+    }
+
+
 k8_cl = K8sClient()
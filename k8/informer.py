@@ -0,0 +1,367 @@
+import time
+import asyncio
+from collections import defaultdict
+from .client import K8sClient, k8_cl, API_EXCEPTIONS, GAMESERVER_GROUP, GAMESERVER_VERSION, GAMESERVER_PLURAL, \
+    POOL_LABEL, gameserver_summary, gameserver_resource_summary, gameserver_status, is_legacy_deployment
+
+# kinds watched by the informer, keyed the same way get_gameserver names them
+KINDS = ("deployment", "service", "config_map", "pod", "traefik_route")
+# the GameServer resource, watched as well when gameservers are created through it
+CRD_KIND = "gameserver"
+
+HTTP_GONE = 410
+
+
+class GameserverStore:
+    """In-memory copy of every gameserver object, indexed by server-id, owner, game and warm pool."""
+
+    def __init__(self):
+        # kind -> object name -> raw object
+        self.objects = {kind: {} for kind in KINDS + (CRD_KIND,)}
+        # server-id -> kind -> object name -> raw object
+        self.by_server_id = defaultdict(lambda: defaultdict(dict))
+        # owner / game -> server-ids, maintained from the main resource
+        self.by_owner = defaultdict(set)
+        self.by_game = defaultdict(set)
+        # warm pool -> unclaimed server-ids
+        self.by_pool = defaultdict(set)
+        # deployments, or GameServer resources when those are used
+        self.main_kind = "deployment"
+
+    def put(self, kind: str, obj: dict):
+        name = obj["metadata"]["name"]
+        self.delete(kind, name)
+
+        self.objects[kind][name] = obj
+        labels = obj["metadata"].get("labels") or {}
+        server_id = labels.get("server-id")
+        if not server_id:
+            return
+
+        self.by_server_id[server_id][kind][name] = obj
+        if self._is_main(kind, obj):
+            if labels.get("owner"):
+                self.by_owner[labels["owner"]].add(server_id)
+            if labels.get("game"):
+                self.by_game[labels["game"]].add(server_id)
+            if labels.get(POOL_LABEL):
+                self.by_pool[labels[POOL_LABEL]].add(server_id)
+
+    def delete(self, kind: str, name: str):
+        obj = self.objects[kind].pop(name, None)
+        if obj is None:
+            return
+
+        labels = obj["metadata"].get("labels") or {}
+        server_id = labels.get("server-id")
+        if not server_id:
+            return
+
+        server = self.by_server_id[server_id]
+        server[kind].pop(name, None)
+        if not server[kind]:
+            del server[kind]
+        if not server:
+            del self.by_server_id[server_id]
+
+        if self._is_main(kind, obj):
+            _discard(self.by_owner, labels.get("owner"), server_id)
+            _discard(self.by_game, labels.get("game"), server_id)
+            _discard(self.by_pool, labels.get(POOL_LABEL), server_id)
+
+    def _is_main(self, kind: str, obj: dict) -> bool:
+        """Whether obj is what its server is indexed and listed by, with GameServer resources
+        that is the deployment of a server created before the switch too."""
+        if kind == self.main_kind:
+            return True
+        return self.main_kind == CRD_KIND and kind == "deployment" and is_legacy_deployment(obj)
+
+    def replace(self, kind: str, items: list):
+        for name in list(self.objects[kind]):
+            self.delete(kind, name)
+        for obj in items:
+            self.put(kind, obj)
+
+    def get_gameserver(self, server_id: str):
+        server = self.by_server_id.get(server_id)
+        if not server:
+            return None
+
+        deployment = _first(server.get("deployment"))
+        service = _first(server.get("service"))
+        config_map = _first(server.get("config_map"))
+        pods = {"items": list(server.get("pod", {}).values())}
+
+        # same contract as K8sClient.get_gameserver
+        if self.main_kind == CRD_KIND:
+            gameserver = _first(server.get(CRD_KIND))
+            if gameserver is not None:
+                return {
+                    "server_id": server_id,
+                    "gameserver": gameserver,
+                    "deployment": deployment,
+                    "service": service,
+                    "config_map": config_map,
+                    "pods": pods
+                }
+            # created before the switch, read the way it was created
+            if deployment is not None and not is_legacy_deployment(deployment):
+                return None
+
+        # all main resources must exist
+        if deployment is None or service is None or config_map is None:
+            return None
+
+        return {
+            "server_id": server_id,
+            "deployment": deployment,
+            "service": service,
+            "config_map": config_map,
+            "pods": pods
+        }
+
+    def get_gameserver_status(self, server_id: str):
+        server = self.by_server_id.get(server_id)
+        deployment = _first(server.get("deployment")) if server else None
+        if deployment is None:
+            return None
+        return gameserver_status(server_id, deployment, list(server.get("pod", {}).values()))
+
+    def list_gameservers(self, owner: str | None = None, game: str | None = None):
+        if owner is None and game is None:
+            resources = [(self.main_kind, resource) for resource in self.objects[self.main_kind].values()]
+            if self.main_kind == CRD_KIND:
+                resources += [
+                    ("deployment", deployment) for deployment in self.objects["deployment"].values()
+                    if is_legacy_deployment(deployment)
+                ]
+        else:
+            server_ids = None
+            if owner is not None:
+                server_ids = set(self.by_owner.get(owner, ()))
+            if game is not None:
+                game_ids = self.by_game.get(game, set())
+                server_ids = game_ids.copy() if server_ids is None else server_ids & game_ids
+            resources = [
+                (kind, resource)
+                for server_id in server_ids
+                for kind, objects in self.by_server_id[server_id].items()
+                for resource in objects.values()
+                if self._is_main(kind, resource)
+            ]
+
+        return [
+            (gameserver_resource_summary if kind == CRD_KIND else gameserver_summary)(resource)
+            for kind, resource in resources
+            if resource["metadata"].get("labels", {}).get("server-id")
+            # unclaimed warm pool servers belong to nobody yet
+            and POOL_LABEL not in resource["metadata"]["labels"]
+        ]
+
+    def pool_servers(self, pool: str) -> list[dict]:
+        """The main resources of the unclaimed servers of a warm pool."""
+        return [
+            resource
+            for server_id in self.by_pool.get(pool, ())
+            for resource in self.by_server_id[server_id].get(self.main_kind, {}).values()
+        ]
+
+
+class GameserverInformer:
+    """LISTs every gameserver kind once, then keeps the store current with WATCHes."""
+
+    def __init__(self, k8: K8sClient):
+        self.k8 = k8
+        self.store = GameserverStore()
+
+        self.label_selector = "app=gameserver"
+        # server side watch timeout, the watch is resumed from the last resourceVersion after it
+        self.watch_timeout = 300
+        # full relist interval to correct any drift
+        self.resync_period = 3600
+
+        self.kinds = KINDS
+        self.tasks: list[asyncio.Task] = []
+        # kinds whose store is current, a kind drops out while its watch fails and until it relisted
+        self.synced_kinds: set[str] = set()
+        # kind -> monotonic time of the last successful list or watch, and failures in a row
+        self.last_seen: dict[str, float] = {}
+        self.failures: dict[str, int] = defaultdict(int)
+        # called with (kind, object) for every object added, changed or deleted, relists included
+        self.listeners = []
+
+    @property
+    def synced(self):
+        return len(self.synced_kinds) == len(self.kinds)
+
+    def start(self, watch_timeout: int = 300, resync_period: int = 3600, crd: bool = False):
+        self.watch_timeout = watch_timeout
+        self.resync_period = resync_period
+        if crd:
+            self.kinds = KINDS + (CRD_KIND,)
+            self.store.main_kind = CRD_KIND
+        self.tasks = [
+            asyncio.create_task(self.run(kind), name=f"informer-{kind}")
+            for kind in self.kinds
+        ]
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, kind: str, obj: dict):
+        for listener in self.listeners:
+            listener(kind, obj)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.synced_kinds.clear()
+        self.last_seen.clear()
+        self.failures.clear()
+
+    def _list_call(self, kind: str):
+        """Return the list function and its extra kwargs for a kind."""
+        if kind == "deployment":
+            return self.k8.v1_app_api.list_namespaced_deployment, {}
+        if kind == "service":
+            return self.k8.v1_api.list_namespaced_service, {}
+        if kind == "config_map":
+            return self.k8.v1_api.list_namespaced_config_map, {}
+        if kind == "pod":
+            return self.k8.v1_api.list_namespaced_pod, {}
+        if kind == CRD_KIND:
+            return self.k8.crd_api.list_namespaced_custom_object, {
+                "group": GAMESERVER_GROUP,
+                "version": GAMESERVER_VERSION,
+                "plural": GAMESERVER_PLURAL
+            }
+        return self.k8.crd_api.list_namespaced_custom_object, {
+            "group": "traefik.io",
+            "version": "v1alpha1",
+            "plural": "ingressroutetcps"
+        }
+
+    async def relist(self, kind: str) -> str:
+        """Relist a kind into the store and return the list resourceVersion."""
+        fn, kwargs = self._list_call(kind)
+        result = await self.k8._call_raw(
+            fn,
+            namespace=self.k8.namespace,
+            label_selector=self.label_selector,
+            **kwargs
+        )
+        previous = dict(self.store.objects[kind]) if self.listeners else {}
+        self.store.replace(kind, result["items"])
+        self.synced_kinds.add(kind)
+        self.last_seen[kind] = time.monotonic()
+        self.failures.pop(kind, None)
+
+        # a relist is a full resync, listeners see every object again, and the ones that are gone
+        current = self.store.objects[kind]
+        for obj in current.values():
+            self._notify(kind, obj)
+        for name, obj in previous.items():
+            if name not in current:
+                self._notify(kind, obj)
+        return result["metadata"]["resourceVersion"]
+
+    async def run(self, kind: str):
+        fn, kwargs = self._list_call(kind)
+        backoff = 1
+
+        while True:
+            try:
+                resource_version = await self.relist(kind)
+                listed_at = time.monotonic()
+
+                while time.monotonic() - listed_at < self.resync_period:
+                    resource_version = await self.watch(kind, fn, kwargs, resource_version)
+                    if resource_version is None:
+                        # resourceVersion too old, relist
+                        break
+                backoff = 1
+
+            except asyncio.CancelledError:
+                raise
+            except API_EXCEPTIONS as e:
+                if e.status != HTTP_GONE:
+                    self._failed(kind)
+                    print(f"informer {kind}: api error {e.status}, retrying in {backoff}s")
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, 30)
+            except Exception as e:
+                self._failed(kind)
+                print(f"informer {kind}: {e!r}, retrying in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def _failed(self, kind: str):
+        # the store keeps the last state it saw, reads go to the api server until the relist worked
+        self.synced_kinds.discard(kind)
+        self.failures[kind] += 1
+
+    async def watch(self, kind: str, fn, kwargs: dict, resource_version: str) -> str | None:
+        """Apply watch events until the server closes the watch.
+
+        Returns the resourceVersion to resume from, or None when a relist is needed.
+        """
+        async for event in self.k8.watch(
+            fn,
+            namespace=self.k8.namespace,
+            label_selector=self.label_selector,
+            resource_version=resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=self.watch_timeout,
+            **kwargs
+        ):
+            obj = event["object"]
+            if event["type"] == "ERROR":
+                if obj.get("code") == HTTP_GONE:
+                    return None
+                raise RuntimeError(f"watch error: {obj.get('message')}")
+
+            resource_version = obj["metadata"]["resourceVersion"]
+            self.last_seen[kind] = time.monotonic()
+            if event["type"] in ("ADDED", "MODIFIED"):
+                self.store.put(kind, obj)
+                self._notify(kind, obj)
+            elif event["type"] == "DELETED":
+                self.store.delete(kind, obj["metadata"]["name"])
+                self._notify(kind, obj)
+            # BOOKMARK only moves the resourceVersion forward
+
+        return resource_version
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "synced": self.synced,
+            "kinds": {
+                kind: {
+                    "synced": kind in self.synced_kinds,
+                    # bookmarks count, so this stays low on a healthy watch without changes
+                    "seconds_since_event": round(now - self.last_seen[kind], 1) if kind in self.last_seen else None,
+                    "failures": self.failures.get(kind, 0),
+                }
+                for kind in (self.kinds if self.tasks else ())
+            },
+        }
+
+
+def _first(objects: dict | None):
+    if not objects:
+        return None
+    return next(iter(objects.values()))
+
+
+def _discard(index: defaultdict, key: str | None, server_id: str):
+    if key is None or key not in index:
+        return
+    index[key].discard(server_id)
+    if not index[key]:
+        del index[key]
+
+
+gs_informer = GameserverInformer(k8_cl)
@@ -0,0 +1,347 @@
+"""Reconciles GameServer resources into their configmap, deployment, service and route.
+
+The api only writes the GameServer. Everything else is derived from its spec here and
+owned by it, so the garbage collector deletes it together with the GameServer.
+Reconciling is level triggered: events only queue the server-id, the reconcile compares
+the whole desired state with the informer cache and fixes whatever differs, and every
+informer relist queues every server again.
+
+Servers created before K8S_GAMESERVER_CRD was turned on have no GameServer and are left
+alone here. The api reads, lists and deletes them from their deployment as before, so they
+stay until they are deleted, there is no migration of them to a GameServer.
+
+Runs inside the api (K8S_RECONCILER_ENABLED, off by default) or on its own:
+    python -m gameserver_api.k8.reconciler
+There is no leader election, run it in one place only.
+"""
+import time
+import signal
+import asyncio
+from collections import defaultdict
+import orjson
+from ..core.config import config
+from ..core.metrics import registry, RECONCILE_SECONDS, RECONCILE_REQUEUES
+from .client import K8sClient, k8_cl, API_EXCEPTIONS, GAMESERVER_GROUP, GAMESERVER_VERSION, HTTP_NOT_FOUND, \
+    HTTP_CONFLICT, SLEEPING_ANNOTATION, gameserver_manifests
+from .informer import GameserverInformer, gs_informer, CRD_KIND, _first
+from .templates import sanitize
+
+
+class WorkQueue:
+    """Deduplicating queue of keys, modelled on client-go's workqueue.
+
+    A key is handed to one worker at a time, adding it while it is processed queues it
+    again once done() is called. Failed keys come back after a per-key exponential
+    backoff, and all requeues share a token bucket so a broken cluster isn't hammered.
+    """
+
+    def __init__(self, base_delay: float = 0.005, max_delay: float = 300, rate: float = 10, burst: int = 100):
+        self.queue = asyncio.Queue()
+        # queued and not handed out yet
+        self.dirty = set()
+        self.processing = set()
+        # key -> (due time, timer) of a delayed add
+        self.waiting = {}
+
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failures = defaultdict(int)
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def __len__(self):
+        return len(self.dirty)
+
+    def add(self, key: str):
+        if key in self.dirty:
+            return
+        self.dirty.add(key)
+        if key not in self.processing:
+            self.queue.put_nowait(key)
+
+    def add_after(self, key: str, delay: float):
+        if delay <= 0:
+            return self.add(key)
+
+        loop = asyncio.get_running_loop()
+        due = loop.time() + delay
+        waiting = self.waiting.get(key)
+        if waiting is not None:
+            if waiting[0] <= due:
+                return
+            waiting[1].cancel()
+        self.waiting[key] = (due, loop.call_at(due, self._add_waiting, key))
+
+    def _add_waiting(self, key: str):
+        self.waiting.pop(key, None)
+        self.add(key)
+
+    def add_rate_limited(self, key: str) -> float:
+        """Queue a key again after its backoff, returns the delay."""
+        self.failures[key] += 1
+        backoff = min(self.base_delay * 2 ** (self.failures[key] - 1), self.max_delay)
+        delay = max(backoff, self._bucket_delay())
+        self.add_after(key, delay)
+        return delay
+
+    def _bucket_delay(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # goes negative when empty, the debt is the wait for the next token
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def forget(self, key: str):
+        """Reset the backoff of a key after it was processed successfully."""
+        self.failures.pop(key, None)
+
+    async def get(self) -> str:
+        key = await self.queue.get()
+        self.dirty.discard(key)
+        self.processing.add(key)
+        return key
+
+    def done(self, key: str):
+        self.processing.discard(key)
+        if key in self.dirty:
+            self.queue.put_nowait(key)
+
+    def shutdown(self):
+        for _, timer in self.waiting.values():
+            timer.cancel()
+        self.waiting.clear()
+
+
+class GameServerReconciler:
+    """Keeps the objects of every GameServer in the informer cache in line with its spec."""
+
+    def __init__(self, k8: K8sClient, informer: GameserverInformer):
+        self.k8 = k8
+        self.informer = informer
+        self.queue = WorkQueue()
+        self.tasks: list[asyncio.Task] = []
+        self.informer.subscribe(self.on_event)
+
+        self.reconciles = 0
+        self.errors = 0
+
+    def start(self, workers: int = 4):
+        self.tasks = [
+            asyncio.create_task(self.work(), name=f"reconciler-{i}")
+            for i in range(workers)
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue.shutdown()
+
+    def on_event(self, kind: str, obj: dict):
+        # pods only matter through their deployment's status
+        if not self.tasks or kind == "pod":
+            return
+        server_id = (obj["metadata"].get("labels") or {}).get("server-id")
+        if server_id:
+            self.queue.add(server_id)
+
+    async def work(self):
+        # a partial cache would make every object look missing
+        while not self.informer.synced:
+            await asyncio.sleep(0.1)
+
+        while True:
+            server_id = await self.queue.get()
+            start = time.perf_counter()
+            result = "ok"
+            try:
+                await self.reconcile(server_id)
+                self.queue.forget(server_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = "error"
+                self.errors += 1
+                delay = self.queue.add_rate_limited(server_id)
+                RECONCILE_REQUEUES.labels().inc()
+                error = f"api error {e.status}" if isinstance(e, API_EXCEPTIONS) else repr(e)
+                print(f"reconcile of gameserver {server_id} failed: {error}, retrying in {delay:.2f}s")
+            finally:
+                self.queue.done(server_id)
+                self.reconciles += 1
+                RECONCILE_SECONDS.labels(result).observe(time.perf_counter() - start)
+
+    async def reconcile(self, server_id: str):
+        server = self.informer.store.by_server_id.get(server_id) or {}
+        gameserver = _first(server.get(CRD_KIND))
+        if gameserver is None or gameserver["metadata"].get("deletionTimestamp"):
+            # gone, the garbage collector deletes what it owned
+            return
+
+        desired = desired_objects(server_id, gameserver)
+        current = {
+            component: (server.get(component) or {}).get(body["metadata"]["name"])
+            for component, body in desired.items()
+        }
+        # put to sleep by the idle detector, stays at zero until it is resumed
+        if SLEEPING_ANNOTATION in ((current["deployment"] or {}).get("metadata", {}).get("annotations") or {}):
+            desired["deployment"]["spec"]["replicas"] = 0
+        # a config change rolls the deployment, its new pods have to find the new config
+        await self.sync_object("config_map", desired["config_map"], current["config_map"])
+        results = await asyncio.gather(
+            *(self.sync_object(component, body, current[component])
+              for component, body in desired.items() if component != "config_map"),
+            return_exceptions=True
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            raise errors[0]
+
+        deployment = (server.get("deployment") or {}).get(desired["deployment"]["metadata"]["name"])
+        status = resource_status(gameserver, deployment)
+        if not _contains(gameserver.get("status") or {}, status):
+            try:
+                await self.k8.patch_gameserver_resource_status(server_id, status)
+            except API_EXCEPTIONS as e:
+                # deleted while we were at it, the DELETED event queues it again
+                if e.status != HTTP_NOT_FOUND:
+                    raise
+
+    async def sync_object(self, component: str, desired: dict, current: dict | None):
+        if current is None:
+            try:
+                await self.k8.create_gameserver_component(component, orjson.dumps(desired))
+            except API_EXCEPTIONS as e:
+                # created by an earlier reconcile the cache hasn't caught up with
+                if e.status != HTTP_CONFLICT:
+                    raise
+            return
+
+        patch = drift_patch(desired, current)
+        if patch is not None:
+            await self.k8.patch_gameserver_component(component, desired["metadata"]["name"], patch)
+
+    def stats(self):
+        return {
+            "running": bool(self.tasks),
+            "queued": len(self.queue),
+            "processing": len(self.queue.processing),
+            "backing_off": len(self.queue.waiting),
+            "reconciles": self.reconciles,
+            "errors": self.errors,
+        }
+
+    def collect_metrics(self):
+        yield "gameserver_reconcile_queue_depth", "gauge", "GameServers waiting to be reconciled.", [({}, len(self.queue))]
+
+
+def desired_objects(server_id: str, gameserver: dict) -> dict[str, dict]:
+    """The raw objects a GameServer should have, by component, owned by it."""
+    spec = gameserver["spec"]
+    resources = spec.get("resources") or {}
+    requests = resources.get("requests") or {}
+    limits = resources.get("limits") or {}
+    manifests = gameserver_manifests(
+        server_id, spec["game"], spec["owner"], spec["image"],
+        requests.get("memory"), requests.get("cpu"), limits.get("memory"), limits.get("cpu"),
+        spec["port"], spec.get("config") or {}
+    )
+
+    owner = {
+        "apiVersion": f"{GAMESERVER_GROUP}/{GAMESERVER_VERSION}",
+        "kind": "GameServer",
+        "name": gameserver["metadata"]["name"],
+        "uid": gameserver["metadata"]["uid"],
+        "controller": True,
+        "blockOwnerDeletion": True
+    }
+    objects = {}
+    for component, manifest in manifests.items():
+        body = sanitize(manifest)
+        body["metadata"]["ownerReferences"] = [owner]
+        objects[component] = body
+    return objects
+
+
+def drift_patch(desired: dict, current: dict) -> dict | None:
+    """Merge patch bringing current back in line with desired, None when nothing drifted.
+
+    Fields the api server defaults are left alone, except that configmap data has to match exactly.
+    Objects without our owner reference get adopted.
+    """
+    patch = {
+        "metadata": {
+            "labels": desired["metadata"]["labels"],
+            "ownerReferences": desired["metadata"]["ownerReferences"]
+        }
+    }
+    if "spec" in desired:
+        patch["spec"] = desired["spec"]
+    drifted = not _contains(current, patch)
+
+    if "data" in desired:
+        current_data = current.get("data") or {}
+        if current_data != desired["data"]:
+            drifted = True
+            # null removes a key in a merge patch
+            patch["data"] = {**{key: None for key in current_data}, **desired["data"]}
+
+    return patch if drifted else None
+
+
+def resource_status(gameserver: dict, deployment: dict | None):
+    """Status of a GameServer from its deployment, Pending until the deployment exists."""
+    status = {
+        "phase": "Pending",
+        "replicas": 0,
+        "readyReplicas": 0,
+        "observedGeneration": gameserver["metadata"].get("generation")
+    }
+    if deployment is not None:
+        ready = (deployment.get("status") or {}).get("readyReplicas") or 0
+        status["replicas"] = deployment["spec"].get("replicas") or 0
+        status["readyReplicas"] = ready
+        status["phase"] = "Running" if ready else "Starting"
+        # scaled to zero by the idle detector, which works on the deployment directly
+        if SLEEPING_ANNOTATION in (deployment["metadata"].get("annotations") or {}):
+            status["phase"] = "Sleeping"
+    return status
+
+
+def _contains(actual, expected) -> bool:
+    """Whether every field of expected is set in actual, lists item by item."""
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(_contains(actual.get(key), value) for key, value in expected.items())
+    if isinstance(expected, list):
+        return isinstance(actual, list) and len(actual) == len(expected) and all(map(_contains, actual, expected))
+    return actual == expected
+
+
+gs_reconciler = GameServerReconciler(k8_cl, gs_informer)
+registry.add_collector(gs_reconciler.collect_metrics)
+
+
+async def run():
+    await k8_cl.load_service_account(config.K8S_CLIENT_MODE, config.K8S_POOL_MAXSIZE)
+    k8_cl.gameserver_crd = True
+    gs_informer.start(resync_period=config.K8S_INFORMER_RESYNC_SECONDS, crd=True)
+    gs_reconciler.start(config.K8S_RECONCILER_WORKERS)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    await stop.wait()
+
+    await gs_reconciler.stop()
+    await gs_informer.stop()
+    await k8_cl.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,97 @@
+import re
+import orjson
+from kubernetes import client
+from ..core.tracing import tracing
+from .client import CONFIG_HASH_ANNOTATION, gameserver_manifests, gameserver_resource_manifest, config_hash
+
+# "@@name@@" as a whole json value, or @@name@@ inside a json string
+PLACEHOLDER_RE = re.compile(rb'"@@(\w+)@@"|@@(\w+)@@')
+
+LITERAL, VALUE, INLINE = 0, 1, 2
+
+_api_client = None
+
+
+def sanitize(manifest):
+    """Model (or dict of models) -> the json-ready dict the client libraries would send."""
+    global _api_client
+    if _api_client is None:
+        _api_client = client.ApiClient()
+    return _api_client.sanitize_for_serialization(manifest)
+
+
+class ManifestTemplate:
+    """The json of a manifest, split around its placeholders once.
+
+    Rendering splices the json of every value in, strings placed inside
+    another string go in without their quotes.
+    """
+
+    def __init__(self, manifest: dict):
+        blob = orjson.dumps(manifest)
+        self.parts = []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(blob):
+            self.parts.append((LITERAL, blob[position:match.start()]))
+            value, inline = match.groups()
+            if value is not None:
+                self.parts.append((VALUE, value.decode()))
+            else:
+                self.parts.append((INLINE, inline.decode()))
+            position = match.end()
+        self.parts.append((LITERAL, blob[position:]))
+
+    def render(self, values: dict[str, bytes]) -> bytes:
+        """values holds the json of every placeholder."""
+        return b"".join(
+            part if kind == LITERAL else values[part] if kind == VALUE else values[part][1:-1]
+            for kind, part in self.parts
+        )
+
+
+class GameserverTemplate:
+    """Ready-to-send json of the four gameserver components of one game,
+    or of its GameServer resource with crd.
+
+    Compiled from the same builders as the model path, so both send the same
+    objects. Only server_id, owner, config (and its hash) and the trace annotation change per create.
+    """
+
+    def __init__(self, game_name: str, image: str, requests_memory: str, requests_cpu: str,
+                 limits_memory: str, limits_cpu: str, game_port: int, crd: bool = False):
+        args = ("@@server_id@@", game_name, "@@owner@@", image, requests_memory, requests_cpu,
+                limits_memory, limits_cpu, game_port, {})
+        if crd:
+            manifests = {"gameserver": gameserver_resource_manifest(*args)}
+        else:
+            manifests = gameserver_manifests(*args)
+
+        # like the builders, objects only get annotations when there is a trace to link
+        self.templates = {}
+        self.traced_templates = {}
+        for component, manifest in manifests.items():
+            body = sanitize(manifest)
+            body["metadata"].pop("annotations", None)
+            if component == "config_map":
+                body["data"] = "@@config_data@@"
+            elif component == "deployment":
+                body["spec"]["template"]["metadata"]["annotations"][CONFIG_HASH_ANNOTATION] = "@@config_hash@@"
+            elif component == "gameserver":
+                body["spec"]["config"] = "@@config_data@@"
+            self.templates[component] = ManifestTemplate(body)
+            body["metadata"]["annotations"] = "@@annotations@@"
+            self.traced_templates[component] = ManifestTemplate(body)
+
+    def render(self, server_id: str, user_id: str, config_data: dict) -> dict[str, bytes]:
+        values = {
+            "server_id": orjson.dumps(server_id),
+            "owner": orjson.dumps(user_id),
+            "config_data": orjson.dumps(config_data),
+            "config_hash": orjson.dumps(config_hash(config_data)),
+        }
+        templates = self.templates
+        annotations = tracing.annotations()
+        if annotations:
+            values["annotations"] = orjson.dumps(annotations)
+            templates = self.traced_templates
+        return {component: template.render(values) for component, template in templates.items()}
@@ -1,8 +1,19 @@
 from .core.db import db_cl
+from .core.catalog import game_catalog
+from .core.users import user_cache, USERS_UPDATED_EXCHANGE
+from .core.warm_pool import warm_pool
+from .core.idle import idle_manager
+from .core.images import image_manager
 from fastapi import FastAPI
 from .core.config import config
+from .core.metrics import MetricsMiddleware
+from .core.tracing import tracing, TracingMiddleware
 from .rabbit.client import mq_cl
+from .rabbit.consumers import handler_registry
+from .rabbit import handlers  # registers the queue handlers
 from .k8.client import k8_cl
+from .k8.informer import gs_informer
+from .k8.reconciler import gs_reconciler
 from contextlib import asynccontextmanager
 
 
@@ -10,24 +21,114 @@ from contextlib import asynccontextmanager
 async def lifespan(_: FastAPI):
     # everything before yield is executed before the app starts up
 
+    if config.TRACING_ENABLED:
+        tracing.setup(
+            exporter=config.TRACING_EXPORTER,
+            sample_ratio=config.TRACING_SAMPLE_RATIO,
+            file_path=config.TRACING_FILE,
+            otlp_endpoint=config.TRACING_OTLP_ENDPOINT,
+            service_name=config.TITLE
+        )
+
     # set up rabbit
-    # await mq_cl.connect(str(config.RABBIT_URI))
-    # await mq_cl.setup_rpc_queues()
+    if config.RABBIT_ENABLED:
+        await mq_cl.connect(
+            str(config.RABBIT_URI),
+            rpc_timeout=config.RABBIT_RPC_TIMEOUT,
+            publish_window=config.RABBIT_PUBLISH_WINDOW,
+            publish_retries=config.RABBIT_PUBLISH_RETRIES,
+            channel_pool_size=config.RABBIT_CHANNEL_POOL_SIZE
+        )
+        await mq_cl.setup_rpc_queues()
+        await mq_cl.subscribe(USERS_UPDATED_EXCHANGE, user_cache.on_user_updated)
+        await mq_cl.start_consumers(handler_registry, config.RABBIT_PROCESS_WORKERS)
+    user_cache.configure(config.USER_CACHE_SIZE, config.USER_CACHE_TTL, config.USER_CACHE_NEGATIVE_TTL)
 
     # set up db
-    db_cl.connect(str(config.DB_URI))
+    db_cl.connect(
+        str(config.DB_URI),
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE
+    )
 
     # load kubernetes client
-    k8_cl.load_service_account()
+    await k8_cl.load_service_account(config.K8S_CLIENT_MODE, config.K8S_POOL_MAXSIZE)
+    k8_cl.gameserver_crd = config.K8S_GAMESERVER_CRD
+    reconcile = config.K8S_GAMESERVER_CRD and config.K8S_RECONCILER_ENABLED
+    warm_pool.configure(
+        config.WARM_POOL_SIZES,
+        min_size=config.WARM_POOL_MIN_SIZE,
+        demand_window=config.WARM_POOL_DEMAND_WINDOW,
+        lead_time=config.WARM_POOL_LEAD_SECONDS,
+        concurrency=config.WARM_POOL_CONCURRENCY,
+        interval=config.WARM_POOL_INTERVAL
+    )
+    idle_manager.configure(
+        config.IDLE_TIMEOUTS,
+        default_timeout=config.IDLE_TIMEOUT_DEFAULT,
+        interval=config.IDLE_CHECK_INTERVAL,
+        concurrency=config.IDLE_CONCURRENCY,
+        metrics_url=config.IDLE_TRAEFIK_METRICS_URL,
+        metric=config.IDLE_TRAEFIK_METRIC
+    )
+    image_manager.configure(
+        pin=config.IMAGE_PIN_DIGESTS,
+        prepull=config.IMAGE_PREPULL_ENABLED,
+        interval=config.IMAGE_REFRESH_INTERVAL,
+        concurrency=config.IMAGE_CONCURRENCY,
+        insecure_registries=config.IMAGE_INSECURE_REGISTRIES,
+        helper_image=config.IMAGE_PREPULL_HELPER_IMAGE,
+        pause_image=config.IMAGE_PREPULL_PAUSE_IMAGE
+    )
+
+    # start watching gameserver objects, reads fall back to the api server until synced
+    # the reconciler, the warm pool and the idle detector work off the same cache
+    if config.K8S_INFORMER_ENABLED or reconcile or warm_pool.enabled or idle_manager.enabled:
+        gs_informer.start(resync_period=config.K8S_INFORMER_RESYNC_SECONDS, crd=config.K8S_GAMESERVER_CRD)
+    if reconcile:
+        gs_reconciler.start(config.K8S_RECONCILER_WORKERS)
+    elif config.K8S_GAMESERVER_CRD:
+        print("reconciler not running here, set K8S_RECONCILER_ENABLED in one replica or run it on its own")
 
     # create tables
     await db_cl.init_db()
 
+    # cache the game catalog, invalidated through postgres notifications
+    await game_catalog.install_triggers(db_cl.engine)
+    game_catalog.start_listener(db_cl.engine)
+    await game_catalog.wait_warm()
+
+    # digests of the catalog images, before the warm pool builds servers pinned to them
+    if image_manager.enabled:
+        await image_manager.start(db_cl.engine)
+
+    # the refiller builds pool servers from the catalog
+    if warm_pool.enabled and config.WARM_POOL_REFILL_ENABLED:
+        warm_pool.start()
+    elif warm_pool.enabled:
+        print("warm pool refiller not running here, set WARM_POOL_REFILL_ENABLED in one replica")
+    # idle timeouts are per game id, mapped to the game label through the catalog
+    if idle_manager.enabled and config.IDLE_DETECTOR_ENABLED:
+        idle_manager.start()
+    elif idle_manager.enabled:
+        print("idle detector not running here, set IDLE_DETECTOR_ENABLED in one replica")
+
     yield
     
     # everything after yield is execute after the app shuts down
-    # await mq_cl.disconnect()
+    if config.RABBIT_ENABLED:
+        await mq_cl.disconnect()
+    await warm_pool.stop()
+    await idle_manager.stop()
+    await image_manager.stop()
+    await game_catalog.stop()
+    await gs_reconciler.stop()
+    await gs_informer.stop()
+    await k8_cl.close()
     await db_cl.disconnect()
+    tracing.shutdown()
 
 
 if not config.CI:
@@ -45,8 +146,19 @@ else:
 # from .routes.listings import listings_router
 from .routes.gameservers import gameservers_router
 from .routes.ping import healthcheck_router
+from .routes.operations import operations_router
+from .routes.images import images_router
+from .routes.metrics import metrics_router
 
 
 # app.include_router(listings_router, prefix="/listings")
 app.include_router(gameservers_router, prefix="/gameservers")
-app.include_router(healthcheck_router, prefix="/healthcheck")
\ No newline at end of file
+app.include_router(healthcheck_router, prefix="/healthcheck")
+app.include_router(operations_router, prefix="/operations")
+app.include_router(images_router, prefix="/images")
+app.include_router(metrics_router)
+
+if config.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+# outermost, so the timings include every other middleware
+app.add_middleware(MetricsMiddleware)
\ No newline at end of file
@@ -3,7 +3,7 @@ from .core.config import config
 from datetime import datetime, UTC
 from sqlmodel import Field, SQLModel, Relationship
 import sqlalchemy as sa
-from pydantic import BaseModel as PydanticBaseModel
+from pydantic import BaseModel as PydanticBaseModel, Field as PydanticField
 from typing import Dict, Optional, List
 
 
@@ -22,6 +22,52 @@ class CreateGameServerRequest(PydanticBaseModel):
 class GameServerResponse(PydanticBaseModel):
     server_id: str
     status: str
+    # per-step api timings in ms, only set with CREATE_TIMINGS_ENABLED
+    timings: Optional[Dict[str, float]] = None
+    # set when a running server was taken from the warm pool instead of creating one
+    claimed: Optional[bool] = None
+
+class BatchCreateGameServerRequest(PydanticBaseModel):
+    servers: List[CreateGameServerRequest]
+    # delete every created server again when any item fails
+    atomic: bool = False
+
+class BatchCreateResult(PydanticBaseModel):
+    index: int
+    # created, failed, skipped (not attempted) or rolled_back (atomic batch that failed)
+    status: str
+    server_id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchCreateGameServerResponse(PydanticBaseModel):
+    results: List[BatchCreateResult]
+    created_count: int
+    failed_count: int
+    rolled_back: bool = False
+
+class GameServerStatusRequest(PydanticBaseModel):
+    server_ids: List[str] = PydanticField(max_length=config.STATUS_BATCH_MAX_IDS)
+
+class OperationResponse(PydanticBaseModel):
+    operation_id: str
+    kind: str
+    status: str
+    server_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_operation(cls, operation: "Operation"):
+        return cls(
+            operation_id=operation.id,
+            kind=operation.kind,
+            status=operation.status,
+            server_id=operation.server_id,
+            error=operation.error,
+            created_at=operation.created_at,
+            updated_at=operation.updated_at,
+        )
 
 # db models
 class Game(SQLModel, table=True):
@@ -83,3 +129,30 @@ class Port(SQLModel, table=True):
     # Relationship
     game: Optional[Game] = Relationship(back_populates="port", sa_relationship_kwargs={'lazy': 'selectin'})
 
+
+class Operation(SQLModel, table=True):
+    """Progress of a job handed to the queue workers (pending -> running -> succeeded / failed)."""
+    __tablename__ = "operations"
+    # idempotency keys are the client's, two users may well pick the same one
+    __table_args__ = (sa.UniqueConstraint("user_id", "idempotency_key", name="uq_operations_user_idempotency_key"),)
+
+    id: str = Field(primary_key=True)
+    kind: str = Field(nullable=False)
+    status: str = Field(nullable=False, default="pending")
+
+    server_id: Optional[str] = Field(default=None, index=True)
+    user_id: Optional[str] = Field(default=None)
+    error: Optional[str] = Field(default=None)
+    # lets a client retry a create without starting a second one
+    idempotency_key: Optional[str] = Field(default=None)
+    # digest of the create request, a key reused for a different request is rejected
+    request_hash: Optional[str] = Field(default=None)
+
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(UTC),
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False)
+    )
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(UTC),
+        sa_column=sa.Column(sa.DateTime(timezone=True), nullable=False)
+    )
@@ -1,24 +1,97 @@
 import json
+import time
 import uuid
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from typing import Callable, MutableMapping
-from aio_pika import connect, Message, IncomingMessage
+from aio_pika import connect, Message, IncomingMessage, ExchangeType, DeliveryMode
+from aio_pika.exceptions import DeliveryError
+from .consumers import HandlerRegistry
+from ..core.metrics import RPC_SECONDS, RPC_TIMEOUTS
+from ..core.tracing import tracing
+
+# rabbit's pseudo queue for replies, delivered straight to the consumer on the requesting channel
+DIRECT_REPLY_TO = "amq.rabbitmq.reply-to"
+
+
+class ChannelPool:
+    """Fixed set of channels handed out round robin, each one carries many publishes at once."""
+
+    def __init__(self, connection, size: int, **channel_options):
+        self.connection = connection
+        self.channel_options = channel_options
+        self.channels = [None] * size
+        self.next = 0
+        self.lock = asyncio.Lock()
+
+    async def open(self):
+        for index in range(len(self.channels)):
+            self.channels[index] = await self.connection.channel(**self.channel_options)
+
+    async def get(self):
+        index = self.next
+        self.next = (self.next + 1) % len(self.channels)
+
+        channel = self.channels[index]
+        if channel is None or channel.is_closed:
+            async with self.lock:
+                # reopen channels the broker closed on us (e.g. after a channel error)
+                channel = self.channels[index]
+                if channel is None or channel.is_closed:
+                    channel = await self.connection.channel(**self.channel_options)
+                    self.channels[index] = channel
+        return channel
+
+    async def close(self):
+        for channel in self.channels:
+            if channel is not None and not channel.is_closed:
+                await channel.close()
+
 
 class MQClient:
     def __init__(self):
         self.connection = None
         self.channel = None
         self.queue = None
+        self.reply_queue = None
         
         self.futures: MutableMapping[str, asyncio.Future] = {}
+        # default seconds to wait for an rpc reply
+        self.rpc_timeout = 5.0
+
+        # confirm mode channels for send_message / publish_many
+        self.channel_pool: ChannelPool | None = None
+        # caps the publishes waiting for a broker confirm
+        self.publish_window = asyncio.Semaphore(256)
+        self.publish_retries = 3
+
+        self.registry: HandlerRegistry | None = None
+        self.process_pool: ProcessPoolExecutor | None = None
+
 
+    async def connect(
+        self,
+        uri: str,
+        rpc_timeout: float = 5.0,
+        publish_window: int = 256,
+        publish_retries: int = 3,
+        channel_pool_size: int = 8
+    ):
+        self.rpc_timeout = rpc_timeout
+        self.publish_window = asyncio.Semaphore(publish_window)
+        self.publish_retries = publish_retries
 
-    async def connect(self, uri: str):
         self.connection = await connect(uri)
+        # rpc requests stay unconfirmed, direct reply-to needs them on the consuming channel
         self.channel = await self.connection.channel(publisher_confirms=False)
+        self.channel_pool = ChannelPool(self.connection, channel_pool_size, publisher_confirms=True)
+        await self.channel_pool.open()
 
 
     async def disconnect(self):
+        await self.stop_consumers()
+        if self.channel_pool is not None:
+            await self.channel_pool.close()
         if not self.channel.is_closed:
             await self.channel.close()
         if not self.connection.is_closed:
@@ -26,7 +99,7 @@ class MQClient:
 
 
     def is_connected(self):
-        if self.connection.is_closed or self.channel.is_closed:
+        if self.connection is None or self.connection.is_closed or self.channel.is_closed:
             return False
         return True
 
@@ -43,82 +116,215 @@ class MQClient:
         print(f"started consuming queue {queue_name}")
 
 
-    async def send_message(self, queue: str, message: dict):
+    async def start_consumers(self, registry: HandlerRegistry, process_workers: int | None = None):
+        """Consume every registered queue on its own channel, with the consumer's prefetch."""
+        self.registry = registry
+        if registry.needs_process_pool:
+            self.process_pool = ProcessPoolExecutor(max_workers=process_workers)
+
+        for consumer in registry.consumers.values():
+            consumer.executor = self.process_pool
+            consumer.channel = await self.connection.channel()
+            await consumer.channel.set_qos(prefetch_count=consumer.prefetch_count)
+
+            queue = await consumer.channel.declare_queue(consumer.queue, durable=consumer.durable)
+            if consumer.max_attempts is not None:
+                # failed messages wait out the ttl here, then rabbit dead-letters them back to the queue
+                await consumer.channel.declare_queue(consumer.retry_queue, durable=consumer.durable, arguments={
+                    "x-message-ttl": int(consumer.retry_delay * 1000),
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": consumer.queue
+                })
+                await consumer.channel.declare_queue(consumer.dead_queue, durable=consumer.durable)
+            consumer.consumer_tag = await queue.consume(callback=consumer.on_message, no_ack=False)
+
+            print(f"started consuming queue {consumer.queue} (prefetch {consumer.prefetch_count}, concurrency {consumer.concurrency})")
+
+
+    async def stop_consumers(self):
+        if self.registry is None:
+            return
+
+        for consumer in self.registry.consumers.values():
+            if consumer.channel is not None and not consumer.channel.is_closed:
+                # unacked messages go back to the queue
+                await consumer.channel.close()
+            consumer.channel = None
+            consumer.consumer_tag = None
+
+        if self.process_pool is not None:
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+            self.process_pool = None
+        self.registry = None
+
+
+    async def subscribe(self, exchange_name: str, callback: Callable[[IncomingMessage], None]):
+        """Consume a fanout exchange through a private queue that goes away with the connection."""
+        exchange = await self.channel.declare_exchange(exchange_name, ExchangeType.FANOUT, durable=True)
+        queue = await self.channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(exchange)
+
+        # broadcasts are only hints (e.g. cache invalidation), no need to ack them
+        await queue.consume(callback=callback, no_ack=True)
+
+        print(f"subscribed to exchange {exchange_name}")
+
+
+    async def send_message(self, queue: str, message: dict, persistent: bool = False):
         """Usage Example
         ```
         await send_message({"asdf": "asdf"})
         ```
         """
         
-        async with self.channel.transaction():
-            msg = Message(
-                body = json.dumps(message).encode()
-            )
+        msg = Message(
+            body = json.dumps(message).encode(),
+            delivery_mode=DeliveryMode.PERSISTENT if persistent else DeliveryMode.NOT_PERSISTENT,
+            # lets the consumer continue the trace of the request that sent it
+            headers=tracing.inject()
+        )
 
-            await self.channel.default_exchange.publish(
-                message=msg,
-                routing_key=queue
-            )
-        
+        await self._publish_confirmed(msg, queue)
 
-    async def setup_rpc_queues(self):
-        # setup rpc request queues
 
+    async def publish_many(self, queue: str, messages: list[dict]):
+        """Publish a burst of messages, returns once the broker confirmed all of them.
+
+        Publishes are pipelined up to the in-flight window instead of waiting for each
+        confirm in turn, the broker acks them in batches (multiple=True).
+        Raises the first failure after every message has been settled.
         """
-        listings_cascade_delete = await self.channel.declare_exchange("listings.cascade_delete.req")
+        results = await asyncio.gather(*(
+            self._publish_confirmed(Message(body=json.dumps(message).encode()), queue)
+            for message in messages
+        ), return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+
+    async def _publish_confirmed(self, msg: Message, routing_key: str):
+        async with self.publish_window:
+            for attempt in range(self.publish_retries + 1):
+                try:
+                    channel = await self.channel_pool.get()
+                    # resolves when the broker confirms, raises DeliveryError on a nack
+                    return await channel.default_exchange.publish(
+                        message=msg,
+                        routing_key=routing_key
+                    )
+                except DeliveryError:
+                    if attempt == self.publish_retries:
+                        raise
+                    await asyncio.sleep(0.05 * 2 ** attempt)
+        
 
-        # setup rpc response queues
-        users_get_by_id = await self.channel.declare_queue("users.get_by_id.res", durable=True)
-        accommodations_get_by_id = await self.channel.declare_queue("accommodations.get_by_id.res", durable=True)
-        accommodations_get_by_user_id = await self.channel.declare_queue("accommodations.get_by_user_id.res", durable=True)
+    async def setup_rpc_queues(self):
+        """Start the single consumer that receives every rpc reply.
 
-        await users_get_by_id.consume(self.rpc_msg_handler)
-        await accommodations_get_by_id.consume(self.rpc_msg_handler)
-        await accommodations_get_by_user_id.consume(self.rpc_msg_handler)
+        Replies come back over rabbit's direct reply-to pseudo queue, so no reply
+        queue is declared per rpc. It has to be consumed with no_ack on the same
+        channel the requests are published on.
         """
+        self.reply_queue = await self.channel.get_queue(DIRECT_REPLY_TO, ensure=False)
+        await self.reply_queue.consume(self.rpc_msg_handler, no_ack=True)
 
 
     async def rpc_msg_handler(self, msg: IncomingMessage):
-            # if an exception gets raised, message gets rejected and put back in the queue
-            async with msg.process(requeue=True):
-                future: asyncio.Future = self.futures.pop(msg.correlation_id, None)
-                msg_body = json.loads(
-                    msg.body.decode()
-                )
-                # if future is None, this line throws error and requeues the message
-                future.set_result(msg_body)
-    
-    
-    async def send_rpc_message(self, queue: str, message: dict):
-        correlation_id = str(uuid.uuid4())
-        loop = asyncio.get_running_loop()
-        future = loop.create_future()
+        future: asyncio.Future = self.futures.pop(msg.correlation_id, None)
+        # the caller already timed out or went away, drop the late reply
+        if future is None or future.done():
+            return
+
+        try:
+            future.set_result(json.loads(msg.body.decode()))
+        except ValueError as e:
+            future.set_exception(e)
+
 
+    async def _publish_rpc(self, queue: str, message: dict) -> tuple[str, asyncio.Future]:
+        correlation_id = str(uuid.uuid4())
+        future = asyncio.get_running_loop().create_future()
         self.futures[correlation_id] = future
 
         msg = Message(
             body=json.dumps(message).encode(),
             correlation_id=correlation_id,
-            reply_to=f"{queue}.res"
+            reply_to=DIRECT_REPLY_TO,
+            headers=tracing.inject()
         )
 
-        await self.channel.default_exchange.publish(
-            message=msg,
-            routing_key=f"{queue}.req"
-        )
+        try:
+            await self.channel.default_exchange.publish(
+                message=msg,
+                routing_key=f"{queue}.req"
+            )
+        except BaseException:
+            self.futures.pop(correlation_id, None)
+            raise
+
+        return correlation_id, future
+
+
+    async def send_rpc_message(self, queue: str, message: dict, timeout: float | None = None):
+        """Send an rpc request and wait for its reply.
+
+        Raises asyncio.TimeoutError after `timeout` seconds (rpc_timeout by default).
+        The pending future is always removed, also when the caller gets cancelled.
+        """
+        with tracing.span(f"rpc {queue}"):
+            start = time.perf_counter()
+            correlation_id, future = await self._publish_rpc(queue, message)
+            try:
+                reply = await asyncio.wait_for(future, self.rpc_timeout if timeout is None else timeout)
+                RPC_SECONDS.labels(queue).observe(time.perf_counter() - start)
+                return reply
+            except asyncio.TimeoutError:
+                RPC_TIMEOUTS.labels(queue).inc()
+                raise
+            finally:
+                self.futures.pop(correlation_id, None)
+
+
+    async def send_rpc_messages(self, queue: str, messages: list[dict], timeout: float | None = None) -> list:
+        """Pipeline many rpc requests over the channel and wait for all replies.
+
+        All requests are published before any reply is awaited and they share one
+        deadline. Results are in request order, a request that failed or timed out
+        has its exception in place of the reply.
+        """
+        if not messages:
+            return []
+
+        pending = []
+        try:
+            for message in messages:
+                pending.append(await self._publish_rpc(queue, message))
+
+            futures = [future for _, future in pending]
+            done, _ = await asyncio.wait(futures, timeout=self.rpc_timeout if timeout is None else timeout)
+
+            return [
+                (future.exception() or future.result()) if future in done else asyncio.TimeoutError()
+                for future in futures
+            ]
+        finally:
+            for correlation_id, future in pending:
+                self.futures.pop(correlation_id, None)
+                future.cancel()
 
-        return await future
-    
 
-    async def send_rpc_response(self, queue: str, message: dict, correlation_id: str):
+    async def send_rpc_response(self, queue: str, message: dict, correlation_id: str, reply_to: str | None = None):
         msg = Message(
             body = json.dumps(message).encode(),
             correlation_id=correlation_id
         )
 
+        # answer to the requester's reply_to (e.g. direct reply-to) when it set one
         await self.channel.default_exchange.publish(
             message=msg,
-            routing_key=f"{queue}.res",
+            routing_key=reply_to or f"{queue}.res",
         )
 
 
@@ -0,0 +1,186 @@
+import time
+import asyncio
+from concurrent.futures import Executor
+from typing import Awaitable, Callable, Dict
+from aio_pika import IncomingMessage, Message
+from ..core.tracing import tracing
+
+# how often a message was handed to its handler before, set on the copies Consumer.retry publishes
+ATTEMPTS_HEADER = "x-attempts"
+
+
+def delivery_attempt(msg: IncomingMessage) -> int:
+    """1 on the first delivery of a message, 2 on its first retry and so on."""
+    return int((msg.headers or {}).get(ATTEMPTS_HEADER) or 0) + 1
+
+
+class HandlerStats:
+    """Throughput and latency of one handler."""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.in_flight = 0
+        self.busy_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, ok: bool):
+        if ok:
+            self.processed += 1
+        else:
+            self.failed += 1
+        self.busy_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self):
+        handled = self.processed + self.failed
+        uptime = time.monotonic() - self.started_at
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "in_flight": self.in_flight,
+            "per_second": handled / uptime if uptime else None,
+            "avg_ms": self.busy_seconds / handled * 1000 if handled else None,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class Consumer:
+    """A queue, the handler draining it and how many of its messages may be worked on at once.
+
+    prefetch_count is how many unacked messages the broker pushes to the channel,
+    concurrency how many of those run the handler at the same time.
+    Handlers marked process_pool are plain functions taking the message body, run
+    in the client's process pool, and must be importable (picklable).
+
+    Without max_attempts a failed message goes straight back to the queue. With it, it
+    waits retry_delay seconds in <queue>.retry first, and after max_attempts deliveries
+    it is parked in <queue>.dead instead of being retried forever.
+    """
+
+    def __init__(
+        self,
+        queue: str,
+        handler: Callable,
+        prefetch_count: int = 10,
+        concurrency: int = 10,
+        process_pool: bool = False,
+        durable: bool = False,
+        max_attempts: int | None = None,
+        retry_delay: float = 10
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.prefetch_count = prefetch_count
+        self.concurrency = concurrency
+        self.process_pool = process_pool
+        # durable queues survive a broker restart, pair them with persistent messages
+        self.durable = durable
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stats = HandlerStats()
+        # set while consuming
+        self.executor: Executor | None = None
+        self.channel = None
+        self.consumer_tag: str | None = None
+
+    async def on_message(self, msg: IncomingMessage):
+        async with self.semaphore:
+            self.stats.in_flight += 1
+            start = time.perf_counter()
+            ok = False
+            try:
+                # if an exception gets raised, message gets rejected and put back in the queue
+                async with msg.process(requeue=True, ignore_processed=True):
+                    try:
+                        with tracing.span(f"consume {self.queue}", parent=msg.headers):
+                            if self.process_pool:
+                                await asyncio.get_running_loop().run_in_executor(self.executor, self.handler, msg.body)
+                            else:
+                                await self.handler(msg)
+                        ok = True
+                    except Exception as e:
+                        if self.max_attempts is None:
+                            raise
+                        print(f"handler for {self.queue} failed: {e!r}")
+                        # acked once the copy is published, a failed publish requeues the original
+                        await self.retry(msg)
+            except Exception as e:
+                print(f"handler for {self.queue} failed: {e!r}")
+            finally:
+                self.stats.in_flight -= 1
+                self.stats.record(time.perf_counter() - start, ok)
+
+    @property
+    def retry_queue(self):
+        return f"{self.queue}.retry"
+
+    @property
+    def dead_queue(self):
+        return f"{self.queue}.dead"
+
+    async def retry(self, msg: IncomingMessage):
+        """Publish a copy of msg to the retry queue, or the dead queue once it is out of attempts."""
+        attempt = delivery_attempt(msg)
+        if attempt < self.max_attempts:
+            queue = self.retry_queue
+            self.stats.retried += 1
+        else:
+            queue = self.dead_queue
+            self.stats.dead_lettered += 1
+            print(f"giving up on a message of {self.queue} after {attempt} attempts, parked in {queue}")
+
+        await self.channel.default_exchange.publish(
+            Message(
+                body=msg.body,
+                headers={**(msg.headers or {}), ATTEMPTS_HEADER: attempt},
+                delivery_mode=msg.delivery_mode,
+                content_type=msg.content_type
+            ),
+            routing_key=queue
+        )
+
+
+class HandlerRegistry:
+    """Queue name -> consumer, filled by the handler modules and started by MQClient.start_consumers.
+
+    Usage Example
+    ```
+    @handler_registry.handler("gameservers.events", prefetch_count=20, concurrency=10)
+    async def on_event(msg: IncomingMessage):
+        ...
+    ```
+    """
+
+    def __init__(self):
+        self.consumers: Dict[str, Consumer] = {}
+
+    def register(self, queue: str, handler: Callable, **options) -> Consumer:
+        if queue in self.consumers:
+            raise ValueError(f"queue {queue} already has a handler")
+        consumer = Consumer(queue, handler, **options)
+        self.consumers[queue] = consumer
+        return consumer
+
+    def handler(self, queue: str, **options) -> Callable[[Callable[..., Awaitable]], Callable[..., Awaitable]]:
+        def decorator(fn):
+            self.register(queue, fn, **options)
+            return fn
+        return decorator
+
+    @property
+    def needs_process_pool(self):
+        return any(consumer.process_pool for consumer in self.consumers.values())
+
+    def stats(self):
+        return {queue: consumer.stats.snapshot() for queue, consumer in self.consumers.items()}
+
+
+handler_registry = HandlerRegistry()
@@ -0,0 +1,2 @@
+# importing a handler module registers its consumers with handler_registry
+from . import provisioning
@@ -0,0 +1,83 @@
+import json
+from aio_pika import IncomingMessage
+from ... import crud
+from ...core.config import config
+from ...core.db import db_cl
+from ...core.catalog import game_catalog
+from ...core.provisioning import PROVISION_QUEUE, create_from_catalog
+from ...k8.client import k8_cl
+from ..consumers import handler_registry, delivery_attempt
+
+
+@handler_registry.handler(
+    PROVISION_QUEUE,
+    prefetch_count=config.PROVISION_PREFETCH,
+    # caps the creates running against the api server from this instance
+    concurrency=config.PROVISION_CONCURRENCY,
+    durable=True,
+    max_attempts=config.PROVISION_MAX_ATTEMPTS,
+    retry_delay=config.PROVISION_RETRY_DELAY
+)
+async def provision_handler(msg: IncomingMessage):
+    try:
+        job = json.loads(msg.body.decode())
+        operation_id = job["operation_id"]
+        server_id = job["server_id"]
+    except (ValueError, KeyError) as e:
+        # no retry makes it readable, acked and dropped
+        print(f"dropping malformed provisioning job: {e!r}")
+        return
+
+    try:
+        await provision(job, operation_id, server_id)
+    except Exception as e:
+        attempt = delivery_attempt(msg)
+        if attempt < config.PROVISION_MAX_ATTEMPTS:
+            # retried after PROVISION_RETRY_DELAY, the delete in provision() makes that safe
+            raise
+        # out of attempts, when the operation can't be failed either the message is parked
+        await give_up(operation_id, server_id, f"Failed to provision after {attempt} attempts: {str(e)}")
+
+
+async def provision(job: dict, operation_id: str, server_id: str):
+    async with db_cl.session_factory() as session:
+        operation = await crud.get_operation(session, operation_id)
+        # finished already, the message is a redelivery after a lost ack
+        if operation is None or operation.status in ("succeeded", "failed"):
+            return
+
+        if operation.status == "running":
+            # a previous attempt died half way, start from scratch
+            await k8_cl.delete_gameserver(server_id)
+
+        await crud.update_operation(session, operation_id, status="running")
+
+    try:
+        game = await game_catalog.get(job["game_id"])
+        if game is None:
+            raise ValueError(f"Game with id {job['game_id']} not found")
+
+        await create_from_catalog(server_id, game, job["user_id"], job["config_data"])
+        status, error = "succeeded", None
+    except Exception as e:
+        # create_gameserver already rolled back, retrying would most likely fail the same way
+        status, error = "failed", f"Failed to create gameserver: {str(e)}"
+
+    # a db error here retries the job, the delete above makes the retry safe
+    async with db_cl.session_factory() as session:
+        await crud.update_operation(session, operation_id, status=status, error=error)
+
+
+async def give_up(operation_id: str, server_id: str, error: str):
+    """Fail an operation whose job ran out of attempts, after removing what it may have left behind."""
+    async with db_cl.session_factory() as session:
+        operation = await crud.get_operation(session, operation_id)
+        if operation is None or operation.status in ("succeeded", "failed"):
+            return
+
+        try:
+            await k8_cl.delete_gameserver(server_id)
+        except Exception as e:
+            print(f"deleting gameserver {server_id} of operation {operation_id} failed: {e!r}")
+
+        await crud.update_operation(session, operation_id, status="failed", error=error)
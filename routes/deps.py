@@ -1,31 +1,50 @@
-from fastapi import Header
+import asyncio
+from fastapi import Header, HTTPException, Request
 from ..core.db  import db_cl
-from ..rabbit.client import mq_cl
-from sqlalchemy.orm import sessionmaker
+from ..core.users import user_cache, UserLookupError
 from sqlalchemy.ext.asyncio.session import AsyncSession
 
 
 async def get_session() -> AsyncSession: # type: ignore
-
-    async_session = sessionmaker(
-        db_cl.engine,
-        class_=AsyncSession,
-        expire_on_commit=True
-    )
-
-    async with async_session() as session:
+    # no span here, a yield dependency's span would stay current for the whole handler.
+    # The queries themselves get db.query spans, see DBClient._instrument
+    async with db_cl.session_factory() as session:
         # return the db session
         yield session
 
         # close session so queue pool doesn't overflow
         await session.close()
 
-async def get_current_user(x_forwarded_user: str = Header()) -> dict | None:
-    user_id = int(x_forwarded_user)
+async def _wait_for_disconnect(request: Request):
+    # the body has already been read by fastapi, the next message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
 
-    response = await mq_cl.send_rpc_message(
-        "users.get_by_id", {
-            "user_id": user_id
-    })
 
-    return response.get("data")
+async def get_current_user(request: Request, x_forwarded_user: str = Header()) -> dict | None:
+    user_id = int(x_forwarded_user)
+
+    lookup = asyncio.ensure_future(user_cache.get(user_id))
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(request))
+
+    try:
+        await asyncio.wait((lookup, disconnect), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        # only this request stops waiting, a shared lookup keeps going for the others
+        if not lookup.done():
+            lookup.cancel()
+            await asyncio.gather(lookup, return_exceptions=True)
+
+    if lookup.cancelled():
+        # client went away, nobody is waiting for the response anymore
+        raise HTTPException(status_code=499, detail="Client disconnected")
+
+    try:
+        return lookup.result()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="User service did not respond in time")
+    except UserLookupError:
+        raise HTTPException(status_code=502, detail="User service failed to look up the user")
@@ -1,63 +1,235 @@
 from .. import crud
 from ..models import *
+from ..core.config import config
+from ..core.catalog import game_catalog, CatalogGame
+from ..core.provisioning import PROVISION_QUEUE, create_from_catalog, manifests_from_catalog
+from ..core.warm_pool import warm_pool
+from ..core.idle import idle_manager
+from ..core.tracing import tracing
+from ..rabbit.client import mq_cl
 from sqlmodel import Session, select
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Header, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio.session import AsyncSession
 from .deps import get_session
-from ..k8.client import k8_cl
-from typing import Optional, Dict, Any
+from .responses import RawJSONResponse
+from ..k8.client import k8_cl, API_EXCEPTIONS, CreateSkipped, is_label_value, gameserver_selector, parse_field_paths, project, pod_summary, GAMESERVER_FIELDS, \
+    gameserver_state
+from ..k8.informer import gs_informer
+from typing import Optional, Dict, Any, Literal
+import re
 import uuid
+import hashlib
+import asyncio
+import orjson
 
 gameservers_router = APIRouter()
 
+
+async def _get_gameserver(server_id: str):
+    """Read a gameserver from the informer cache, or the api server while it syncs or misses it."""
+    if gs_informer.synced:
+        gameserver = gs_informer.store.get_gameserver(server_id)
+        # a miss may be a server created moments ago that the watch hasn't delivered yet
+        if gameserver is not None:
+            return gameserver
+    return await k8_cl.get_gameserver(server_id)
+
+
+async def _get_gameserver_statuses(server_ids: list[str]) -> dict:
+    """server-id -> status from the informer cache, the ids it misses (or all while it syncs) from the api server."""
+    statuses = {}
+    if gs_informer.synced:
+        for server_id in server_ids:
+            status = gs_informer.store.get_gameserver_status(server_id)
+            if status is not None:
+                statuses[server_id] = status
+
+    missing = [server_id for server_id in server_ids if server_id not in statuses]
+    if missing:
+        statuses.update(await k8_cl.get_gameserver_statuses(missing, concurrency=config.STATUS_BATCH_CONCURRENCY))
+    return statuses
+
+
+def _project(rows: list, fields: set | None):
+    if fields is None:
+        return rows
+    return [{key: row[key] for key in row if key in fields} for row in rows]
+
+
+def _list_error(e: Exception, what: str) -> HTTPException:
+    """A failed list call as an HTTPException, a malformed (400) or expired (410) continue token is the client's."""
+    status_code = e.status if isinstance(e, API_EXCEPTIONS) and e.status in (400, 410) else 500
+    return HTTPException(status_code=status_code, detail=f"Failed to list {what}: {_error_message(e)}")
+
+
+async def _ndjson_pages(first: list, pages, rows, what: str):
+    """Yield the rows of the first page, then of every page left in pages, as ndjson.
+
+    The first page is fetched before the response starts, so its errors still get a status code.
+    A later failure can only end the stream, with a last {"error": ...} line the client can tell apart.
+    """
+    try:
+        for row in rows(first):
+            yield orjson.dumps(row) + b"\n"
+        if pages is None:
+            return
+        async for page in pages:
+            for row in rows(page):
+                yield orjson.dumps(row) + b"\n"
+    except Exception as e:
+        print(f"streaming {what} failed: {_error_message(e)}")
+        yield orjson.dumps({"error": f"Failed to list {what}: {_error_message(e)}"}) + b"\n"
+
+
+async def _stream_gameservers(selector: str, owner: str | None, game: str | None,
+                              page_size: int, continue_token: str | None, fields: set | None):
+    """Gameservers as an ndjson StreamingResponse, one api server page at a time."""
+    rows = lambda page: _project(page, fields)
+    if gs_informer.synced and continue_token is None:
+        first, pages = gs_informer.store.list_gameservers(owner=owner, game=game), None
+    else:
+        pages = k8_cl.iter_gameserver_pages(selector, page_size, continue_token)
+        try:
+            first = await anext(pages)
+        except Exception as e:
+            raise _list_error(e, "gameservers")
+
+    return StreamingResponse(_ndjson_pages(first, pages, rows, "gameservers"), media_type="application/x-ndjson")
+
 # ========== CRUD ENDPOINTS ==========
 
 @gameservers_router.get("/")
-async def list_gameservers():
-    """List all gameservers."""
+async def list_gameservers(
+    owner: Optional[str] = None,
+    game: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=5000),
+    continue_token: Optional[str] = Query(default=None, alias="continue"),
+    fields: Optional[str] = None,
+    stream: bool = False
+):
+    """List gameservers.
+
+    `limit`/`continue` page through the api server, `fields` is a comma separated projection.
+    With `stream=true` every remaining page is sent as ndjson (`limit` sets the page size).
+    """
+    for value in (owner, game):
+        if value is not None and not is_label_value(value):
+            raise HTTPException(status_code=400, detail=f"Invalid label value {value}")
+
+    projection = None
+    if fields:
+        projection = {field.strip() for field in fields.split(",") if field.strip()}
+        unknown = projection - set(GAMESERVER_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields {sorted(unknown)}. Allowed fields: {list(GAMESERVER_FIELDS)}")
+
+    selector = gameserver_selector(owner, game)
+
+    if stream:
+        return await _stream_gameservers(selector, owner, game, limit or 500, continue_token, projection)
+
     try:
-        gameservers = k8_cl.list_gameservers()
-        return {
-            "gameservers": gameservers,
-            "total_count": len(gameservers)
-        }
+        next_token = None
+        if limit is None and continue_token is None and gs_informer.synced:
+            gameservers = gs_informer.store.list_gameservers(owner=owner, game=game)
+        elif limit is None and continue_token is None:
+            gameservers = await k8_cl.list_gameservers(selector)
+        else:
+            gameservers, next_token = await k8_cl.list_gameservers_page(selector, limit, continue_token)
+
+        return RawJSONResponse({
+            "gameservers": _project(gameservers, projection),
+            "total_count": len(gameservers),
+            "continue": next_token
+        })
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to list gameservers: {str(e)}")
+        raise _list_error(e, "gameservers")
+
+async def _resume(server_id: str, deployment: dict):
+    game = (deployment["metadata"].get("labels") or {}).get("game")
+    with tracing.span("idle.resume", {"server_id": server_id, "game": game or ""}):
+        await idle_manager.resume(server_id, game)
 
 @gameservers_router.get("/{server_id}")
-async def get_gameserver(server_id: str):
-    """Get a single gameserver by server_id."""
+async def get_gameserver(server_id: str, fields: Optional[str] = None, resume: bool = True):
+    """Get a single gameserver by server_id.
+
+    `fields` is a comma separated list of dotted paths (e.g. `metadata.name,status`)
+    applied to every returned object. With GameServer resources the resource is included
+    as `gameserver`, objects the reconciler hasn't created yet are null.
+    `state` is running, starting or sleeping, a sleeping server is woken up unless `resume=false`.
+    """
     try:
-        gameserver = k8_cl.get_gameserver(server_id)
+        gameserver = await _get_gameserver(server_id)
         if gameserver is None:
             raise HTTPException(status_code=404, detail=f"Gameserver {server_id} not found")
-        return gameserver
+
+        deployment = gameserver["deployment"]
+        state = gameserver_state(deployment) if deployment is not None else "starting"
+        if state == "sleeping" and resume:
+            await _resume(server_id, deployment)
+            state = "starting"
+        gameserver["state"] = state
+
+        if fields:
+            paths = parse_field_paths(fields)
+            gameserver = {
+                key: value if key in ("server_id", "state") or value is None
+                else {"items": [project(pod, paths) for pod in value["items"]]} if key == "pods"
+                else project(value, paths)
+                for key, value in gameserver.items()
+            }
+        return RawJSONResponse(gameserver)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get gameserver: {str(e)}")
 
-@gameservers_router.post("/", response_model=GameServerResponse)
-async def create_gameserver(request: CreateGameServerRequest, session: AsyncSession = Depends(get_session)):
-    """Create a new gameserver using game configuration from database."""
+@gameservers_router.post("/{server_id}/resume", response_model=GameServerResponse, response_model_exclude_none=True)
+async def resume_gameserver(server_id: str):
+    """Wake up a gameserver the idle detector put to sleep, a no-op for one that is awake."""
+    if not is_label_value(server_id):
+        raise HTTPException(status_code=400, detail=f"Invalid server id {server_id}")
+
     try:
-        # Generate a unique server ID
-        server_id = uuid.uuid4().hex
-        
-        # Fetch game data from database with all relationships
-        statement = select(Game).where(Game.id == request.game_id)
-        result = await session.execute(statement)
-        game = result.scalar_one_or_none()
-        
-        if not game:
-            raise HTTPException(status_code=404, detail=f"Game with id {request.game_id} not found")
-        
+        gameserver = await _get_gameserver(server_id)
+        if gameserver is None:
+            raise HTTPException(status_code=404, detail=f"Gameserver {server_id} not found")
+
+        deployment = gameserver["deployment"]
+        if deployment is None or gameserver_state(deployment) != "sleeping":
+            state = gameserver_state(deployment) if deployment is not None else "starting"
+            return GameServerResponse(server_id=server_id, status=state)
+
+        await _resume(server_id, deployment)
+        return GameServerResponse(server_id=server_id, status="resuming")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to resume gameserver: {str(e)}")
+
+async def _validate_create(request: CreateGameServerRequest):
+    """Resolve the game of a create request and check the config against it."""
+    # Fetch game data from the catalog cache, only hits the database on a miss
+    with tracing.span("catalog.lookup"):
+        game = await game_catalog.get(request.game_id)
+
+    return _check_game(request, game)
+
+
+def _check_game(request: CreateGameServerRequest, game: CatalogGame | None):
+    if not game:
+        raise HTTPException(status_code=404, detail=f"Game with id {request.game_id} not found")
+    
+    with tracing.span("config.validate"):
         # Validate that the game has a port configured
         if not game.port:
             raise HTTPException(status_code=400, detail=f"Game {game.name} does not have a port configured")
         
         # Validate config variables against game's allowed config vars
-        game_config_var_names = {var.name for var in game.config_vars}
+        game_config_var_names = game.config_var_names
         provided_config_keys = set(request.config_data.keys())
         
         # Check for invalid config keys
@@ -68,20 +240,108 @@ async def create_gameserver(request: CreateGameServerRequest, session: AsyncSess
                 detail=f"Invalid config variables for game {game.name}: {list(invalid_keys)}. "
                        f"Allowed variables: {list(game_config_var_names)}"
             )
+
+    return game
+
+
+def _accepted(operation: Operation):
+    return RawJSONResponse(
+        OperationResponse.from_operation(operation).model_dump(exclude_none=True),
+        status_code=202,
+        headers={"Location": f"/operations/{operation.id}"}
+    )
+
+
+def _replayed(operation: Operation, request_hash: str):
+    """The earlier operation of a retried create, which has to be the same request."""
+    if operation.request_hash != request_hash:
+        raise HTTPException(
+            status_code=422,
+            detail="Idempotency-Key was already used for a different request"
+        )
+    return _accepted(operation)
+
+
+async def _enqueue_create(request: CreateGameServerRequest, idempotency_key: str | None, session: AsyncSession):
+    """Record a create operation and hand it to the provisioning workers."""
+    if not mq_cl.is_connected():
+        raise HTTPException(status_code=503, detail="Provisioning queue is not available")
+
+    request_hash = hashlib.sha256(orjson.dumps(request.model_dump(), option=orjson.OPT_SORT_KEYS)).hexdigest()
+    if idempotency_key is not None:
+        operation = await crud.get_operation_by_idempotency_key(session, request.user_id, idempotency_key)
+        if operation is not None:
+            return _replayed(operation, request_hash)
+
+    await _validate_create(request)
+
+    try:
+        operation = await crud.create_operation(session, Operation(
+            id=uuid.uuid4().hex,
+            kind="create_gameserver",
+            server_id=uuid.uuid4().hex,
+            user_id=request.user_id,
+            idempotency_key=idempotency_key,
+            request_hash=request_hash
+        ))
+    except IntegrityError:
+        # a concurrent retry with the same key won the race
+        await session.rollback()
+        if idempotency_key is None:
+            raise
+        operation = await crud.get_operation_by_idempotency_key(session, request.user_id, idempotency_key)
+        if operation is None:
+            raise
+        return _replayed(operation, request_hash)
+
+    try:
+        # the operation is committed first, so the worker always finds it
+        await mq_cl.send_message(PROVISION_QUEUE, {
+            "operation_id": operation.id,
+            "server_id": operation.server_id,
+            "user_id": request.user_id,
+            "game_id": request.game_id,
+            "config_data": request.config_data
+        }, persistent=True)
+    except Exception as e:
+        await crud.update_operation(session, operation.id, status="failed", error=f"Failed to enqueue: {str(e)}")
+        raise HTTPException(status_code=503, detail=f"Failed to enqueue gameserver creation: {str(e)}")
+
+    return _accepted(operation)
+
+
+@gameservers_router.post("/", response_model=GameServerResponse, response_model_exclude_none=True)
+async def create_gameserver(
+    request: CreateGameServerRequest,
+    async_mode: bool = Query(default=False, alias="async"),
+    idempotency_key: Optional[str] = Header(default=None),
+    session: AsyncSession = Depends(get_session)
+):
+    """Create a new gameserver using game configuration from database.
+
+    Games with a warm pool hand out one of its running servers (`claimed` is set) when one is ready.
+    With ?async=true the create is queued and 202 is returned with an operation to poll, a retry
+    with the same Idempotency-Key and user returns that operation again.
+    """
+    if async_mode:
+        return await _enqueue_create(request, idempotency_key, session)
+
+    try:
+        # Generate a unique server ID
+        server_id = uuid.uuid4().hex
         
+        game = await _validate_create(request)
+
+        # a running server from the game's warm pool, if it has one
+        result = None
+        if warm_pool.has_pool(game.id):
+            with tracing.span("warm_pool.claim", {"game": game.short_name}):
+                result = await warm_pool.claim(game, request.user_id, request.config_data)
+
         # Create gameserver using database configuration
-        result = k8_cl.create_gameserver(
-            server_id=server_id,
-            game_name=game.short_name,
-            user_id=request.user_id,
-            image=game.docker_image,
-            requests_memory=game.memory_requests,
-            requests_cpu=game.cpu_requests,
-            limits_memory=game.memory_limits,
-            limits_cpu=game.cpu_limits,
-            game_port=game.port.number,
-            config_data=request.config_data
-        )
+        if result is None:
+            with tracing.span("k8s.create_gameserver", {"server_id": server_id, "game": game.short_name}):
+                result = await create_from_catalog(server_id, game, request.user_id, request.config_data)
         
         return GameServerResponse(**result)
         
@@ -90,11 +350,116 @@ async def create_gameserver(request: CreateGameServerRequest, session: AsyncSess
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create gameserver: {str(e)}")
 
-@gameservers_router.delete("/{server_id}", response_model=GameServerResponse)
+def _error_message(e: BaseException):
+    if isinstance(e, API_EXCEPTIONS):
+        return f"Kubernetes api error {e.status}: {e.reason}"
+    return str(e)
+
+
+async def _rollback_batch(results: list[BatchCreateResult]):
+    """Delete the servers of a failed atomic batch, a few deletecollection calls per 100 servers.
+
+    Failed servers are included, in case deleting their partial components failed too.
+    """
+    targets = [result for result in results if result.server_id and result.status in ("created", "failed")]
+    chunks = [targets[i:i + 100] for i in range(0, len(targets), 100)]
+    outcomes = await asyncio.gather(
+        *(k8_cl.delete_gameservers(f"app=gameserver,server-id in ({','.join(r.server_id for r in chunk)})")
+          for chunk in chunks),
+        return_exceptions=True
+    )
+
+    rolled_back = True
+    for chunk, outcome in zip(chunks, outcomes):
+        for result in chunk:
+            if isinstance(outcome, BaseException):
+                error = f"Rollback failed: {_error_message(outcome)}"
+                result.error = f"{result.error}. {error}" if result.error else error
+                rolled_back = False
+            elif result.status == "created":
+                result.status = "rolled_back"
+    return rolled_back
+
+
+@gameservers_router.post("/batch", response_model=BatchCreateGameServerResponse, response_model_exclude_none=True)
+async def create_gameservers(request: BatchCreateGameServerRequest, response: Response):
+    """Create many gameservers at once.
+
+    Every distinct game is resolved once and all manifests are built before anything is
+    submitted, then up to BATCH_CREATE_CONCURRENCY servers are created at a time.
+    Items succeed or fail on their own, with `atomic` any failure deletes the whole batch again.
+    Responds 200 when every server was created and 207 otherwise.
+    """
+    if not request.servers:
+        raise HTTPException(status_code=400, detail="No servers to create")
+    if len(request.servers) > config.BATCH_CREATE_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {config.BATCH_CREATE_MAX_ITEMS} servers per batch")
+
+    game_ids = list({item.game_id for item in request.servers})
+    with tracing.span("catalog.lookup", {"games": len(game_ids)}):
+        games = dict(zip(game_ids, await asyncio.gather(*(game_catalog.get(game_id) for game_id in game_ids))))
+
+    results = []
+    pending = []
+    for index, item in enumerate(request.servers):
+        try:
+            game = _check_game(item, games[item.game_id])
+        except HTTPException as e:
+            results.append(BatchCreateResult(index=index, status="failed", error=e.detail))
+            continue
+
+        server_id = uuid.uuid4().hex
+        result = BatchCreateResult(index=index, status="pending", server_id=server_id)
+        results.append(result)
+        pending.append((result, manifests_from_catalog(server_id, game, item.user_id, item.config_data)))
+
+    if request.atomic and len(pending) < len(results):
+        # an invalid item fails an atomic batch before anything is created
+        for result, _ in pending:
+            result.status = "skipped"
+            result.server_id = None
+        pending = []
+
+    if pending:
+        with tracing.span("k8s.create_gameservers", {"count": len(pending)}):
+            outcomes = await k8_cl.create_gameservers(
+                [(result.server_id, manifests) for result, manifests in pending],
+                concurrency=config.BATCH_CREATE_CONCURRENCY,
+                fail_fast=request.atomic
+            )
+
+        for (result, _), outcome in zip(pending, outcomes):
+            if isinstance(outcome, CreateSkipped):
+                result.status = "skipped"
+                result.server_id = None
+            elif isinstance(outcome, BaseException):
+                result.status = "failed"
+                result.error = _error_message(outcome)
+            else:
+                result.status = "created"
+
+    failed = any(result.status != "created" for result in results)
+    rolled_back = False
+    if request.atomic and failed and any(result.status == "created" for result in results):
+        rolled_back = await _rollback_batch(results)
+
+    created_count = sum(result.status == "created" for result in results)
+    response.status_code = 207 if failed else 200
+    return BatchCreateGameServerResponse(
+        results=results,
+        created_count=created_count,
+        failed_count=sum(result.status == "failed" for result in results),
+        rolled_back=rolled_back
+    )
+
+@gameservers_router.delete("/{server_id}", response_model=GameServerResponse, response_model_exclude_none=True)
 async def delete_gameserver(server_id: str):
     """Delete a gameserver."""
+    if not is_label_value(server_id):
+        raise HTTPException(status_code=400, detail=f"Invalid server id {server_id}")
+
     try:
-        result = k8_cl.delete_gameserver(server_id)
+        result = await k8_cl.delete_gameserver(server_id)
         
         if result["status"] == "not_found":
             raise HTTPException(status_code=404, detail=f"Gameserver {server_id} not found")
@@ -106,48 +471,133 @@ async def delete_gameserver(server_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to delete gameserver: {str(e)}")
 
+@gameservers_router.delete("/")
+async def delete_gameservers(owner: str):
+    """Delete all gameservers of an owner."""
+    if not owner or not is_label_value(owner):
+        raise HTTPException(status_code=400, detail=f"Invalid owner {owner}")
+
+    try:
+        server_ids = await k8_cl.delete_gameservers(f"app=gameserver,owner={owner}")
+        return {
+            "owner": owner,
+            "deleted": server_ids,
+            "total_count": len(server_ids)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to delete gameservers: {str(e)}")
+
 # ========== ADDITIONAL ENDPOINTS ==========
 
+# node names are dns subdomains
+NODE_NAME_RE = re.compile(r"^[a-z0-9]([-a-z0-9.]{0,251}[a-z0-9])?$")
+
+
+async def _stream_pods(label_selector: str | None, field_selector: str | None,
+                       page_size: int, continue_token: str | None, shape):
+    """Pods as an ndjson StreamingResponse, one api server page at a time."""
+    pages = k8_cl.iter_pod_pages(label_selector, field_selector, page_size, continue_token)
+    try:
+        first = await anext(pages)
+    except Exception as e:
+        raise _list_error(e, "pods")
+
+    rows = lambda page: map(shape, page)
+    return StreamingResponse(_ndjson_pages(first, pages, rows, "pods"), media_type="application/x-ndjson")
+
 @gameservers_router.get("/pods/all")
-async def get_all_pods():
-    """Get all pods in the gameserver namespace (original endpoint)."""
-    pods = k8_cl.v1_api.list_namespaced_pod(
-        namespace=k8_cl.namespace
-    )
-    return pods.to_dict()
+async def get_all_pods(
+    phase: Optional[Literal["Pending", "Running", "Succeeded", "Failed", "Unknown"]] = None,
+    node: Optional[str] = None,
+    game: Optional[str] = None,
+    label_selector: Optional[str] = None,
+    field_selector: Optional[str] = None,
+    compact: bool = False,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=5000),
+    continue_token: Optional[str] = Query(default=None, alias="continue"),
+    stream: bool = True
+):
+    """Get pods in the gameserver namespace.
+
+    Pods are streamed as ndjson, fetched from the api server in pages of `limit` (default 500).
+    A failure after the first page ends the stream with an `{"error": ...}` line.
+    With `stream=false` a single page is returned with its `continue` token, or the whole
+    list passed through untouched when neither `limit` nor a projection is given.
+    `compact` returns name, phase, node, restarts and ready; `fields` is a dotted path projection.
+    """
+    if node is not None and not NODE_NAME_RE.match(node):
+        raise HTTPException(status_code=400, detail=f"Invalid node name {node}")
+    if game is not None and not is_label_value(game):
+        raise HTTPException(status_code=400, detail=f"Invalid game {game}")
+
+    labels = [label_selector] if label_selector else []
+    if game is not None:
+        labels.append(f"game={game}")
+    field_terms = [field_selector] if field_selector else []
+    if phase is not None:
+        field_terms.append(f"status.phase={phase}")
+    if node is not None:
+        field_terms.append(f"spec.nodeName={node}")
+    labels = ",".join(labels) or None
+    field_terms = ",".join(field_terms) or None
+
+    if compact:
+        shape = pod_summary
+    elif fields:
+        paths = parse_field_paths(fields)
+        shape = lambda pod: project(pod, paths)
+    else:
+        shape = None
+
+    if stream:
+        return await _stream_pods(labels, field_terms, limit or 500, continue_token, shape or (lambda pod: pod))
+
+    try:
+        if limit is None and continue_token is None:
+            pods = await k8_cl.list_pods(labels, field_terms)
+            if shape is None:
+                return RawJSONResponse(pods)
+            items, next_token = orjson.loads(pods)["items"], None
+        else:
+            items, next_token = await k8_cl.list_pods_page(labels, field_terms, limit, continue_token)
+
+        if shape is not None:
+            items = [shape(pod) for pod in items]
+        return RawJSONResponse({"items": items, "continue": next_token})
+    except Exception as e:
+        raise _list_error(e, "pods")
 
 @gameservers_router.get("/{server_id}/status")
 async def get_gameserver_status(server_id: str):
     """Get simplified status of a gameserver."""
     try:
-        gameserver = k8_cl.get_gameserver(server_id)
-        if gameserver is None:
+        status = gs_informer.store.get_gameserver_status(server_id) if gs_informer.synced else None
+        if status is None:
+            status = await k8_cl.get_gameserver_status(server_id)
+
+        if status is None:
             raise HTTPException(status_code=404, detail=f"Gameserver {server_id} not found")
-        
-        # Extract simplified status information
-        deployment = gameserver["deployment"]
-        pods = gameserver["pods"]
-        
-        pod_statuses = []
-        if pods["items"]:
-            for pod in pods["items"]:
-                pod_statuses.append({
-                    "name": pod["metadata"]["name"],
-                    "phase": pod["status"]["phase"],
-                    "ready": pod["status"].get("conditions", [])
-                })
-        
-        return {
-            "server_id": server_id,
-            "deployment_status": {
-                "ready_replicas": deployment["status"].get("ready_replicas", 0),
-                "replicas": deployment["spec"]["replicas"],
-                "available_replicas": deployment["status"].get("available_replicas", 0)
-            },
-            "pods": pod_statuses
-        }
+        return RawJSONResponse(status)
         
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to get gameserver status: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to get gameserver status: {str(e)}")
+
+@gameservers_router.post("/status")
+async def get_gameserver_statuses(request: GameServerStatusRequest):
+    """Get simplified status of many gameservers at once, at most STATUS_BATCH_MAX_IDS."""
+    server_ids = list(dict.fromkeys(request.server_ids))
+    invalid_ids = [server_id for server_id in server_ids if not server_id or not is_label_value(server_id)]
+    if invalid_ids:
+        raise HTTPException(status_code=400, detail=f"Invalid server ids {invalid_ids}")
+
+    try:
+        statuses = await _get_gameserver_statuses(server_ids)
+        return RawJSONResponse({
+            "statuses": [statuses[server_id] for server_id in server_ids if server_id in statuses],
+            "not_found": [server_id for server_id in server_ids if server_id not in statuses]
+        })
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get gameserver statuses: {str(e)}")
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException
+from ..core.images import image_manager
+from .responses import RawJSONResponse
+
+images_router = APIRouter()
+
+
+@images_router.get("/")
+def list_images():
+    """Images of the games table with the digest creates are pinned to and their pre-pull daemonset."""
+    return RawJSONResponse({"images": image_manager.list_images()})
+
+
+@images_router.get("/coverage")
+async def get_coverage():
+    """Per image and per schedulable node, which catalog images are cached, read live from the cluster."""
+    try:
+        return RawJSONResponse(await image_manager.coverage())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read image coverage: {str(e)}")
@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from ..core.metrics import registry
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
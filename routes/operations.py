@@ -0,0 +1,16 @@
+from .. import crud
+from ..models import OperationResponse
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio.session import AsyncSession
+from .deps import get_session
+
+operations_router = APIRouter()
+
+
+@operations_router.get("/{operation_id}", response_model=OperationResponse, response_model_exclude_none=True)
+async def get_operation(operation_id: str, session: AsyncSession = Depends(get_session)):
+    """Get the progress of a queued operation."""
+    operation = await crud.get_operation(session, operation_id)
+    if operation is None:
+        raise HTTPException(status_code=404, detail=f"Operation {operation_id} not found")
+    return OperationResponse.from_operation(operation)
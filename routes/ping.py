@@ -1,5 +1,15 @@
 from fastapi import APIRouter, Depends
 from fastapi.security import HTTPBearer
+from ..core.db import db_cl
+from ..core.catalog import game_catalog
+from ..core.provisioning import manifest_templates
+from ..core.users import user_cache
+from ..core.warm_pool import warm_pool
+from ..core.idle import idle_manager
+from ..core.images import image_manager
+from ..k8.informer import gs_informer
+from ..k8.reconciler import gs_reconciler
+from ..rabbit.consumers import handler_registry
 
 healthcheck_router = APIRouter()
 
@@ -10,6 +20,51 @@ def ping():
     return "pong"
 
 
+@healthcheck_router.get("/db")
+def db_pool_stats():
+    return db_cl.get_pool_stats()
+
+
+@healthcheck_router.get("/catalog")
+def catalog_stats():
+    return {**game_catalog.stats(), "manifest_templates": manifest_templates.stats()}
+
+
+@healthcheck_router.get("/users")
+def user_cache_stats():
+    return user_cache.stats()
+
+
+@healthcheck_router.get("/informer")
+def informer_stats():
+    return gs_informer.stats()
+
+
+@healthcheck_router.get("/reconciler")
+def reconciler_stats():
+    return gs_reconciler.stats()
+
+
+@healthcheck_router.get("/warm-pool")
+def warm_pool_stats():
+    return warm_pool.stats()
+
+
+@healthcheck_router.get("/idle")
+def idle_stats():
+    return idle_manager.stats()
+
+
+@healthcheck_router.get("/images")
+def image_stats():
+    return image_manager.stats()
+
+
+@healthcheck_router.get("/handlers")
+def handler_stats():
+    return handler_registry.stats()
+
+
 # @healthcheck_router.get("/pping")
 # def pping(token: str = Depends(token_auth_scheme)):
 #     print(token)
@@ -0,0 +1,15 @@
+import orjson
+from fastapi.responses import Response
+
+
+class RawJSONResponse(Response):
+    """JSON response that sends bytes as they are and encodes anything else with orjson.
+
+    Returning it directly from a route also skips FastAPI's jsonable_encoder pass.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content)
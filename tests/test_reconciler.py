@@ -0,0 +1,90 @@
+import copy
+import asyncio
+from ..k8.client import SLEEPING_ANNOTATION
+from ..k8.reconciler import WorkQueue, desired_objects, drift_patch, resource_status
+
+GAMESERVER = {
+    "metadata": {"name": "gameserver-abc", "uid": "1234", "generation": 2},
+    "spec": {
+        "game": "minecraft",
+        "owner": "user1",
+        "image": "itzg/minecraft-server:latest",
+        "resources": {"requests": {"cpu": "1", "memory": "1Gi"}, "limits": {"cpu": "2", "memory": "2Gi"}},
+        "port": 25565,
+        "config": {"EULA": "true"}
+    }
+}
+
+
+def test_key_added_while_processing_comes_back_once():
+    async def run():
+        queue = WorkQueue()
+        queue.add("a")
+        key = await queue.get()
+
+        # not handed to a second worker while the first one has it
+        queue.add("a")
+        queue.add("a")
+        assert queue.queue.qsize() == 0
+
+        queue.done(key)
+        assert queue.queue.qsize() == 1
+        assert await queue.get() == "a"
+        queue.done("a")
+        assert queue.queue.qsize() == 0
+
+    asyncio.run(run())
+
+
+def test_backoff_doubles_per_key_until_forgotten():
+    async def run():
+        queue = WorkQueue(base_delay=0.01)
+        assert [queue.add_rate_limited("a") for _ in range(3)] == [0.01, 0.02, 0.04]
+        # other keys have their own backoff
+        assert queue.add_rate_limited("b") == 0.01
+
+        queue.forget("a")
+        assert queue.add_rate_limited("a") == 0.01
+        queue.shutdown()
+
+    asyncio.run(run())
+
+
+def test_server_defaulted_fields_are_no_drift():
+    desired = desired_objects("abc", GAMESERVER)
+    for component, body in desired.items():
+        current = copy.deepcopy(body)
+        current["metadata"].update(resourceVersion="7", uid="5678", creationTimestamp="2024-01-01T00:00:00Z")
+        current["status"] = {"observedGeneration": 1}
+        if component == "deployment":
+            current["spec"]["progressDeadlineSeconds"] = 600
+            current["spec"]["template"]["spec"]["dnsPolicy"] = "ClusterFirst"
+        elif component == "service":
+            current["spec"]["clusterIP"] = "10.0.0.12"
+        assert drift_patch(body, current) is None, component
+
+    current = copy.deepcopy(desired["deployment"])
+    current["spec"]["template"]["spec"]["containers"][0]["image"] = "itzg/minecraft-server:old"
+    patch = drift_patch(desired["deployment"], current)
+    assert patch["spec"]["template"]["spec"]["containers"][0]["image"] == "itzg/minecraft-server:latest"
+
+
+def test_removed_config_keys_are_nulled():
+    desired = desired_objects("abc", GAMESERVER)["config_map"]
+    current = copy.deepcopy(desired)
+    current["data"] = {"EULA": "false", "MOTD": "hello"}
+
+    patch = drift_patch(desired, current)
+    assert patch["data"] == {"EULA": "true", "MOTD": None}
+
+
+def test_sleeping_deployment_makes_a_sleeping_gameserver():
+    deployment = {
+        "metadata": {"annotations": {SLEEPING_ANNOTATION: "2024-01-01T00:00:00Z"}},
+        "spec": {"replicas": 0},
+        "status": {}
+    }
+    status = resource_status(GAMESERVER, deployment)
+    assert status["phase"] == "Sleeping"
+    assert status["replicas"] == 0
+    assert status["observedGeneration"] == 2
@@ -0,0 +1,33 @@
+import orjson
+from ..core.tracing import tracing, TRACE_ANNOTATION
+from ..k8.client import gameserver_manifests, gameserver_resource_manifest
+from ..k8.templates import GameserverTemplate, sanitize
+
+GAME = ("minecraft", "itzg/minecraft-server:latest", "1Gi", "1", "2Gi", "2", 25565)
+# json and placeholder syntax in the values must come out as plain text
+OWNER = 'us"er\\ünï@@server_id@@'
+CONFIG = {"MOTD": 'say "hi" \\ to @@owner@@ – héllo ✓', "PATH": "C:\\games\\", "EMPTY": ""}
+
+
+def rendered(crd: bool):
+    template = GameserverTemplate(*GAME, crd=crd)
+    return {component: orjson.loads(body) for component, body in template.render("abc", OWNER, CONFIG).items()}
+
+
+def test_render_matches_the_model_path():
+    expected = sanitize(gameserver_manifests("abc", GAME[0], OWNER, *GAME[1:], CONFIG))
+    assert set(rendered(crd=False)) == {"config_map", "deployment", "service", "traefik_route"}
+    assert rendered(crd=False) == expected
+
+
+def test_render_matches_the_gameserver_resource():
+    expected = sanitize(gameserver_resource_manifest("abc", GAME[0], OWNER, *GAME[1:], CONFIG))
+    assert rendered(crd=True) == {"gameserver": expected}
+
+
+def test_render_links_the_current_trace(monkeypatch):
+    monkeypatch.setattr(tracing, "annotations", lambda: {TRACE_ANNOTATION: "00-abc-def-01"})
+    expected = sanitize(gameserver_manifests("abc", GAME[0], OWNER, *GAME[1:], CONFIG))
+    result = rendered(crd=False)
+    assert result == expected
+    assert all(body["metadata"]["annotations"] == {TRACE_ANNOTATION: "00-abc-def-01"} for body in result.values())
@@ -0,0 +1,75 @@
+import time
+import asyncio
+from ..core.catalog import CatalogGame
+from ..core.warm_pool import WarmPool, pool_spec
+from ..k8.client import POOL_LABEL, POOL_SPEC_LABEL
+from ..k8.informer import GameserverInformer
+
+GAME = CatalogGame(id=7, name="Minecraft", short_name="minecraft", docker_image="itzg/minecraft-server:latest",
+                   cpu_requests="1", cpu_limits="2", memory_requests="1Gi", memory_limits="2Gi", port=25565)
+
+
+class RecordingK8s:
+    """Just the calls the refiller makes, recorded instead of sent."""
+
+    gameserver_crd = False
+
+    def __init__(self):
+        self.deleted = []
+        self.created = []
+
+    async def delete_gameserver_if_unchanged(self, server_id: str, resource_version: str):
+        self.deleted.append(server_id)
+        return True
+
+    async def create_gameservers(self, gameservers: list, concurrency: int = 10):
+        self.created.extend(server_id for server_id, _ in gameservers)
+        return [None] * len(gameservers)
+
+
+def make_pool(ready: int, starting: int = 0, creating: int = 0, size: int = 2):
+    k8 = RecordingK8s()
+    informer = GameserverInformer(k8)
+    pool = WarmPool(k8, informer)
+    pool.configure({GAME.id: size}, min_size=size)
+
+    spec = pool_spec(GAME)
+    for i in range(ready + starting):
+        informer.store.put("deployment", {
+            "metadata": {
+                "name": f"gameserver-pool{i}",
+                "resourceVersion": "1",
+                "labels": {"server-id": f"pool{i}", "game": GAME.short_name,
+                           POOL_LABEL: str(GAME.id), POOL_SPEC_LABEL: spec}
+            },
+            "spec": {"replicas": 1},
+            "status": {"readyReplicas": 1 if i < ready else 0}
+        })
+    for i in range(creating):
+        pool.creating[f"creating{i}"] = (GAME.id, time.monotonic())
+    return pool, k8
+
+
+def test_creates_in_flight_dont_delete_ready_servers():
+    pool, k8 = make_pool(ready=3, creating=2)
+    asyncio.run(pool.refill_game(GAME))
+
+    # one ready server too many, the pending creates neither push out the rest nor get company
+    assert len(k8.deleted) == 1
+    assert k8.created == []
+
+
+def test_starting_servers_go_before_ready_ones():
+    pool, k8 = make_pool(ready=2, starting=2, creating=1)
+    asyncio.run(pool.refill_game(GAME))
+
+    assert sorted(k8.deleted) == ["pool2", "pool3"]
+    assert k8.created == []
+
+
+def test_creates_in_flight_count_towards_the_target():
+    pool, k8 = make_pool(ready=1, creating=1, size=3)
+    asyncio.run(pool.refill_game(GAME))
+
+    assert k8.deleted == []
+    assert len(k8.created) == 1